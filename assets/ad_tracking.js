@@ -0,0 +1,170 @@
+/**
+ * Advertising - Viewable Impressions and Batched Event Tracking
+ *
+ * Counts an ad impression only once at least half of the ad has been on
+ * screen for a full second, queues impressions and clicks, and sends them
+ * to /api/ad-events in batches with navigator.sendBeacon.
+ */
+
+(function() {
+    const ENDPOINT = '/api/ad-events';
+
+    // An impression needs this fraction of the ad in view ...
+    const VISIBLE_RATIO = 0.5;
+    // ... continuously for this long (ms)
+    const VISIBLE_MS = 1000;
+
+    // Queued events are flushed on this interval (ms), or sooner once the queue is this long
+    const FLUSH_INTERVAL_MS = 10000;
+    const FLUSH_QUEUE_LENGTH = 20;
+    // Must not exceed MAX_BATCH_EVENTS in lib/advertising.py
+    const MAX_BATCH_EVENTS = 100;
+
+    // Pending events: {type, campaign_id, page}
+    const queue = [];
+
+    // Observed ad element -> {campaign, inView, timer, counted}
+    const slots = new Map();
+
+    /**
+     * DOM id Dash renders for a pattern-matching (dict) component id
+     */
+    function stringifyId(id) {
+        return '{' + Object.keys(id).sort().map(
+            key => JSON.stringify(key) + ':' + JSON.stringify(id[key])
+        ).join(',') + '}';
+    }
+
+    function send(events) {
+        const body = JSON.stringify({events: events});
+        if (navigator.sendBeacon) {
+            const blob = new Blob([body], {type: 'application/json'});
+            if (navigator.sendBeacon(ENDPOINT, blob)) {
+                return;
+            }
+        }
+        // No beacon support, or the browser refused to queue it
+        fetch(ENDPOINT, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: body,
+            keepalive: true
+        }).catch(error => console.error('[Advertising] Error sending events:', error));
+    }
+
+    function flush() {
+        while (queue.length) {
+            send(queue.splice(0, MAX_BATCH_EVENTS));
+        }
+    }
+
+    function enqueue(type, campaign) {
+        queue.push({type: type, campaign_id: campaign.campaign_id, page: campaign.page});
+        if (queue.length >= FLUSH_QUEUE_LENGTH) {
+            flush();
+        }
+    }
+
+    function startTimer(element, state) {
+        if (state.timer || state.counted) {
+            return;
+        }
+        state.timer = setTimeout(function() {
+            state.timer = null;
+            state.counted = true;
+            observer.unobserve(element);
+            enqueue('impression', state.campaign);
+        }, VISIBLE_MS);
+    }
+
+    function stopTimer(state) {
+        if (state.timer) {
+            clearTimeout(state.timer);
+            state.timer = null;
+        }
+    }
+
+    const observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            const state = slots.get(entry.target);
+            if (!state) {
+                return;
+            }
+            state.inView = entry.isIntersecting && entry.intersectionRatio >= VISIBLE_RATIO;
+            if (state.inView && document.visibilityState === 'visible') {
+                startTimer(entry.target, state);
+            } else {
+                stopTimer(state);
+            }
+        });
+    }, {threshold: [0, VISIBLE_RATIO]});
+
+    /**
+     * Forget ads that have been removed from the page (single-page navigation)
+     */
+    function prune() {
+        slots.forEach(function(state, element) {
+            if (!element.isConnected) {
+                stopTimer(state);
+                observer.unobserve(element);
+                slots.delete(element);
+            }
+        });
+    }
+
+    /**
+     * Watch an ad slot and count its impression once it has been viewable.
+     *
+     * @param {Object} id - Dash id of the ad container
+     * @param {Object} campaign - Campaign data from /api/ad-slot (campaign_id, page)
+     * @param {number} attempts - Frames left to wait for the element to render
+     */
+    function observe(id, campaign, attempts = 10) {
+        const element = document.getElementById(stringifyId(id));
+        if (!element) {
+            if (attempts > 0) {
+                requestAnimationFrame(() => observe(id, campaign, attempts - 1));
+            }
+            return;
+        }
+
+        prune();
+        const previous = slots.get(element);
+        if (previous) {
+            stopTimer(previous);
+            observer.unobserve(element);
+        }
+        slots.set(element, {campaign: campaign, inView: false, timer: null, counted: false});
+        observer.observe(element);
+    }
+
+    /**
+     * Record an ad click and send it immediately (the page may be navigating away)
+     */
+    function click(campaign) {
+        enqueue('click', campaign);
+        flush();
+    }
+
+    // Hidden tabs don't count as viewable: pause timers and flush before the page may be discarded
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') {
+            slots.forEach(stopTimer);
+            flush();
+        } else {
+            slots.forEach(function(state, element) {
+                if (state.inView) {
+                    startTimer(element, state);
+                }
+            });
+        }
+    });
+    window.addEventListener('pagehide', flush);
+    setInterval(flush, FLUSH_INTERVAL_MS);
+
+    window.adTracking = {
+        observe: observe,
+        click: click,
+        flush: flush
+    };
+})();
@@ -0,0 +1,241 @@
+/**
+ * Traffic Analytics - Clientside Rendering
+ *
+ * Renders the stat cards, charts, map and ad tables on /analytics/traffic
+ * from the compact aggregate store (analytics-data-store). Only the store
+ * refresh goes to the server; everything here runs in the browser.
+ *
+ * Refreshes usually arrive as a Patch, which leaves untouched parts of the
+ * store as the same objects, so each widget skips re-rendering when the
+ * slice it draws from is unchanged.
+ */
+
+window.dash_clientside = window.dash_clientside || {};
+
+(function() {
+    const HIDDEN = {display: 'none'};
+    const SHOWN = {};
+
+    const DEVICE_SERIES = [
+        {key: 'desktop', name: 'Desktop', color: 'violet.6'},
+        {key: 'mobile', name: 'Mobile', color: 'blue.6'},
+        {key: 'tablet', name: 'Tablet', color: 'green.6'},
+        {key: 'bot', name: 'Bots', color: 'yellow.6'},
+    ];
+
+    // Last store slices each widget rendered from, by widget name
+    const lastRendered = {};
+
+    /**
+     * True if the widget already rendered these exact slices (compared by reference).
+     */
+    function unchanged(widget, ...slices) {
+        const previous = lastRendered[widget];
+        lastRendered[widget] = slices;
+        return Boolean(previous) && previous.every((slice, i) => slice === slices[i]);
+    }
+
+    function skip(count) {
+        return Array(count).fill(window.dash_clientside.no_update);
+    }
+
+    function formatNumber(value) {
+        return (value || 0).toLocaleString('en-US');
+    }
+
+    /**
+     * Outputs for a chart slot: [chart data, chart style, empty style, empty text]
+     */
+    function chartSlot(rows, emptyMessage) {
+        if (!rows || rows.length === 0) {
+            return [[], HIDDEN, SHOWN, emptyMessage];
+        }
+        return [rows, SHOWN, HIDDEN, emptyMessage];
+    }
+
+    function loadingSlot() {
+        return [[], HIDDEN, SHOWN, 'Loading...'];
+    }
+
+    function buildLocationFigure(locations) {
+        const counts = locations.map(loc => loc.count);
+        const maxCount = Math.max(...counts);
+        const minCount = Math.min(...counts);
+
+        // Square root scaling so bubble area is proportional to the count (8-40px)
+        const sizes = counts.map(count => {
+            if (maxCount === minCount) {
+                return 20;
+            }
+            return 8 + Math.sqrt((count - minCount) / (maxCount - minCount)) * 32;
+        });
+
+        const hoverTexts = locations.map(loc => {
+            const breakdown = loc.device_breakdown || {};
+            let place = `${loc.city}, ${loc.country}`;
+            if (loc.other_places) {
+                place += ` +${loc.other_places} more`;
+            }
+            return `<b>${place}</b><br>` +
+                `Visitors: ${loc.count}<br>` +
+                `🖥️ Desktop: ${breakdown.desktop || 0}<br>` +
+                `📱 Mobile: ${breakdown.mobile || 0}<br>` +
+                `📲 Tablet: ${breakdown.tablet || 0}<br>` +
+                `🤖 Bots: ${breakdown.bot || 0}`;
+        });
+
+        return {
+            data: [{
+                type: 'scattergeo',
+                lon: locations.map(loc => loc.longitude),
+                lat: locations.map(loc => loc.latitude),
+                text: hoverTexts,
+                mode: 'markers',
+                marker: {
+                    size: sizes,
+                    color: counts,
+                    colorscale: 'Viridis',
+                    showscale: true,
+                    colorbar: {title: {text: 'Visitors'}, thickness: 15, len: 0.7},
+                    line: {width: 1, color: 'rgba(255, 255, 255, 0.9)'},
+                    sizemode: 'diameter',
+                    opacity: 0.85
+                },
+                hovertemplate: '%{text}<extra></extra>'
+            }],
+            layout: {
+                geo: {
+                    showframe: false,
+                    showcoastlines: true,
+                    projection: {type: 'natural earth'},
+                    bgcolor: 'rgba(0,0,0,0)'
+                },
+                height: 500,
+                margin: {l: 0, r: 0, t: 0, b: 0},
+                paper_bgcolor: 'rgba(0,0,0,0)',
+                plot_bgcolor: 'rgba(0,0,0,0)',
+                // Keep the user's zoom/pan when markers are re-clustered
+                uirevision: 'location-map'
+            }
+        };
+    }
+
+    window.dash_clientside.analytics = {
+        visitorStats: function(data) {
+            if (!data) {
+                return '0';
+            }
+            if (unchanged('visitorStats', data.stats)) {
+                return window.dash_clientside.no_update;
+            }
+            return formatNumber(data.stats.total);
+        },
+
+        deviceChart: function(data) {
+            if (!data) {
+                return loadingSlot();
+            }
+            if (unchanged('deviceChart', data.stats)) {
+                return skip(4);
+            }
+            const rows = DEVICE_SERIES
+                .map(s => ({name: s.name, value: data.stats[s.key] || 0, color: s.color}))
+                .filter(row => row.value > 0);
+            return chartSlot(rows, 'No visit data yet');
+        },
+
+        botTypesChart: function(data) {
+            if (!data) {
+                return loadingSlot();
+            }
+            if (unchanged('botTypesChart', data.bot_types)) {
+                return skip(4);
+            }
+            return chartSlot(data.bot_types, 'No bot visits yet');
+        },
+
+        hourlyChart: function(data) {
+            if (!data) {
+                return loadingSlot();
+            }
+            if (unchanged('hourlyChart', data.hourly)) {
+                return skip(4);
+            }
+            const hasVisits = (data.hourly || []).some(
+                row => DEVICE_SERIES.some(s => row[s.name] > 0)
+            );
+            return chartSlot(hasVisits ? data.hourly : [], 'No visit data available');
+        },
+
+        topPagesChart: function(data) {
+            if (!data) {
+                return loadingSlot();
+            }
+            if (unchanged('topPagesChart', data.top_pages)) {
+                return skip(4);
+            }
+            return chartSlot(data.top_pages, 'No page visits yet');
+        },
+
+        locationMap: function(data) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!data || !data.locations || data.locations.length === 0) {
+                return [noUpdate, HIDDEN, SHOWN];
+            }
+            if (unchanged('locationMap', data.locations)) {
+                return skip(3);
+            }
+            return [buildLocationFigure(data.locations), SHOWN, HIDDEN];
+        },
+
+        adStats: function(data) {
+            if (!data || !data.ads) {
+                return ['0', '0', '0%', '0'];
+            }
+            if (unchanged('adStats', data.ads.total_stats)) {
+                return skip(4);
+            }
+            const stats = data.ads.total_stats || {};
+            return [
+                formatNumber(stats.total_impressions),
+                formatNumber(stats.total_clicks),
+                `${stats.overall_ctr || 0}%`,
+                String(stats.active_campaigns || 0)
+            ];
+        },
+
+        adCampaignsTable: function(data) {
+            if (!data || !data.ads) {
+                return loadingSlot();
+            }
+            if (unchanged('adCampaignsTable', data.ads.campaigns)) {
+                return skip(4);
+            }
+            return chartSlot(data.ads.campaigns, 'No advertising campaigns configured yet.');
+        },
+
+        adCtrChart: function(data) {
+            if (!data || !data.ads) {
+                return loadingSlot();
+            }
+            if (unchanged('adCtrChart', data.ads.ctr_by_day)) {
+                return skip(4);
+            }
+            const hasImpressions = (data.ads.ctr_by_day || []).some(row => row.impressions > 0);
+            return chartSlot(hasImpressions ? data.ads.ctr_by_day : [], 'No ad impressions in this range yet.');
+        },
+
+        adClicksByPage: function(data) {
+            if (!data || !data.ads) {
+                return loadingSlot();
+            }
+            if (unchanged('adClicksByPage', data.ads.clicks_by_page)) {
+                return skip(4);
+            }
+            return chartSlot(
+                data.ads.clicks_by_page,
+                'No ad clicks yet. Clicks will be tracked as users interact with advertisements.'
+            );
+        }
+    };
+})();
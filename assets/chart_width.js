@@ -0,0 +1,24 @@
+/**
+ * Chart Width Measurement
+ *
+ * Reports the rendered width of a chart so the server can size the point
+ * budget of its series (see lib/downsample.py target_points). Shared by the
+ * traffic and API analytics pages.
+ */
+
+window.dash_clientside = window.dash_clientside || {};
+
+window.dash_clientside.charts = {
+    /**
+     * Width of a chart's parent (the chart itself may be hidden while empty).
+     * Only real resizes (more than 10%) are reported.
+     */
+    measureWidth: function(n, containerId, previousWidth) {
+        const container = document.getElementById(containerId);
+        const width = container && container.parentElement ? container.parentElement.clientWidth : 0;
+        if (!width || (previousWidth && Math.abs(width - previousWidth) < previousWidth * 0.1)) {
+            return window.dash_clientside.no_update;
+        }
+        return width;
+    }
+};
@@ -1,11 +1,21 @@
 """
 Advertising Click Tracking Callbacks
-Handles client-side click tracking for advertisement campaigns
+Handles ad slot loading and batched impression/click tracking for advertisement campaigns
 """
+import json
+
 from dash import callback, Input, Output, clientside_callback, MATCH, no_update, ctx
 from flask import request, jsonify
 
-from lib.advertising import track_click
+from lib.advertising import MAX_BATCH_EVENTS, serve_ad_slot, track_click, track_events
+from lib.analytics_tracker import tracker
+
+
+def _request_session_id() -> str:
+    """Session from the X-Session-ID header, else the tracker's IP/User-Agent hash."""
+    return request.headers.get('X-Session-ID') or tracker.get_session_id(
+        request.remote_addr, request.headers.get('User-Agent', '')
+    )
 
 
 # Server-side API endpoint for tracking ad clicks (Dash 3.3.0)
@@ -49,25 +59,147 @@ def track_ad_click_api(trigger_data):
         return jsonify({"error": str(e)}), 500
 
 
-# Track ad clicks with clientside callback for immediate navigation
+# Server-side API endpoint for batched impression and click events
+@callback(
+    Output('ad-events-api-response', 'data'),  # Dummy output
+    Input('ad-events-api-trigger', 'data'),     # Dummy input
+    api_endpoint='/api/ad-events',
+    hidden=True
+)
+def ad_events_api(trigger_data):
+    """
+    API endpoint recording a batch of ad impressions and clicks.
+
+    Called by assets/ad_tracking.js through navigator.sendBeacon, which
+    cannot set headers, so the body is parsed regardless of Content-Type.
+
+    Expected JSON body:
+        - events: List of {type: "impression" | "click", campaign_id, page}
+          (at most MAX_BATCH_EVENTS are recorded)
+
+    Returns:
+        JSON with the number of events recorded
+    """
+    # If called from within Dash (not as API), return no_update
+    if ctx.triggered_id == 'ad-events-api-trigger':
+        return no_update
+
+    try:
+        data = json.loads(request.get_data(cache=False) or b'{}')
+        events = data.get('events') if isinstance(data, dict) else None
+        if not isinstance(events, list):
+            return jsonify({"error": "Missing required fields"}), 400
+        if len(events) > MAX_BATCH_EVENTS:
+            return jsonify({"error": f"At most {MAX_BATCH_EVENTS} events per batch"}), 413
+
+        recorded = track_events(events, _request_session_id())
+        return jsonify({"status": "success", "recorded": recorded}), 200
+
+    except ValueError:
+        return jsonify({"error": "Invalid JSON"}), 400
+    except Exception as e:
+        print(f"[Advertising API] Error tracking event batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Server-side API endpoint that picks a campaign for an ad slot at render time
+@callback(
+    Output('ad-slot-api-response', 'data'),  # Dummy output
+    Input('ad-slot-api-trigger', 'data'),     # Dummy input
+    api_endpoint='/api/ad-slot',
+    hidden=True
+)
+def ad_slot_api(trigger_data):
+    """
+    API endpoint returning the campaign to show in an ad slot.
+
+    Called by the slot loader below each time a slot renders, so ads rotate
+    per page view. The impression is reported later through /api/ad-events,
+    once the ad has been in view.
+
+    Expected JSON body:
+        - page: Page the slot is on
+
+    Returns:
+        JSON with campaign_id, campaign_url, image, name and page,
+        or {"campaign": null} when no campaign is active
+    """
+    # If called from within Dash (not as API), return no_update
+    if ctx.triggered_id == 'ad-slot-api-trigger':
+        return no_update
+
+    try:
+        data = request.get_json() or {}
+        page = data.get('page')
+        if not page:
+            return jsonify({"error": "Missing required fields"}), 400
+
+        slot = serve_ad_slot(page)
+        if slot is None:
+            return jsonify({"campaign": None}), 200
+        return jsonify(slot), 200
+
+    except Exception as e:
+        print(f"[Advertising API] Error serving ad slot: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Load the campaign for an ad slot when it renders
 clientside_callback(
     """
-    function(n_clicks, campaign_data) {
-        if (n_clicks && campaign_data) {
-            console.log('[Advertising] Ad clicked:', campaign_data);
+    async function(slot) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (!slot) {
+            return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate];
+        }
 
-            // Send click tracking to server via fetch
-            fetch('/api/track-ad-click', {
+        try {
+            const response = await fetch('/api/ad-slot', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    campaign_id: campaign_data.campaign_id,
-                    page: campaign_data.page,
-                    timestamp: new Date().toISOString()
-                })
-            }).catch(error => console.error('[Advertising] Error tracking click:', error));
+                body: JSON.stringify({page: slot.page})
+            });
+            const campaign = await response.json();
+            if (!response.ok || !campaign.campaign_id) {
+                return [null, noUpdate, noUpdate, noUpdate, {display: 'none'}];
+            }
+            if (window.adTracking) {
+                window.adTracking.observe(
+                    {type: 'ad-container', page: slot.page, viewport: slot.viewport},
+                    campaign
+                );
+            }
+            return [campaign, campaign.campaign_url, campaign.image, campaign.name, {}];
+        } catch (error) {
+            console.error('[Advertising] Error loading ad slot:', error);
+            return [null, noUpdate, noUpdate, noUpdate, {display: 'none'}];
+        }
+    }
+    """,
+    Output({"type": "ad-campaign-data", "page": MATCH, "viewport": MATCH}, "data"),
+    Output({"type": "ad-link", "page": MATCH, "viewport": MATCH}, "href"),
+    Output({"type": "ad-image", "page": MATCH, "viewport": MATCH}, "src"),
+    Output({"type": "ad-image", "page": MATCH, "viewport": MATCH}, "alt"),
+    Output({"type": "ad-container", "page": MATCH, "viewport": MATCH}, "style"),
+    Input({"type": "ad-slot", "page": MATCH, "viewport": MATCH}, "data"),
+    prevent_initial_call=False,
+    hidden=True
+)
+
+
+# Track ad clicks with clientside callback for immediate navigation
+clientside_callback(
+    """
+    function(n_clicks, campaign_data) {
+        if (n_clicks && campaign_data) {
+            console.log('[Advertising] Ad clicked:', campaign_data);
+
+            // Queue the click and flush right away; sendBeacon survives the navigation
+            if (window.adTracking) {
+                window.adTracking.click(campaign_data);
+            }
         }
 
         return null;
@@ -2,42 +2,88 @@
 Advertising Analytics Helper
 Load and analyze advertising campaign performance data
 """
-import json
-from pathlib import Path
 from collections import Counter
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from lib.advertising import CONFIG_FILE, ANALYTICS_FILE, load_config
+from lib.ad_event_journal import AdEventIndex
+from lib.ad_rollups import CLICKS, IMPRESSIONS
+from lib.advertising import ad_event_journal, campaign_registry
 
 
-def load_analytics_data() -> Dict:
-    """Load advertising analytics data from JSON file."""
-    if not ANALYTICS_FILE.exists():
-        return {"clicks": [], "impressions": []}
+# Index over the ad event journal (daily rollups plus recent raw events)
+ad_event_index = AdEventIndex(ad_event_journal)
 
+
+def refresh_index() -> AdEventIndex:
+    """
+    Ingest new journal events into the index and its rollups.
+
+    Callers computing several views at once refresh once and pass the
+    returned index to the getters below, which otherwise refresh themselves.
+    """
     try:
-        with open(ANALYTICS_FILE, 'r') as f:
-            return json.load(f)
+        ad_event_index.refresh()
     except Exception as e:
         print(f"[Ad Analytics] Error loading data: {e}")
-        return {"clicks": [], "impressions": []}
+    return ad_event_index
+
+
+def _index(index: Optional[AdEventIndex]) -> AdEventIndex:
+    """The given (already refreshed) index, or the shared one freshly refreshed."""
+    return index if index is not None else refresh_index()
+
+
+def load_events(event_type: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, index: Optional[AdEventIndex] = None) -> List[Dict]:
+    """
+    Get recent raw events of one type with start <= timestamp <= end.
+
+    Only the last few days are kept raw (see RAW_EVENT_DAYS); aggregate
+    queries below go through the daily rollups instead.
+
+    Args:
+        event_type: "impression" or "click"
+        start: Range start (None = oldest raw event)
+        end: Range end (None = now)
+        index: Index already refreshed by the caller (None = refresh the shared one)
+    """
+    return _index(index).query(event_type, start, end)
 
 
-def get_campaign_performance() -> List[Dict]:
+def load_totals(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                index: Optional[AdEventIndex] = None) -> Dict[Tuple[str, str], List[int]]:
+    """
+    Impressions and clicks per (campaign_id, page) in a range.
+
+    Ranges shorter than RAW_EVENT_DAYS are exact; longer ones are resolved at
+    day granularity from the rollups.
+    """
+    return _index(index).totals(start, end)
+
+
+def get_campaign_performance(start: Optional[datetime] = None,
+                             end: Optional[datetime] = None,
+                             index: Optional[AdEventIndex] = None) -> List[Dict]:
     """
     Get performance metrics for each campaign.
 
+    Args:
+        start: Only count events at or after this time (None = all time)
+        end: Only count events at or before this time (None = now)
+        index: Index already refreshed by the caller (None = refresh the shared one)
+
     Returns:
         List of campaign dictionaries with performance metrics
     """
-    config = load_config()
-    campaigns = config.get("campaigns", [])
-    analytics = load_analytics_data()
+    campaigns = campaign_registry.campaigns()
 
     # Count clicks and impressions per campaign
-    click_counts = Counter(c['campaign_id'] for c in analytics.get('clicks', []))
-    impression_counts = Counter(i['campaign_id'] for i in analytics.get('impressions', []))
+    click_counts = Counter()
+    impression_counts = Counter()
+    for (campaign_id, _), counts in load_totals(start, end, index).items():
+        impression_counts[campaign_id] += counts[IMPRESSIONS]
+        click_counts[campaign_id] += counts[CLICKS]
 
     # Build performance data
     performance = []
@@ -54,7 +100,7 @@ def get_campaign_performance() -> List[Dict]:
             'name': campaign['name'],
             'url': campaign.get('url', '#'),
             'image': campaign.get('image', ''),
-            'active': campaign.get('active', False),
+            'active': campaign_registry.is_active(campaign_id),
             'clicks': clicks,
             'impressions': impressions,
             'ctr': round(ctr, 2),
@@ -69,18 +115,25 @@ def get_campaign_performance() -> List[Dict]:
     return performance
 
 
-def get_clicks_by_page() -> List[Dict]:
+def get_clicks_by_page(start: Optional[datetime] = None,
+                       end: Optional[datetime] = None,
+                       index: Optional[AdEventIndex] = None) -> List[Dict]:
     """
     Get click counts grouped by page.
 
+    Args:
+        start: Only count clicks at or after this time (None = all time)
+        end: Only count clicks at or before this time (None = now)
+        index: Index already refreshed by the caller (None = refresh the shared one)
+
     Returns:
         List of dictionaries with page and click count
     """
-    analytics = load_analytics_data()
-    clicks = analytics.get('clicks', [])
-
     # Count clicks per page
-    page_counts = Counter(c['page'] for c in clicks)
+    page_counts = Counter()
+    for (_, page), counts in load_totals(start, end, index).items():
+        if counts[CLICKS]:
+            page_counts[page] += counts[CLICKS]
 
     # Convert to list of dicts
     result = [
@@ -91,23 +144,57 @@ def get_clicks_by_page() -> List[Dict]:
     return result
 
 
-def get_total_stats() -> Dict:
+def get_total_stats(start: Optional[datetime] = None,
+                    end: Optional[datetime] = None,
+                    index: Optional[AdEventIndex] = None) -> Dict:
     """
     Get total advertising statistics.
 
+    Args:
+        start: Only count events at or after this time (None = all time)
+        end: Only count events at or before this time (None = now)
+        index: Index already refreshed by the caller (None = refresh the shared one)
+
     Returns:
         Dictionary with total clicks, impressions, and CTR
     """
-    analytics = load_analytics_data()
-    clicks = len(analytics.get('clicks', []))
-    impressions = len(analytics.get('impressions', []))
+    totals = load_totals(start, end, index).values()
+    clicks = sum(counts[CLICKS] for counts in totals)
+    impressions = sum(counts[IMPRESSIONS] for counts in totals)
     ctr = (clicks / impressions * 100) if impressions > 0 else 0
 
-    active_campaigns = len([c for c in load_config().get("campaigns", []) if c.get("active", False)])
+    active_campaigns = len(campaign_registry.active_campaigns())
 
     return {
         'total_clicks': clicks,
         'total_impressions': impressions,
         'overall_ctr': round(ctr, 2),
         'active_campaigns': active_campaigns
-    }
\ No newline at end of file
+    }
+
+
+def get_ctr_by_day(start: Optional[datetime] = None,
+                   end: Optional[datetime] = None,
+                   campaign_id: Optional[str] = None,
+                   index: Optional[AdEventIndex] = None) -> List[Dict]:
+    """
+    Get daily impressions, clicks and CTR from the rollups.
+
+    Args:
+        start: First day to include (None = all time)
+        end: Last day to include (None = today)
+        campaign_id: Only this campaign (None = all campaigns)
+        index: Index already refreshed by the caller (None = refresh the shared one)
+
+    Returns:
+        List of dictionaries with date, impressions, clicks and ctr, oldest first
+    """
+    return [
+        {
+            'date': day,
+            'impressions': impressions,
+            'clicks': clicks,
+            'ctr': round(clicks / impressions * 100, 2) if impressions > 0 else 0
+        }
+        for day, impressions, clicks in _index(index).daily(start, end, campaign_id)
+    ]
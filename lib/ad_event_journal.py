@@ -0,0 +1,549 @@
+"""
+Advertising Event Journal
+Append-only, per-worker segment files for ad impressions and clicks, with incremental compaction, rollups and a read index
+"""
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from lib.ad_rollups import AdRollups
+
+
+# Segments are rolled every hour; a segment from an earlier hour is sealed
+SEGMENT_SLOT_FORMAT = "%Y%m%d%H"
+
+# Sealed segments must also be this old (seconds) before compaction touches them
+SEGMENT_SETTLE_SECONDS = 60
+
+# Compact once this many sealed segments have accumulated
+COMPACT_MIN_SEGMENTS = 8
+
+# Compacted runs beyond this are merged back into one on the next compaction
+COMPACT_MAX_RUNS = 16
+
+# Lists the live compacted runs and rollups; replacing it publishes a compaction
+MANIFEST_FILE = "manifest.json"
+COMPACTED_PREFIX = "compacted-"
+ROLLUPS_PREFIX = "rollups-"
+
+# Attempts at loading a consistent view while compactions keep publishing
+REFRESH_ATTEMPTS = 3
+
+EVENT_TYPES = ("impression", "click")
+
+# Raw events are kept in memory for this many days (plus today); older ranges use daily rollups
+RAW_EVENT_DAYS = 2
+
+
+def raw_event_cutoff(now: Optional[datetime] = None) -> str:
+    """ISO timestamp before which raw events are no longer kept in memory."""
+    now = now or datetime.now()
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (start_of_day - timedelta(days=RAW_EVENT_DAYS)).isoformat()
+
+
+class AdEventJournal:
+    """
+    Append-only ad event log.
+
+    Each worker process appends JSON lines to its own hourly segment
+    (``<slot>-<pid>.jsonl``) through an ``O_APPEND`` descriptor, one
+    ``os.write`` per event (or per batch), so recording never reads the history and
+    needs no lock. Writers start ``compact()`` on a background thread when
+    they roll over to a new segment; it folds the sealed segments into a new
+    timestamp-ordered run (``compacted-<generation>.jsonl``) and extends the
+    persisted daily rollups, so neither a compaction nor a restart
+    re-aggregates history.
+
+    ``manifest.json`` is the single source of truth for readers: it names the
+    live runs, the rollups file and the segments already folded into a run.
+    A compaction writes its run and rollups first and publishes them by
+    replacing the manifest, so readers see either the segments or the run,
+    never both.
+    """
+
+    def __init__(self, directory, legacy_file=None):
+        """
+        Args:
+            directory: Directory holding the segment files
+            legacy_file: Optional advertising_analytics.json to import on first compaction
+        """
+        self.directory = Path(directory)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self._fd = None
+        self._fd_key = None  # (pid, slot) the open descriptor belongs to
+        self._rollover_lock = threading.Lock()  # Only taken when switching segments
+        self._compaction_thread = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_FILE
+
+    def read_manifest(self) -> Dict:
+        """
+        Current manifest.
+
+        Returns:
+            Dictionary with generation, runs ({file, raw_offset} oldest first),
+            rollups (file name or None) and consumed (segment names folded
+            into a run but possibly not deleted yet)
+        """
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Advertising] Error reading event journal manifest: {e}")
+        return {"generation": 0, "runs": [], "rollups": None, "consumed": []}
+
+    def load_rollups(self, manifest: Dict) -> Optional[AdRollups]:
+        """
+        Load the persisted rollups of a manifest's runs.
+
+        Returns:
+            The rollups, or None if the manifest has none or the file is gone
+        """
+        if not manifest.get("rollups"):
+            return None
+        try:
+            with open(self.directory / manifest["rollups"], "r") as f:
+                return AdRollups.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def run_paths(self, manifest: Dict) -> List[Tuple[Path, int]]:
+        """(path, byte offset of the first recent raw event) of each live run."""
+        return [(self.directory / run["file"], run["raw_offset"]) for run in manifest["runs"]]
+
+    def _segment_fd(self) -> int:
+        """Descriptor for this process's current segment (reopened after fork or rollover)."""
+        key = (os.getpid(), datetime.now().strftime(SEGMENT_SLOT_FORMAT))
+        if self._fd_key == key:
+            return self._fd
+
+        with self._rollover_lock:
+            if self._fd_key != key:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                fd = os.open(
+                    self.directory / f"{key[1]}-{key[0]}.jsonl",
+                    os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                    0o644
+                )
+                old_fd, self._fd, self._fd_key = self._fd, fd, key
+                if old_fd is not None:
+                    try:
+                        os.close(old_fd)
+                    except OSError:
+                        pass
+                    # The previous segment is sealed now
+                    self.compact_in_background()
+            return self._fd
+
+    def append(self, event_type: str, campaign_id: str, page: str, session_id: Optional[str] = None,
+               timestamp: Optional[str] = None):
+        """
+        Record one event.
+
+        Args:
+            event_type: "impression" or "click"
+            campaign_id: Campaign the event belongs to
+            page: Page where the event happened
+            session_id: Optional session identifier
+            timestamp: ISO timestamp (defaults to now)
+        """
+        self.append_many([(event_type, campaign_id, page, session_id, timestamp)])
+
+    def append_many(self, events: List[Tuple]):
+        """
+        Record a batch of events with a single write.
+
+        Args:
+            events: (event_type, campaign_id, page, session_id, timestamp) tuples;
+                session_id and timestamp may be None
+        """
+        now = datetime.now().isoformat()
+        lines = []
+        for event_type, campaign_id, page, session_id, timestamp in events:
+            event = {
+                "type": event_type,
+                "campaign_id": campaign_id,
+                "page": page,
+                "timestamp": timestamp or now,
+            }
+            if session_id:
+                event["session_id"] = session_id
+            lines.append(json.dumps(event) + "\n")
+        if lines:
+            os.write(self._segment_fd(), "".join(lines).encode())
+
+    def segments(self, manifest: Optional[Dict] = None) -> List[Path]:
+        """Segment files not yet folded into a compacted run, oldest slot first."""
+        if not self.directory.exists():
+            return []
+        consumed = set((manifest or self.read_manifest())["consumed"])
+        return sorted(
+            p for p in self.directory.glob("*.jsonl")
+            if not p.name.startswith(COMPACTED_PREFIX) and p.name not in consumed
+        )
+
+    def sealed_segments(self, manifest: Optional[Dict] = None) -> List[Path]:
+        """Segments no writer will append to any more."""
+        current_slot = datetime.now().strftime(SEGMENT_SLOT_FORMAT)
+        cutoff = time.time() - SEGMENT_SETTLE_SECONDS
+        sealed = []
+        for path in self.segments(manifest):
+            try:
+                if path.name.split("-", 1)[0] < current_slot and path.stat().st_mtime < cutoff:
+                    sealed.append(path)
+            except OSError:
+                continue
+        return sealed
+
+    def _migrates_legacy(self) -> bool:
+        """True until the legacy file has been imported by a first compaction."""
+        return self.legacy_file is not None and self.legacy_file.exists() and not self.manifest_path.exists()
+
+    def needs_compaction(self) -> bool:
+        """True when sealed segments piled up, or the legacy file has not been imported yet."""
+        if self._migrates_legacy():
+            return True
+        return len(self.sealed_segments()) >= COMPACT_MIN_SEGMENTS
+
+    def _legacy_events(self) -> List[Dict]:
+        """Events from the old single-file format, tagged with their type."""
+        try:
+            with open(self.legacy_file, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[Advertising] Error reading legacy analytics file: {e}")
+            return []
+
+        events = []
+        for event_type, key in (("impression", "impressions"), ("click", "clicks")):
+            for event in data.get(key, []):
+                events.append({"type": event_type, **event})
+        return events
+
+    def _compact_if_needed(self):
+        try:
+            if self.needs_compaction():
+                self.compact()
+        except Exception as e:
+            print(f"[Advertising] Error compacting event journal: {e}")
+
+    def compact_in_background(self):
+        """Compact on a daemon thread if enough sealed segments piled up (no-op while one runs)."""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._compact_if_needed, daemon=True)
+        self._compaction_thread.start()
+
+    def _write_run(self, path: Path, events: List[Dict]) -> int:
+        """
+        Write timestamp-ordered events to a run file atomically.
+
+        Returns:
+            Byte offset of the first event inside the raw retention window
+        """
+        cutoff = raw_event_cutoff()
+        raw_offset = None
+        written = 0
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            for event in events:
+                if raw_offset is None and event.get("timestamp", "") >= cutoff:
+                    raw_offset = written
+                line = (json.dumps(event) + "\n").encode()
+                f.write(line)
+                written += len(line)
+        os.replace(tmp_path, path)
+        return written if raw_offset is None else raw_offset
+
+    def compact(self, blocking: bool = False) -> bool:
+        """
+        Fold sealed segments (and the legacy file, once) into a new compacted run.
+
+        Only the new segments are read and written; the existing runs are left
+        alone and their rollups extended, except that once COMPACT_MAX_RUNS
+        runs exist they are merged into the new one. Only one process compacts
+        at a time; others skip unless ``blocking``.
+
+        Returns:
+            True if a compaction ran
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".compact.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+
+            manifest = self.read_manifest()
+            sealed = self.sealed_segments(manifest)
+            migrate_legacy = self._migrates_legacy()
+            if not sealed and not migrate_legacy:
+                return False
+
+            runs = manifest["runs"]
+            rollups = self.load_rollups(manifest)
+            if rollups is None:
+                rollups = AdRollups()
+                for path, _ in self.run_paths(manifest):
+                    for event in read_events(path)[0]:
+                        rollups.add(event)
+
+            events = self._legacy_events() if migrate_legacy else []
+            for path in sealed:
+                events.extend(read_events(path)[0])
+            for event in events:
+                rollups.add(event)
+
+            merged_runs = []
+            if len(runs) >= COMPACT_MAX_RUNS:
+                merged_runs = self.run_paths(manifest)
+                for path, _ in merged_runs:
+                    events.extend(read_events(path)[0])
+                runs = []
+            events.sort(key=lambda e: e.get("timestamp", ""))
+
+            generation = manifest["generation"] + 1
+            run_file = f"{COMPACTED_PREFIX}{generation:06d}.jsonl"
+            rollups_file = f"{ROLLUPS_PREFIX}{generation:06d}.json"
+            raw_offset = self._write_run(self.directory / run_file, events)
+            rollups.save(self.directory / rollups_file, generation=generation)
+
+            # Segments folded earlier but not deleted yet (e.g. a crash) stay hidden from readers
+            consumed = [name for name in manifest["consumed"] if (self.directory / name).exists()]
+            consumed.extend(path.name for path in sealed)
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "generation": generation,
+                    "runs": runs + [{"file": run_file, "raw_offset": raw_offset}],
+                    "rollups": rollups_file,
+                    "consumed": consumed,
+                }, f)
+            os.replace(tmp_path, self.manifest_path)
+
+            # Published: drop what the new manifest no longer references
+            stale = [self.directory / name for name in consumed] + [path for path, _ in merged_runs]
+            if manifest.get("rollups"):
+                stale.append(self.directory / manifest["rollups"])
+            for path in stale:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            if migrate_legacy:
+                self.legacy_file.rename(self.legacy_file.with_suffix(".json.migrated"))
+
+            print(f"[Advertising] Compacted {len(sealed)} event segments into run {generation} "
+                  f"({len(events)} events)")
+            return True
+
+
+def read_events(path: Path, offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Read events from a journal file, starting at a byte offset.
+
+    A trailing partial line (a write in progress) is left for the next read.
+
+    Returns:
+        Tuple of (events, offset just past the last complete line)
+    """
+    events = []
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        pass
+    return events, offset
+
+
+class AdEventIndex:
+    """
+    Incrementally maintained view of the ad event journal.
+
+    Each refresh reads only the bytes appended to segments since the last one
+    (tracked per file offset). A new manifest generation, or a segment that
+    disappeared, means the journal was compacted, and the index is rebuilt
+    from the persisted rollups plus the recent events of each run.
+
+    Every event is folded into daily rollups as it is ingested; raw events
+    are only kept for the last RAW_EVENT_DAYS days, sorted for bisect range
+    queries on short ranges.
+    """
+
+    def __init__(self, journal: AdEventJournal):
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._generation = None
+        self._offsets: Dict[Path, int] = {}
+        self._raw_cutoff = raw_event_cutoff()
+        self.rollups = AdRollups()
+        self._times: Dict[str, List[str]] = {t: [] for t in EVENT_TYPES}
+        self._events: Dict[str, List[Dict]] = {t: [] for t in EVENT_TYPES}
+
+    def _reset(self):
+        self._offsets = {}
+        self.rollups = AdRollups()
+        self._times = {t: [] for t in EVENT_TYPES}
+        self._events = {t: [] for t in EVENT_TYPES}
+
+    def _load_compacted(self, manifest: Dict):
+        """Load the compacted runs, from their persisted rollups plus recent raw events when possible."""
+        rollups = self.journal.load_rollups(manifest)
+        if rollups is not None:
+            self.rollups = rollups
+            for path, raw_offset in self.journal.run_paths(manifest):
+                for event in read_events(path, raw_offset)[0]:
+                    self._insert(event, rollup=False)
+            return
+
+        for path, _ in self.journal.run_paths(manifest):
+            for event in read_events(path)[0]:
+                self._insert(event)
+
+    def _prune_raw(self):
+        """Drop raw events that fell out of the retention window."""
+        self._raw_cutoff = raw_event_cutoff()
+        for event_type, times in self._times.items():
+            if times and times[0] < self._raw_cutoff:
+                keep_from = bisect.bisect_left(times, self._raw_cutoff)
+                self._times[event_type] = times[keep_from:]
+                self._events[event_type] = self._events[event_type][keep_from:]
+
+    def _insert(self, event: Dict, rollup: bool = True):
+        event_type = event.get("type")
+        if event_type not in self._times:
+            return
+        if rollup:
+            self.rollups.add(event)
+        timestamp = event.get("timestamp", "")
+        if timestamp < self._raw_cutoff:
+            return
+        times = self._times[event_type]
+        records = self._events[event_type]
+        if not times or timestamp >= times[-1]:
+            times.append(timestamp)
+            records.append(event)
+        else:
+            position = bisect.bisect_right(times, timestamp)
+            times.insert(position, timestamp)
+            records.insert(position, event)
+
+    @staticmethod
+    def _size(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_size
+        except OSError:
+            return None
+
+    def _refresh_once(self):
+        manifest = self.journal.read_manifest()
+        sizes = {path: self._size(path) for path in self.journal.segments(manifest)}
+
+        vanished = any(path not in sizes for path in self._offsets)
+        shrunk = any(
+            sizes[path] is not None and sizes[path] < offset
+            for path, offset in self._offsets.items() if path in sizes
+        )
+        self._prune_raw()
+        if manifest["generation"] != self._generation or vanished or shrunk:
+            self._reset()
+            self._generation = manifest["generation"]
+            self._load_compacted(manifest)
+
+        for path, size in sizes.items():
+            offset = self._offsets.get(path, 0)
+            if size is None or size == offset:
+                continue
+            events, self._offsets[path] = read_events(path, offset)
+            for event in events:
+                self._insert(event)
+
+    def refresh(self):
+        """Pick up new events (compaction is left to the writers, see AdEventJournal)."""
+        with self._lock:
+            # A compaction published while reading may have deleted files mid-read; reload then
+            for _ in range(REFRESH_ATTEMPTS):
+                self._refresh_once()
+                if self.journal.read_manifest()["generation"] == self._generation:
+                    break
+
+    def query(self, event_type: str, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> List[Dict]:
+        """
+        Get raw events of a type with start <= timestamp <= end, oldest first.
+
+        Only the last RAW_EVENT_DAYS days are kept raw; use totals()/daily()
+        for longer ranges.
+
+        Args:
+            event_type: "impression" or "click"
+            start: Range start (None = all time)
+            end: Range end (None = up to the latest event)
+        """
+        with self._lock:
+            times = self._times.get(event_type, [])
+            lo = bisect.bisect_left(times, start.isoformat()) if start else 0
+            hi = bisect.bisect_right(times, end.isoformat()) if end else len(times)
+            return self._events[event_type][lo:max(lo, hi)]
+
+    def _raw_covers(self, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        """True for short ranges that the raw events answer exactly."""
+        return (
+            start is not None and end is not None
+            and end - start < timedelta(days=RAW_EVENT_DAYS)
+            and start.isoformat() >= self._raw_cutoff
+        )
+
+    def totals(self, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Impressions and clicks per (campaign_id, page) in a range.
+
+        Short recent ranges are counted exactly from raw events; longer ones
+        are summed from the daily rollups of every day the range touches.
+
+        Returns:
+            Dictionary of (campaign_id, page) -> [impressions, clicks]
+        """
+        with self._lock:
+            if not self._raw_covers(start, end):
+                return self.rollups.totals(
+                    start.date().isoformat() if start else None,
+                    end.date().isoformat() if end else None
+                )
+
+        totals: Dict[Tuple[str, str], List[int]] = {}
+        for position, event_type in enumerate(EVENT_TYPES):
+            for event in self.query(event_type, start, end):
+                counts = totals.setdefault((event.get("campaign_id"), event.get("page")), [0, 0])
+                counts[position] += 1
+        return totals
+
+    def daily(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              campaign_id: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """Per-day (day, impressions, clicks) from the rollups, oldest first."""
+        with self._lock:
+            return self.rollups.by_day(
+                start.date().isoformat() if start else None,
+                end.date().isoformat() if end else None,
+                campaign_id
+            )
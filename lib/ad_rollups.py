@@ -0,0 +1,123 @@
+"""
+Advertising Rollups
+Impression and click counts per (campaign, page, day), maintained as events are ingested
+"""
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Index of each event type in a rollup counter pair
+IMPRESSIONS = 0
+CLICKS = 1
+_COUNTER_INDEX = {"impression": IMPRESSIONS, "click": CLICKS}
+
+
+class AdRollups:
+    """
+    Daily ad performance counters.
+
+    Each day maps (campaign_id, page) to [impressions, clicks], so campaign
+    tables and per-day CTR series cost O(campaigns x pages x days) no matter
+    how many raw events were recorded. Rollups are mergeable and serialize to
+    a compact JSON file, letting a restart skip re-aggregating the history.
+    """
+
+    def __init__(self):
+        # day (YYYY-MM-DD) -> (campaign_id, page) -> [impressions, clicks]
+        self._days: Dict[str, Dict[Tuple[str, str], List[int]]] = {}
+
+    def add(self, event: Dict):
+        """Count one journal event."""
+        index = _COUNTER_INDEX.get(event.get("type"))
+        timestamp = event.get("timestamp", "")
+        if index is None or len(timestamp) < 10:
+            return
+        cells = self._days.setdefault(timestamp[:10], {})
+        key = (event.get("campaign_id"), event.get("page"))
+        counts = cells.get(key)
+        if counts is None:
+            counts = cells[key] = [0, 0]
+        counts[index] += 1
+
+    def merge(self, other: "AdRollups") -> "AdRollups":
+        for day, cells in other._days.items():
+            target = self._days.setdefault(day, {})
+            for key, (impressions, clicks) in cells.items():
+                counts = target.setdefault(key, [0, 0])
+                counts[IMPRESSIONS] += impressions
+                counts[CLICKS] += clicks
+        return self
+
+    def _days_in(self, first_day: Optional[str], last_day: Optional[str]):
+        first_day = first_day or ""
+        last_day = last_day or "9999"
+        for day in sorted(self._days):
+            if first_day <= day <= last_day:
+                yield day, self._days[day]
+
+    def totals(self, first_day: Optional[str] = None,
+               last_day: Optional[str] = None) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Sum counters over an inclusive day range.
+
+        Returns:
+            Dictionary of (campaign_id, page) -> [impressions, clicks]
+        """
+        totals: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0])
+        for _, cells in self._days_in(first_day, last_day):
+            for key, (impressions, clicks) in cells.items():
+                counts = totals[key]
+                counts[IMPRESSIONS] += impressions
+                counts[CLICKS] += clicks
+        return dict(totals)
+
+    def by_day(self, first_day: Optional[str] = None, last_day: Optional[str] = None,
+               campaign_id: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        Per-day totals over an inclusive day range, oldest first.
+
+        Args:
+            first_day: First day (YYYY-MM-DD, None = earliest)
+            last_day: Last day (YYYY-MM-DD, None = latest)
+            campaign_id: Only count this campaign (None = all campaigns)
+
+        Returns:
+            List of (day, impressions, clicks)
+        """
+        series = []
+        for day, cells in self._days_in(first_day, last_day):
+            impressions = clicks = 0
+            for (cell_campaign, _), counts in cells.items():
+                if campaign_id is None or cell_campaign == campaign_id:
+                    impressions += counts[IMPRESSIONS]
+                    clicks += counts[CLICKS]
+            series.append((day, impressions, clicks))
+        return series
+
+    def to_dict(self) -> Dict:
+        return {
+            "days": {
+                day: [[campaign_id, page, counts[IMPRESSIONS], counts[CLICKS]]
+                      for (campaign_id, page), counts in cells.items()]
+                for day, cells in self._days.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AdRollups":
+        rollups = cls()
+        for day, rows in data.get("days", {}).items():
+            rollups._days[day] = {
+                (campaign_id, page): [impressions, clicks]
+                for campaign_id, page, impressions, clicks in rows
+            }
+        return rollups
+
+    def save(self, path: Path, **meta):
+        """Write the rollups (plus metadata fields) atomically."""
+        tmp_path = Path(path).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({**meta, **self.to_dict()}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
@@ -2,122 +2,105 @@
 Advertising Module
 Handles random ad selection, display, and click tracking for documentation pages
 """
-import json
-import random
+from collections import Counter
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional
-from datetime import datetime
-import threading
 
 import dash_mantine_components as dmc
 from dash import html, dcc
 from dash_iconify import DashIconify
 
+from lib.ad_event_journal import AdEventJournal
+from lib.campaign_pacing import CampaignPacer
+from lib.campaign_registry import CampaignRegistry
+from lib.impression_dedup import create_deduplicator
 
-# Thread lock for file operations
-_lock = threading.Lock()
 
 # Config file paths
 CONFIG_FILE = Path("advertising_config.json")
-ANALYTICS_FILE = Path("advertising_analytics.json")
+ANALYTICS_FILE = Path("advertising_analytics.json")  # Legacy event file, imported into the journal
+EVENTS_DIR = Path("advertising_events")
 
+# Upper bound on events accepted in one /api/ad-events batch
+MAX_BATCH_EVENTS = 100
 
-def load_config() -> Dict:
-    """Load advertising configuration from JSON file."""
-    if not CONFIG_FILE.exists():
-        return {"campaigns": []}
+# Append-only impression/click journal (one segment file per worker)
+ad_event_journal = AdEventJournal(EVENTS_DIR, legacy_file=ANALYTICS_FILE)
 
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"[Advertising] Error loading config: {e}")
-        return {"campaigns": []}
+# Import the legacy file and fold segments sealed while the app was down
+ad_event_journal.compact_in_background()
+
+# Recent (campaign_id, page, session) impressions; shared across workers if AD_DEDUP_DB is set
+impression_dedup = create_deduplicator()
+
+
+def _impressions_since(start: datetime) -> Dict[str, int]:
+    """Impressions per campaign since ``start``, from the shared event journal."""
+    # Imported here because lib.ad_analytics imports this module
+    from lib.ad_analytics import load_events
+    return Counter(event['campaign_id'] for event in load_events('impression', start))
+
+
+# Daily impression pacing for campaigns with a daily_impression_cap
+campaign_pacer = CampaignPacer(sync_source=_impressions_since)
+
+# Cached campaign config, revalidated by mtime
+campaign_registry = CampaignRegistry(CONFIG_FILE)
+
+
+def load_config() -> Dict:
+    """Get the advertising configuration (cached, reloaded when the file changes)."""
+    return campaign_registry.config()
 
 
 def get_active_campaigns() -> List[Dict]:
     """
     Get list of active advertising campaigns.
 
+    A campaign is active when its ``active`` flag is set and the current time
+    is inside its start_date/end_date window.
+
     Returns:
         List of active campaign dictionaries
     """
-    config = load_config()
-    campaigns = config.get("campaigns", [])
-
-    # Filter for active campaigns only
-    active_campaigns = [
-        campaign for campaign in campaigns
-        if campaign.get("active", False)
-    ]
-
-    return active_campaigns
+    return campaign_registry.active_campaigns()
 
 
 def get_random_campaign() -> Optional[Dict]:
     """
-    Select a random active advertising campaign.
+    Select an active advertising campaign.
+
+    Campaigns are drawn in proportion to their optional ``weight``; campaigns
+    ahead of their ``daily_impression_cap`` pace are skipped.
 
     Returns:
         Campaign dictionary or None if no campaigns available
     """
-    campaigns = get_active_campaigns()
-
-    if not campaigns:
-        return None
+    return campaign_registry.random_campaign(accept=campaign_pacer.allows)
 
-    return random.choice(campaigns)
 
-
-def track_impression(campaign_id: str, page: str):
+def track_impression(campaign_id: str, page: str, session_id: str = None):
     """
     Track an advertisement impression (view) with deduplication.
 
-    Only tracks if there isn't a recent impression (within 10 seconds)
-    for the same campaign on the same page to prevent duplicate tracking
-    during layout re-renders.
+    Only tracks if the same session hasn't seen the same campaign on the same
+    page within the dedup window (10 seconds), to prevent duplicate tracking
+    during re-renders.
 
     Args:
         campaign_id: ID of the campaign shown
         page: Page where ad was shown
+        session_id: Optional session identifier
     """
-    if not ANALYTICS_FILE.exists():
-        ANALYTICS_FILE.write_text(json.dumps({"clicks": [], "impressions": []}))
-
     try:
-        with _lock:
-            with open(ANALYTICS_FILE, 'r') as f:
-                data = json.load(f)
-
-            now = datetime.now()
+        if impression_dedup.check_and_add((campaign_id, page, session_id)):
+            # Duplicate impression, skip tracking
+            return
 
-            # Check for recent duplicate impressions (within last 10 seconds)
-            recent_impressions = data.get("impressions", [])
-            for imp in reversed(recent_impressions[-20:]):  # Check last 20 impressions
-                if imp.get("campaign_id") == campaign_id and imp.get("page") == page:
-                    try:
-                        imp_time = datetime.fromisoformat(imp["timestamp"])
-                        time_diff = (now - imp_time).total_seconds()
-
-                        if time_diff < 10:  # Within 10 seconds
-                            # Duplicate impression, skip tracking
-                            return
-                    except:
-                        pass
-
-            # No recent duplicate found, track the impression
-            impression = {
-                "campaign_id": campaign_id,
-                "page": page,
-                "timestamp": now.isoformat(),
-            }
-
-            data["impressions"].append(impression)
-
-            with open(ANALYTICS_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-
-            print(f"[Advertising] Impression tracked: {campaign_id} on {page}")
+        ad_event_journal.append("impression", campaign_id, page, session_id=session_id)
+        campaign_pacer.record(campaign_id)
+        print(f"[Advertising] Impression tracked: {campaign_id} on {page}")
 
     except Exception as e:
         print(f"[Advertising] Error tracking impression: {e}")
@@ -132,66 +115,115 @@ def track_click(campaign_id: str, page: str, session_id: str = None):
         page: Page where click occurred
         session_id: Optional session identifier
     """
-    if not ANALYTICS_FILE.exists():
-        ANALYTICS_FILE.write_text(json.dumps({"clicks": [], "impressions": []}))
-
     try:
-        with _lock:
-            with open(ANALYTICS_FILE, 'r') as f:
-                data = json.load(f)
+        ad_event_journal.append("click", campaign_id, page, session_id=session_id)
+        print(f"[Advertising] Click tracked: {campaign_id} on {page}")
+
+    except Exception as e:
+        print(f"[Advertising] Error tracking click: {e}")
 
-            click = {
-                "campaign_id": campaign_id,
-                "page": page,
-                "timestamp": datetime.now().isoformat(),
-                "session_id": session_id
-            }
 
-            data["clicks"].append(click)
+def track_events(events: List[Dict], session_id: str = None) -> int:
+    """
+    Track a batch of impressions and clicks reported by the browser.
 
-            with open(ANALYTICS_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
+    Events for unknown campaigns or of unknown type are dropped, impressions
+    go through the same dedup and pacing as ``track_impression``, and the
+    batch is written to the journal in one append.
 
-            print(f"[Advertising] Click tracked: {campaign_id} on {page}")
+    Args:
+        events: Dictionaries with type ("impression" or "click"), campaign_id and page
+        session_id: Optional session identifier
+
+    Returns:
+        Number of events recorded
+    """
+    accepted = []
+    try:
+        for event in events[:MAX_BATCH_EVENTS]:
+            if not isinstance(event, dict):
+                continue
+            event_type = event.get('type')
+            campaign_id = event.get('campaign_id')
+            page = event.get('page')
+            if event_type not in ("impression", "click") or not isinstance(page, str) or not page:
+                continue
+            if not isinstance(campaign_id, str) or campaign_registry.get(campaign_id) is None:
+                continue
+            if event_type == "impression" and impression_dedup.check_and_add((campaign_id, page, session_id)):
+                continue
+            accepted.append((event_type, campaign_id, page, session_id, None))
+
+        ad_event_journal.append_many(accepted)
+        for event_type, campaign_id, *_ in accepted:
+            if event_type == "impression":
+                campaign_pacer.record(campaign_id)
 
     except Exception as e:
-        print(f"[Advertising] Error tracking click: {e}")
+        print(f"[Advertising] Error tracking event batch: {e}")
+        return 0
 
+    return len(accepted)
 
-def create_ad_component(page_name: str, viewport: str = "desktop") -> html.Div:
+
+def serve_ad_slot(page: str) -> Optional[Dict]:
     """
-    Create an advertisement component with random campaign selection and click tracking.
+    Pick a campaign for an ad slot that is being rendered.
+
+    The impression is not counted here; the browser reports it through
+    /api/ad-events once the ad has actually been in view.
 
     Args:
-        page_name: Page identifier for unique IDs and tracking
-        viewport: "mobile" or "desktop" for unique IDs
+        page: Page where the slot is shown
 
     Returns:
-        Dash component with clickable advertisement
+        Campaign fields the slot needs, or None if no campaign is active
     """
-    # Get random campaign
     campaign = get_random_campaign()
-
     if not campaign:
-        # No campaigns available, return empty div
-        return html.Div(id={"type": "ad-container", "page": page_name, "viewport": viewport})
+        return None
+
+    return {
+        "campaign_id": campaign['id'],
+        "campaign_url": campaign.get('url', '#'),
+        "image": campaign.get('image', ''),
+        "name": campaign.get('name', 'Advertisement'),
+        "page": page
+    }
+
+
+def create_ad_component(page_name: str, viewport: str = "desktop") -> html.Div:
+    """
+    Create an advertisement slot with click tracking.
+
+    The slot is a static placeholder, so page layouts built once at import
+    stay cacheable. The campaign is fetched from /api/ad-slot when the slot
+    renders (see callbacks/advertising_callbacks.py); the impression is
+    counted once the ad has been in view (assets/ad_tracking.js).
 
-    # Track impression
-    track_impression(campaign['id'], page_name)
+    Args:
+        page_name: Page identifier for unique IDs and tracking
+        viewport: "mobile" or "desktop" for unique IDs
+
+    Returns:
+        Dash component, hidden until a campaign is loaded
+    """
+    # Slot request data; the loader fires once per render
+    slot_store = dcc.Store(
+        id={"type": "ad-slot", "page": page_name, "viewport": viewport},
+        data={"page": page_name, "viewport": viewport}
+    )
 
-    # Store campaign data in a hidden div for click tracking
+    # Store campaign data for click tracking (filled in by the slot loader)
     campaign_data_store = dcc.Store(
-        id={"type": "ad-campaign-data", "page": page_name, "viewport": viewport},
-        data={
-            "campaign_id": campaign['id'],
-            "campaign_url": campaign.get('url', '#'),
-            "page": page_name
-        }
+        id={"type": "ad-campaign-data", "page": page_name, "viewport": viewport}
     )
 
     return html.Div(
         id={"type": "ad-container", "page": page_name, "viewport": viewport},
+        style={"display": "none"},
         children=[
+            slot_store,
             campaign_data_store,
             # Hidden div for click tracking callback output
             html.Div(id={"type": "ad-click-tracker", "page": page_name, "viewport": viewport}, style={"display": "none"}),
@@ -211,7 +243,7 @@ def create_ad_component(page_name: str, viewport: str = "desktop") -> html.Div:
                 }
             ),
             html.A(
-                href=campaign.get('url', '#'),
+                href='#',
                 target="_blank",
                 rel="noopener noreferrer",
                 id={"type": "ad-link", "page": page_name, "viewport": viewport},
@@ -221,8 +253,8 @@ def create_ad_component(page_name: str, viewport: str = "desktop") -> html.Div:
                         [
                             html.Img(
                                 id={"type": "ad-image", "page": page_name, "viewport": viewport},
-                                src=campaign.get('image', ''),
-                                alt=campaign.get('name', 'Advertisement'),
+                                src='',
+                                alt='Advertisement',
                                 style={
                                     "width": "100%",
                                     "height": "auto",
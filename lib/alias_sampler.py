@@ -0,0 +1,52 @@
+"""
+Alias Method Sampler
+Vose's alias table for O(1) weighted random choice
+"""
+import random
+from typing import List, Sequence
+
+
+class AliasTable:
+    """
+    Weighted sampler built with Vose's alias method.
+
+    Construction is O(n); each draw is O(1): pick a column uniformly, then
+    keep it or take its alias with one biased coin flip.
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        """
+        Args:
+            weights: Non-negative weights (at least one must be positive)
+        """
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("AliasTable needs at least one positive weight")
+
+        self.size = n
+        self._probability: List[float] = [0.0] * n
+        self._alias: List[int] = [0] * n
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Leftovers are 1 up to floating point error
+        for i in large + small:
+            self._probability[i] = 1.0
+
+    def sample(self, rng=random) -> int:
+        """Draw an index with probability proportional to its weight."""
+        column = int(rng.random() * self.size)
+        if rng.random() < self._probability[column]:
+            return column
+        return self._alias[column]
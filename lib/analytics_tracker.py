@@ -96,6 +96,10 @@ class AnalyticsTracker:
         session_key = f"{ip_address}:{user_agent}"
         return hashlib.md5(session_key.encode()).hexdigest()
 
+    def get_session_id(self, ip_address, user_agent):
+        """Session ID for a request, matching the one recorded with its visits."""
+        return self._get_session_id(ip_address or "unknown", user_agent or "unknown")
+
     @lru_cache(maxsize=1000)
     def get_geolocation(self, ip_address, session_id=None):
         """Get geolocation data from IP address using ip-api.com (free service)."""
@@ -0,0 +1,48 @@
+"""
+Bloom Filter
+Fixed-memory set membership with no false negatives
+"""
+import hashlib
+import math
+from typing import Optional
+
+
+class BloomFilter:
+    """
+    Bloom filter over a bit array.
+
+    ``value in filter`` is False only if the value was never added; a True
+    answer is wrong with probability about ``fp_rate`` once ``capacity``
+    values have been added. Memory is fixed at construction.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[bytearray] = None):
+        if num_bits < 8 or num_hashes < 1:
+            raise ValueError("BloomFilter needs at least 8 bits and 1 hash")
+
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float = 0.01) -> "BloomFilter":
+        """Size a filter for ``capacity`` values at the given false positive rate."""
+        num_bits = max(8, int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, value):
+        """Bit positions by double hashing two 64-bit halves of one digest."""
+        digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, value):
+        """Add a value to the filter."""
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
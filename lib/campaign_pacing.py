@@ -0,0 +1,134 @@
+"""
+Campaign Pacing
+Per-day impression counters that hold back campaigns running ahead of their daily cap
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+# Impressions a campaign may run ahead of its even-pace target (fraction of the daily cap)
+PACING_BURST_FRACTION = 0.05
+
+# How often the counters are re-synced from the shared event journal (seconds)
+PACING_SYNC_SECONDS = 30
+
+
+def daily_cap(campaign: Dict) -> Optional[float]:
+    """
+    Daily impression cap of a campaign.
+
+    Returns:
+        The cap as a number, or None when the campaign is uncapped (missing,
+        zero, negative or not a number)
+    """
+    cap = campaign.get("daily_impression_cap")
+    if isinstance(cap, bool):
+        return None
+    try:
+        cap = float(cap)
+    except (TypeError, ValueError):
+        return None
+    return cap if cap > 0 else None
+
+
+class CampaignPacer:
+    """
+    Spreads each capped campaign's daily impressions evenly over the day.
+
+    A campaign with ``daily_impression_cap`` C is allowed while today's
+    impressions stay under C * (fraction of the day elapsed) plus a small
+    burst allowance, and never past C. Campaigns without a cap are always
+    allowed. Checks are a dict lookup; counters are bumped locally on each
+    impression and periodically replaced by the journal's counts, so every
+    worker converges on the shared total.
+    """
+
+    def __init__(self, sync_source: Optional[Callable[[datetime], Dict[str, int]]] = None,
+                 sync_seconds: float = PACING_SYNC_SECONDS):
+        """
+        Args:
+            sync_source: Callable (start_of_day) -> {campaign_id: impressions today}
+            sync_seconds: Minimum interval between syncs
+        """
+        self.sync_source = sync_source
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._day = None
+        self._counts: Counter = Counter()
+        self._last_sync = None
+
+    @staticmethod
+    def _start_of_day(now: datetime) -> datetime:
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _roll_day(self, now: datetime):
+        """Reset counters at midnight (caller holds the lock)."""
+        day = now.date()
+        if day != self._day:
+            self._day = day
+            self._counts = Counter()
+            self._last_sync = None
+
+    def _sync_due(self) -> bool:
+        """Claim the next sync if one is due (caller holds the lock)."""
+        if self.sync_source is None:
+            return False
+        now_monotonic = time.monotonic()
+        if self._last_sync is not None and now_monotonic - self._last_sync < self.sync_seconds:
+            return False
+        self._last_sync = now_monotonic
+        return True
+
+    def _update(self, now: datetime):
+        """
+        Roll the day and re-sync from the journal when due.
+
+        The journal is read outside the lock, so other requests keep checking
+        and counting meanwhile; only the swap of the counters is locked.
+        """
+        with self._lock:
+            self._roll_day(now)
+            if not self._sync_due():
+                return
+
+        try:
+            counts = Counter(self.sync_source(self._start_of_day(now)))
+        except Exception as e:
+            print(f"[Advertising] Error syncing pacing counters: {e}")
+            return
+
+        with self._lock:
+            if self._day == now.date():
+                self._counts = counts
+
+    def record(self, campaign_id: str):
+        """Count one impression for today."""
+        now = datetime.now()
+        self._update(now)
+        with self._lock:
+            self._roll_day(now)
+            self._counts[campaign_id] += 1
+
+    def allows(self, campaign: Dict) -> bool:
+        """True if the campaign is within its pace (always True without a daily cap)."""
+        cap = daily_cap(campaign)
+        if cap is None:
+            return True
+
+        now = datetime.now()
+        self._update(now)
+        with self._lock:
+            served = self._counts.get(campaign.get("id"), 0)
+
+        if served >= cap:
+            return False
+        elapsed = (now - self._start_of_day(now)).total_seconds() / 86400
+        return served < cap * elapsed + max(1.0, cap * PACING_BURST_FRACTION)
+
+    def served_today(self, campaign_id: str) -> int:
+        self._update(datetime.now())
+        with self._lock:
+            return self._counts.get(campaign_id, 0)
@@ -0,0 +1,198 @@
+"""
+Campaign Registry
+In-memory advertising campaign config with mtime revalidation and a precomputed active schedule
+"""
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lib.alias_sampler import AliasTable
+
+
+# Minimum seconds between config file stat() checks
+CONFIG_REVALIDATE_SECONDS = float(os.getenv('AD_CONFIG_REVALIDATE_SECONDS', '5'))
+
+# Weighted draws tried before falling back to a scan when campaigns are being held back
+MAX_WEIGHTED_DRAWS = 8
+
+
+def campaign_weight(campaign: Dict) -> float:
+    """Selection weight of a campaign (optional ``weight`` field, default 1)."""
+    try:
+        return max(0.0, float(campaign.get("weight", 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _parse_schedule_date(value, is_end: bool = False) -> Optional[datetime]:
+    """
+    Parse a campaign start_date/end_date.
+
+    Date-only values cover the whole day, so an end date of "2025-06-30"
+    stays active until midnight at the end of that day.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        print(f"[Advertising] Invalid campaign date: {value}")
+        return None
+    if parsed.tzinfo is not None:
+        # Compare in local time, like the naive datetime.now() used for scheduling
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if is_end and len(str(value)) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+class CampaignRegistry:
+    """
+    Parsed campaign config kept in memory.
+
+    The config file is stat()ed at most once every ``revalidate_seconds`` and
+    only re-parsed when its mtime or size changes. The set of campaigns active
+    right now (``active`` flag plus the start_date/end_date window) is computed
+    once and reused until the next schedule boundary, together with an alias
+    table over their weights, so picking an ad is an O(1) draw in memory.
+    """
+
+    def __init__(self, config_file, revalidate_seconds: float = CONFIG_REVALIDATE_SECONDS):
+        """
+        Args:
+            config_file: Path to advertising_config.json
+            revalidate_seconds: Minimum interval between file checks
+        """
+        self.config_file = Path(config_file)
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._config: Dict = {"campaigns": []}
+        self._by_id: Dict[str, Dict] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._last_check = None  # time.monotonic() of the last stat()
+        # Windows as (campaign, start, end) for campaigns with the active flag set
+        self._schedule: List[Tuple[Dict, Optional[datetime], Optional[datetime]]] = []
+        self._active: Tuple[Dict, ...] = ()
+        # (active campaigns with a positive weight, alias table over their weights),
+        # published as one attribute so lock-free readers never pair mismatched halves
+        self._selection: Tuple[Tuple[Dict, ...], Optional[AliasTable]] = ((), None)
+        self._next_boundary: Optional[datetime] = None
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.config_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature):
+        """Parse the config file; keep the current config if it cannot be read."""
+        if signature is None:
+            config = {"campaigns": []}
+        else:
+            try:
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+            except Exception as e:
+                print(f"[Advertising] Error loading config: {e}")
+                return
+
+        campaigns = config.get("campaigns", [])
+        self._config = config
+        self._by_id = {campaign['id']: campaign for campaign in campaigns if 'id' in campaign}
+        self._schedule = [
+            (
+                campaign,
+                _parse_schedule_date(campaign.get("start_date")),
+                _parse_schedule_date(campaign.get("end_date"), is_end=True),
+            )
+            for campaign in campaigns
+            if campaign.get("active", False)
+        ]
+        self._signature = signature
+        self._evaluate_schedule(datetime.now())
+
+    def _evaluate_schedule(self, now: datetime):
+        """Compute the campaigns active at ``now`` and when that set next changes."""
+        active = []
+        boundaries = []
+        for campaign, start, end in self._schedule:
+            if (start is None or start <= now) and (end is None or now < end):
+                active.append(campaign)
+            boundaries.extend(b for b in (start, end) if b is not None and b > now)
+
+        self._active = tuple(active)
+        self._next_boundary = min(boundaries) if boundaries else datetime.max
+
+        # Rebuilt only here, i.e. when the config or the active set changes
+        weighted = tuple(c for c in active if campaign_weight(c) > 0)
+        sampler = AliasTable([campaign_weight(c) for c in weighted]) if weighted else None
+        self._selection = (weighted, sampler)
+
+    def _refresh(self):
+        """Revalidate the config file and the active set if they may be stale."""
+        now_monotonic = time.monotonic()
+        with self._lock:
+            if self._last_check is None or now_monotonic - self._last_check >= self.revalidate_seconds:
+                self._last_check = now_monotonic
+                signature = self._file_signature()
+                if signature != self._signature:
+                    self._load(signature)
+
+            now = datetime.now()
+            if self._next_boundary is None or now >= self._next_boundary:
+                self._evaluate_schedule(now)
+
+    def config(self) -> Dict:
+        """The parsed config (shared; do not mutate)."""
+        self._refresh()
+        return self._config
+
+    def campaigns(self) -> List[Dict]:
+        """All configured campaigns, active or not."""
+        return self.config().get("campaigns", [])
+
+    def get(self, campaign_id: str) -> Optional[Dict]:
+        """Look up a campaign by id."""
+        self._refresh()
+        return self._by_id.get(campaign_id)
+
+    def active_campaigns(self) -> List[Dict]:
+        """Campaigns that are enabled and inside their start_date/end_date window."""
+        self._refresh()
+        return list(self._active)
+
+    def is_active(self, campaign_id: str) -> bool:
+        self._refresh()
+        return any(campaign.get('id') == campaign_id for campaign in self._active)
+
+    def random_campaign(self, accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        """
+        Pick a currently active campaign, weighted by its ``weight``.
+
+        Args:
+            accept: Optional predicate (e.g. pacing) a campaign must pass
+
+        Returns:
+            Campaign dictionary, or None if no active campaign is accepted
+        """
+        self._refresh()
+        weighted, sampler = self._selection
+        if sampler is None:
+            return None
+
+        for _ in range(MAX_WEIGHTED_DRAWS):
+            campaign = weighted[sampler.sample()]
+            if accept is None or accept(campaign):
+                return campaign
+
+        # Most of the weight is held back; draw among the campaigns still accepted
+        candidates = [c for c in weighted if accept(c)]
+        if not candidates:
+            return None
+        return random.choices(candidates, weights=[campaign_weight(c) for c in candidates])[0]
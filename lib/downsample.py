@@ -0,0 +1,149 @@
+"""
+Time Series Downsampling
+Largest-Triangle-Three-Buckets and min/max envelope reduction for chart payloads
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# Horizontal pixels per plotted point when sizing a series to its chart
+PIXELS_PER_POINT = 2
+
+# Point budget used when the chart width is not known yet
+DEFAULT_TARGET_POINTS = 500
+
+MIN_TARGET_POINTS = 50
+
+
+def target_points(width_px: Optional[float], pixels_per_point: int = PIXELS_PER_POINT) -> int:
+    """
+    Number of points worth sending for a chart of the given pixel width.
+
+    Args:
+        width_px: Rendered chart width in pixels (None if not measured yet)
+        pixels_per_point: Horizontal pixels per point
+
+    Returns:
+        Target point count (at least MIN_TARGET_POINTS)
+    """
+    if not width_px:
+        return DEFAULT_TARGET_POINTS
+    return max(MIN_TARGET_POINTS, int(width_px) // pixels_per_point)
+
+
+def lttb_indices(x: Sequence[float], y: Sequence[float], n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The interior is split into
+    n_out - 2 buckets, and from each bucket the point forming the largest
+    triangle with the previously kept point and the next bucket's mean is
+    chosen. Triangle areas within a bucket are computed in one vector operation.
+
+    Args:
+        x: Monotonic x values (timestamps or positions)
+        y: y values
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted array of kept indices
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket edges over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = np.empty(n_out, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Mean of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            mean_x = x[next_start:next_end].mean()
+            mean_y = y[next_start:next_end].mean()
+        else:
+            mean_x, mean_y = x[-1], y[-1]
+
+        # Twice the triangle areas; the constant factor does not affect the argmax
+        areas = np.abs(
+            (x[previous] - mean_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (mean_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[i + 1] = previous
+
+    return kept
+
+
+def minmax_indices(y: Sequence[float], n_out: int) -> np.ndarray:
+    """
+    Indices of the min/max envelope: the lowest and highest point of each bucket.
+
+    Cheaper than LTTB and guarantees every spike survives, at the cost of a
+    less faithful shape between extremes.
+
+    Args:
+        y: y values
+        n_out: Approximate number of points to keep (two per bucket)
+
+    Returns:
+        Sorted array of kept indices (first and last point included)
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = n_out // 2
+
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+
+    # Equal-width buckets; the tail that does not fill a bucket is kept as is
+    width = n // buckets
+    body = y[:buckets * width].reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lows = offsets + body.argmin(axis=1)
+    highs = offsets + body.argmax(axis=1)
+    tail = np.arange(buckets * width, n)
+
+    return np.unique(np.concatenate(([0], lows, highs, tail, [n - 1])))
+
+
+def downsample_rows(rows: List[Dict], y_keys: Sequence[str], n_out: int,
+                    x_key: Optional[str] = None, method: str = "lttb") -> List[Dict]:
+    """
+    Reduce a list of chart rows to about n_out rows.
+
+    Rows are selected, never interpolated, so multi-series rows (e.g. stacked
+    device counts) stay consistent; the selection is driven by the sum of
+    ``y_keys``.
+
+    Args:
+        rows: Chart rows in x order
+        y_keys: Series fields to drive the selection
+        n_out: Target number of rows
+        x_key: Numeric x field (None = use row positions, e.g. for label axes)
+        method: "lttb" or "minmax"
+
+    Returns:
+        The selected rows, in order
+    """
+    if len(rows) <= n_out:
+        return rows
+
+    y = np.array([sum(row.get(key, 0) or 0 for key in y_keys) for row in rows], dtype=float)
+    if method == "minmax":
+        indices = minmax_indices(y, n_out)
+    else:
+        x = np.array([row[x_key] for row in rows], dtype=float) if x_key else np.arange(len(rows))
+        indices = lttb_indices(x, y, n_out)
+
+    return [rows[i] for i in indices]
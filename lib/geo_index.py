@@ -0,0 +1,324 @@
+"""
+Geohash Visitor Location Index
+Incrementally maintained geohash aggregates for clustering the visitor map
+"""
+import calendar
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from lib.hyperloglog import HyperLogLog
+
+
+# Geohash precisions kept per day (2 ≈ 1250km, 3 ≈ 156km, 4 ≈ 39km, 5 ≈ 4.9km cells)
+GEOHASH_PRECISIONS = (2, 3, 4, 5)
+
+# HyperLogLog precision for per-cell unique sessions (256 registers, ~6.5% error)
+CELL_HLL_PRECISION = 8
+
+# Device types broken down per cell (unique sessions of each)
+DEVICE_TYPES = ("desktop", "mobile", "tablet", "bot")
+
+# Upper bound on markers returned for one map render
+MAX_MAP_MARKERS = 300
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {char: i for i, char in enumerate(_BASE32)}
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Encode a latitude/longitude pair as a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def decode_geohash(geohash: str) -> Tuple[float, float]:
+    """Decode a geohash to the (latitude, longitude) of its cell center."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def precision_for_zoom(scale: Optional[float]) -> int:
+    """Pick a geohash precision for a Scattergeo projection scale (1 = whole world)."""
+    scale = scale or 1
+    if scale < 2:
+        return 2
+    if scale < 5:
+        return 3
+    if scale < 15:
+        return 4
+    return 5
+
+
+class GeoCell:
+    """Aggregate of visitor locations inside one geohash cell."""
+
+    __slots__ = ("geohash", "sessions", "lat_sum", "lon_sum", "points", "device_sessions", "places")
+
+    def __init__(self, geohash: str):
+        self.geohash = geohash
+        self.sessions = HyperLogLog(CELL_HLL_PRECISION)
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.points = 0
+        # Unique sessions per device type, so the breakdown adds up to the cell's count
+        self.device_sessions: Dict[str, HyperLogLog] = {}
+        self.places = Counter()
+
+    def add(self, latitude: float, longitude: float, session_id: Optional[str], device_type: str, place: str):
+        self.lat_sum += latitude
+        self.lon_sum += longitude
+        self.points += 1
+        self.places[place] += 1
+        if session_id:
+            self.sessions.add(session_id)
+            sketch = self.device_sessions.get(device_type)
+            if sketch is None:
+                sketch = self.device_sessions[device_type] = HyperLogLog(CELL_HLL_PRECISION)
+            sketch.add(session_id)
+
+    def merge(self, other: "GeoCell") -> "GeoCell":
+        self.sessions.merge(other.sessions)
+        self.lat_sum += other.lat_sum
+        self.lon_sum += other.lon_sum
+        self.points += other.points
+        self.places.update(other.places)
+        for device, sketch in other.device_sessions.items():
+            if device in self.device_sessions:
+                self.device_sessions[device].merge(sketch)
+            else:
+                self.device_sessions[device] = sketch.copy()
+        return self
+
+    def copy(self) -> "GeoCell":
+        return GeoCell(self.geohash).merge(self)
+
+    def to_dict(self) -> Dict:
+        """Serialize for the location map (centroid of the visits in the cell)."""
+        (top_place, _), = self.places.most_common(1)
+        city, _, country = top_place.partition("|")
+        return {
+            "geohash": self.geohash,
+            "latitude": round(self.lat_sum / self.points, 4),
+            "longitude": round(self.lon_sum / self.points, 4),
+            "city": city,
+            "country": country,
+            "other_places": len(self.places) - 1,
+            "count": self.sessions.count(),
+            "device_breakdown": {
+                device: self.device_sessions[device].count() if device in self.device_sessions else 0
+                for device in DEVICE_TYPES
+            },
+        }
+
+
+class GeoIndex:
+    """
+    Per-day geohash aggregates at several precisions.
+
+    Visits are added once as the visit index consumes them, so the map never
+    rescans the visit history. A range query merges the partitions it covers:
+    whole months pre-merged, then the remaining whole days. Unique sessions per
+    cell are HyperLogLog sketches so merging stays cheap and memory per cell is
+    fixed, and the cost of an all-time query grows with months, not days.
+    """
+
+    def __init__(self, precisions: Iterable[int] = GEOHASH_PRECISIONS):
+        self.precisions = tuple(precisions)
+        self._lock = threading.Lock()
+        # day (YYYY-MM-DD) -> precision -> geohash -> GeoCell
+        self._days: Dict[str, Dict[int, Dict[str, GeoCell]]] = {}
+        # month (YYYY-MM) -> precision -> geohash -> GeoCell, the sum of the month's days
+        self._months: Dict[str, Dict[int, Dict[str, GeoCell]]] = {}
+
+    def reset(self):
+        with self._lock:
+            self._days = {}
+            self._months = {}
+
+    @staticmethod
+    def _location_of(visit: Dict) -> Optional[Tuple[float, float, str]]:
+        location = visit.get("location")
+        if not location:
+            return None
+        latitude = location.get("latitude")
+        longitude = location.get("longitude")
+        if latitude is None or longitude is None:
+            return None
+        place = f"{location.get('city') or 'Unknown'}|{location.get('country') or 'Unknown'}"
+        return latitude, longitude, place
+
+    @classmethod
+    def _add_to_cells(cls, cells: Dict[str, GeoCell], visit: Dict, precision: int):
+        located = cls._location_of(visit)
+        if located is None:
+            return
+        latitude, longitude, place = located
+        geohash = encode_geohash(latitude, longitude, precision)
+        cell = cells.get(geohash)
+        if cell is None:
+            cell = cells[geohash] = GeoCell(geohash)
+        cell.add(latitude, longitude, visit.get("session_id"), visit.get("device_type", "desktop"), place)
+
+    def add(self, visit: Dict, epoch: float):
+        """Add a visit (only visits carrying location data are aggregated)."""
+        if self._location_of(visit) is None:
+            return
+
+        day = datetime.fromtimestamp(epoch).date().isoformat()
+        with self._lock:
+            for partition in (
+                self._days.setdefault(day, {p: {} for p in self.precisions}),
+                self._months.setdefault(day[:7], {p: {} for p in self.precisions}),
+            ):
+                for precision in self.precisions:
+                    self._add_to_cells(partition[precision], visit, precision)
+
+    @staticmethod
+    def _top_cells(cells: Iterable[GeoCell], limit: int) -> List[Dict]:
+        result = [cell.to_dict() for cell in cells]
+        result.sort(key=lambda c: c["count"], reverse=True)
+        return result[:limit]
+
+    def _nearest_precision(self, precision: int) -> int:
+        if precision in self.precisions:
+            return precision
+        return min(self.precisions, key=lambda p: abs(p - precision))
+
+    @staticmethod
+    def _merge_into(merged: Dict[str, GeoCell], cells: Dict[str, GeoCell]):
+        for geohash, cell in cells.items():
+            if geohash in merged:
+                merged[geohash].merge(cell)
+            else:
+                merged[geohash] = cell.copy()
+
+    def _merge_days(self, precision: int, first_day: Optional[date], last_day: Optional[date]) -> Dict[str, GeoCell]:
+        """Cells of the whole days first_day..last_day (None = unbounded), months merged as one."""
+        first = first_day.isoformat() if first_day else ""
+        last = last_day.isoformat() if last_day else "9999"
+
+        merged: Dict[str, GeoCell] = {}
+        partial_months = set()
+        with self._lock:
+            for month, partition in self._months.items():
+                year, number = int(month[:4]), int(month[5:])
+                month_first = f"{month}-01"
+                month_last = f"{month}-{calendar.monthrange(year, number)[1]:02d}"
+                if first <= month_first and month_last <= last:
+                    self._merge_into(merged, partition[precision])
+                elif month_first <= last and first <= month_last:
+                    partial_months.add(month)
+            for day, partition in self._days.items():
+                if day[:7] in partial_months and first <= day <= last:
+                    self._merge_into(merged, partition[precision])
+        return merged
+
+    def cells(self, precision: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              limit: int = MAX_MAP_MARKERS) -> List[Dict]:
+        """
+        Get cells for a precision, merged over the days touched by [start, end].
+
+        Ranges are resolved at day granularity; query() adds exact partial
+        first and last days.
+        """
+        precision = self._nearest_precision(precision)
+        merged = self._merge_days(precision, start.date() if start else None, end.date() if end else None)
+        return self._top_cells(merged.values(), limit)
+
+    @classmethod
+    def cells_from_visits(cls, visits: Iterable[Dict], precision: int, limit: int = MAX_MAP_MARKERS) -> List[Dict]:
+        """Aggregate cells directly from a (small) slice of visits."""
+        cells: Dict[str, GeoCell] = {}
+        for visit in visits:
+            cls._add_to_cells(cells, visit, precision)
+        return cls._top_cells(cells.values(), limit)
+
+    def query(self, precision: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              visits_in_range=None, limit: int = MAX_MAP_MARKERS) -> List[Dict]:
+        """
+        Get map cells for a range.
+
+        Short ranges are aggregated from the visits. Longer ones merge the
+        partitions of the whole days inside the range and add the partial
+        first and last days from the visits, so the counts match the range
+        exactly.
+
+        Args:
+            precision: Geohash precision (see precision_for_zoom)
+            start: Range start (None = all time)
+            end: Range end (None = now)
+            visits_in_range: Callable (start, end) -> visits (None = day granularity)
+            limit: Maximum number of cells to return (largest first)
+        """
+        if visits_in_range is None:
+            return self.cells(precision, start, end, limit)
+        precision = self._nearest_precision(precision)
+        if start and end and (end - start) < timedelta(days=2):
+            return self.cells_from_visits(visits_in_range(start, end), precision, limit)
+
+        first_day = last_day = None
+        edges = []
+        if start:
+            first_day = start.date()
+            if start.time() != time.min:
+                first_day += timedelta(days=1)
+                edges.append((start, datetime.combine(first_day, time.min) - timedelta(microseconds=1)))
+        if end:
+            last_day = end.date()
+            if end.time() != time.max:
+                last_day -= timedelta(days=1)
+                edges.append((datetime.combine(end.date(), time.min), end))
+
+        merged = self._merge_days(precision, first_day, last_day)
+        for edge_start, edge_end in edges:
+            for visit in visits_in_range(edge_start, edge_end):
+                self._add_to_cells(merged, visit, precision)
+        return self._top_cells(merged.values(), limit)
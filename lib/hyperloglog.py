@@ -0,0 +1,76 @@
+"""
+HyperLogLog Cardinality Sketch
+Approximate unique counts in fixed memory, mergeable across partitions
+"""
+import hashlib
+import math
+from typing import Optional
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch for approximate distinct counts.
+
+    Uses 2**precision one-byte registers; the standard error is about
+    1.04 / sqrt(2**precision) (~6.5% at precision 8, ~3.3% at precision 10).
+    Sketches with the same precision can be merged by taking register maxima.
+    """
+
+    def __init__(self, precision: int = 10, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.num_registers)
+
+        # Bias correction constant for the register count
+        if self.num_registers == 16:
+            self._alpha = 0.673
+        elif self.num_registers == 32:
+            self._alpha = 0.697
+        elif self.num_registers == 64:
+            self._alpha = 0.709
+        else:
+            self._alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+
+    @staticmethod
+    def _hash(value) -> int:
+        """64-bit hash of a value."""
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, value):
+        """Add a value to the sketch."""
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Merge another sketch into this one (in place)."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added."""
+        estimate = self._alpha * self.num_registers ** 2 / sum(2.0 ** -r for r in self.registers)
+
+        # Small range correction: fall back to linear counting
+        if estimate <= 2.5 * self.num_registers:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = self.num_registers * math.log(self.num_registers / zeros)
+
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
@@ -0,0 +1,126 @@
+"""
+Impression Deduplication
+Time-windowed (campaign, page, session) dedup in memory, or shared across workers through SQLite
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Repeat impressions of the same key inside this window are re-renders
+DEDUP_WINDOW_SECONDS = 10
+
+# Upper bound on keys remembered in memory (oldest expiry evicted first)
+DEDUP_MAX_ENTRIES = 50000
+
+# Optional SQLite file shared by all workers (unset = per-process memory)
+DEDUP_DB = os.getenv('AD_DEDUP_DB')
+
+# Expired rows are purged from the shared table every N inserts
+SHARED_PURGE_EVERY = 1000
+
+
+class MemoryDeduplicator:
+    """
+    Bounded dict of key -> expiry with a min-heap of expiries.
+
+    ``check_and_add`` is O(1) for the lookup; expired keys are popped off the
+    heap lazily (amortized O(log n) per key), and when the table is full the
+    key closest to expiry is evicted.
+    """
+
+    def __init__(self, window_seconds: float = DEDUP_WINDOW_SECONDS, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._expiry: Dict[Tuple, float] = {}
+        self._heap: List[Tuple[float, Tuple]] = []
+
+    def _pop_expired(self, now: float):
+        heap = self._heap
+        while heap and (heap[0][0] <= now or len(self._expiry) > self.max_entries):
+            expires, key = heapq.heappop(heap)
+            # Skip stale heap entries for keys that were re-added later
+            if self._expiry.get(key) == expires:
+                del self._expiry[key]
+
+    def check_and_add(self, key: Tuple) -> bool:
+        """
+        Record a key unless it was seen inside the window.
+
+        Returns:
+            True if the key is a duplicate (seen within the window)
+        """
+        now = time.monotonic()
+        with self._lock:
+            expires = self._expiry.get(key)
+            if expires is not None and expires > now:
+                return True
+
+            expires = now + self.window_seconds
+            self._expiry[key] = expires
+            heapq.heappush(self._heap, (expires, key))
+            self._pop_expired(now)
+            return False
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+class SQLiteDeduplicator:
+    """
+    Deduplication shared by every worker through a SQLite table.
+
+    The check and the insert are one atomic upsert, so two workers racing on
+    the same key record it once. Uses wall-clock expiries since workers do not
+    share a monotonic clock.
+    """
+
+    def __init__(self, db_path, window_seconds: float = DEDUP_WINDOW_SECONDS):
+        self.db_path = str(db_path)
+        self.window_seconds = window_seconds
+        self._local = threading.local()
+        self._inserts = 0
+
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS impression_dedup (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS impression_dedup_expires ON impression_dedup (expires)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def check_and_add(self, key: Tuple) -> bool:
+        """Same contract as MemoryDeduplicator.check_and_add."""
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT INTO impression_dedup (key, expires) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires = excluded.expires WHERE impression_dedup.expires <= ?",
+            ("|".join(str(part) for part in key), now + self.window_seconds, now)
+        )
+        is_duplicate = cursor.rowcount == 0
+
+        if not is_duplicate:
+            self._inserts += 1
+            if self._inserts % SHARED_PURGE_EVERY == 0:
+                conn.execute("DELETE FROM impression_dedup WHERE expires <= ?", (now,))
+        return is_duplicate
+
+
+def create_deduplicator(db_path: Optional[str] = DEDUP_DB):
+    """Shared SQLite deduplicator when AD_DEDUP_DB is set, in-memory otherwise."""
+    if db_path:
+        try:
+            return SQLiteDeduplicator(db_path)
+        except sqlite3.Error as e:
+            print(f"[Advertising] Error opening shared dedup store, using memory: {e}")
+    return MemoryDeduplicator()
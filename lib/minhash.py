@@ -0,0 +1,108 @@
+"""
+MinHash LSH Index
+Near-duplicate lookup of short texts by character-trigram Jaccard similarity
+"""
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+from typing import Dict, Hashable, List, Set, Tuple
+
+# Mersenne prime for the universal hash family
+_PRIME = (1 << 61) - 1
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a text (padded so short words still produce some)."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _hash(shingle: str) -> int:
+    """64-bit hash of a shingle."""
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+class MinHashLSH:
+    """
+    MinHash signatures bucketed by locality-sensitive hashing.
+
+    Each text gets ``num_perm`` minimum hash values; the fraction of equal
+    values estimates the Jaccard similarity of two trigram sets. Signatures
+    are split into ``bands`` bands of ``num_perm // bands`` rows, and texts
+    sharing any band become candidates, so lookups only compare against a
+    few entries. With 64 permutations in 16 bands a pair at similarity 0.7
+    is a candidate ~99% of the time, one at 0.3 only ~12%.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("MinHashLSH num_perm must be a multiple of bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Fixed seed: signatures must agree across processes and restarts
+        rng = random.Random(seed)
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        # key -> signature (8 bytes per permutation)
+        self._signatures: Dict[Hashable, array] = {}
+        # band -> hash of the band's rows -> keys; colliding hashes only add candidates
+        self._buckets: List[Dict[int, Set[Hashable]]] = [defaultdict(set) for _ in range(bands)]
+
+    def signature(self, text: str) -> array:
+        """MinHash signature of a text's trigram set."""
+        hashes = [_hash(shingle) for shingle in trigrams(text)]
+        return array('Q', (min((a * h + b) % _PRIME for h in hashes) for a, b in self._params))
+
+    def _bands(self, signature: array):
+        for band in range(self.bands):
+            yield band, hash(tuple(signature[band * self.rows:(band + 1) * self.rows]))
+
+    def add(self, key: Hashable, text: str):
+        """Index a text under a key (re-adding a key replaces its text)."""
+        self.remove(key)
+        signature = self.signature(text)
+        self._signatures[key] = signature
+        for band, band_hash in self._bands(signature):
+            self._buckets[band][band_hash].add(key)
+
+    def remove(self, key: Hashable):
+        """Drop a key from the index (no-op if absent)."""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_hash in self._bands(signature):
+            bucket = self._buckets[band].get(band_hash)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_hash]
+
+    def query(self, text: str, threshold: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """
+        Keys of indexed texts similar to a text.
+
+        Returns:
+            (key, estimated Jaccard similarity) pairs at or above the
+            threshold, most similar first
+        """
+        signature = self.signature(text)
+        candidates = set()
+        for band, band_hash in self._bands(signature):
+            candidates.update(self._buckets[band].get(band_hash, ()))
+
+        matches = []
+        for key in candidates:
+            other = self._signatures[key]
+            similarity = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._signatures
@@ -0,0 +1,190 @@
+"""
+Admission Control for page chat requests.
+
+Token-bucket rate limits per client IP and per server-issued client session,
+plus a global daily spend budget read from the cost ledger's running totals.
+Checked before any context gathering or API call, so rejected requests cost
+nothing.
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+import threading
+
+
+# Requests per minute and burst size per client IP / per session (0 = unlimited)
+IP_RATE_PER_MINUTE = float(os.getenv('PAGE_CHAT_IP_RATE_PER_MINUTE', '20'))
+IP_BURST = int(os.getenv('PAGE_CHAT_IP_BURST', '5'))
+SESSION_RATE_PER_MINUTE = float(os.getenv('PAGE_CHAT_SESSION_RATE_PER_MINUTE', '6'))
+SESSION_BURST = int(os.getenv('PAGE_CHAT_SESSION_BURST', '3'))
+
+# Global spend per calendar day in USD (unset or 0 = no budget)
+DAILY_BUDGET_USD = float(os.getenv('PAGE_CHAT_DAILY_BUDGET_USD', '0') or 0)
+
+# How long the day's spend is reused before asking the ledger again
+SPEND_CACHE_SECONDS = 5.0
+
+# Buckets kept per limiter; the least recently used are dropped beyond this
+MAX_TRACKED_KEYS = 10000
+
+
+def _seconds(wait: float) -> str:
+    seconds = math.ceil(wait)
+    return f"{seconds} second{'s' if seconds != 1 else ''}"
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by client (IP or session).
+
+    Each key holds up to ``burst`` tokens refilled at ``rate_per_minute``; a
+    request takes one token. Buckets live in memory, so limits apply per
+    worker process.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        # key -> (tokens, last refill monotonic time), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def wait_time(self, key: str) -> float:
+        """
+        Check a key without taking a token.
+
+        Returns:
+            0 if a token is available, otherwise seconds until one is
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def acquire(self, key: str) -> float:
+        """
+        Take one token for a key.
+
+        Returns:
+            0 if admitted, otherwise seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            self._buckets.pop(key, None)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class AdmissionController:
+    """Decides whether a chat request may spend API tokens."""
+
+    def __init__(
+        self,
+        daily_cost: Callable[[str], float],
+        daily_budget: float = DAILY_BUDGET_USD,
+        ip_limiter: Optional[TokenBucketLimiter] = None,
+        session_limiter: Optional[TokenBucketLimiter] = None
+    ):
+        """
+        Args:
+            daily_cost: Returns the spend (USD) logged on a day ("YYYY-MM-DD")
+            daily_budget: Spend allowed per day in USD (0 = no budget)
+            ip_limiter: Limiter keyed by client IP
+            session_limiter: Limiter keyed by session ID
+        """
+        self.daily_cost = daily_cost
+        self.daily_budget = daily_budget
+        self.ip_limiter = ip_limiter or TokenBucketLimiter(IP_RATE_PER_MINUTE, IP_BURST)
+        self.session_limiter = session_limiter or TokenBucketLimiter(SESSION_RATE_PER_MINUTE, SESSION_BURST)
+        self._spend = (None, 0.0, 0.0)  # (day, cost, fetched at)
+        self._lock = threading.Lock()
+        # Held from checking both limits to taking both tokens
+        self._admit_lock = threading.Lock()
+
+    def _spent_today(self, day: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            cached_day, cost, fetched_at = self._spend
+            if cached_day == day and now - fetched_at < SPEND_CACHE_SECONDS:
+                return cost
+        try:
+            cost = self.daily_cost(day)
+        except Exception as e:
+            print(f"Error reading daily spend: {e}")
+            return 0.0
+        with self._lock:
+            self._spend = (day, cost, now)
+        return cost
+
+    def admit(self, client_ip: Optional[str], session_id: Optional[str]) -> Optional[Dict]:
+        """
+        Check the daily budget, then the IP and session rate limits.
+
+        Args:
+            client_ip: Client address (None = no IP limit)
+            session_id: Server-issued client ID; never a client-chosen value,
+                which could be varied per request (None = no session limit)
+
+        Returns:
+            None if the request may proceed, otherwise a dict with code,
+            message and retry_after (seconds)
+        """
+        if self.daily_budget > 0:
+            today = datetime.now()
+            if self._spent_today(today.strftime('%Y-%m-%d')) >= self.daily_budget:
+                midnight = today.replace(hour=0, minute=0, second=0, microsecond=0).timestamp() + 86400
+                return {
+                    'code': 'budget_exceeded',
+                    'message': 'The AI assistant has reached its daily usage limit. Please try again tomorrow.',
+                    'retry_after': max(0.0, midnight - today.timestamp())
+                }
+
+        # Both limits are checked before either is charged, so a request
+        # rejected by one limit does not use up the other's tokens
+        with self._admit_lock:
+            if client_ip:
+                wait = self.ip_limiter.wait_time(client_ip)
+                if wait:
+                    return {
+                        'code': 'rate_limited',
+                        'message': f'Too many questions from your network. Please wait {_seconds(wait)}.',
+                        'retry_after': wait
+                    }
+
+            if session_id:
+                wait = self.session_limiter.wait_time(session_id)
+                if wait:
+                    return {
+                        'code': 'rate_limited',
+                        'message': f'You are asking questions too quickly. Please wait {_seconds(wait)}.',
+                        'retry_after': wait
+                    }
+
+            if client_ip:
+                self.ip_limiter.acquire(client_ip)
+            if session_id:
+                self.session_limiter.acquire(session_id)
+
+        return None
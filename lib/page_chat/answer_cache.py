@@ -0,0 +1,186 @@
+"""
+Answer Cache for repeated page chat questions.
+
+Stores the SSE events of a successful answer under (page path, normalized
+question, response format, hash of the page markdown), so a repeat question
+is replayed without any API call. Editing a page changes its content hash,
+which retires every cached answer for it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import threading
+
+
+# Answers kept in memory and how long any cached answer stays valid
+ANSWER_CACHE_SIZE = int(os.getenv('PAGE_CHAT_ANSWER_CACHE_SIZE', '500'))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('PAGE_CHAT_ANSWER_CACHE_TTL_SECONDS', '86400'))
+
+# Optional persistent tier shared by workers and restarts (unset = memory only)
+ANSWER_CACHE_DIR = os.getenv('PAGE_CHAT_ANSWER_CACHE_DIR')
+
+# Disk entries are swept for expiry after this many writes
+PRUNE_EVERY_PUTS = 200
+
+# Streamed chunks are coalesced to about this many characters when stored,
+# and replayed with this pause between them
+REPLAY_CHUNK_CHARS = 200
+REPLAY_CHUNK_DELAY = 0.02
+
+# Event types that make up an answer (progress, errors and cost summaries are per request)
+ANSWER_EVENT_TYPES = ('chunk', 'complete', 'sections', 'done')
+
+_PUNCTUATION = re.compile(r'[\s?!.,;:]+$')
+_WHITESPACE = re.compile(r'\s+')
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = _WHITESPACE.sub(' ', question.strip().lower())
+    return _PUNCTUATION.sub('', question)
+
+
+def content_hash(content: Optional[str]) -> str:
+    """SHA-256 of a page's markdown ('' when the page has no content)."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest() if content else ''
+
+
+def answer_key(page_path: str, question: str, response_format: str, page_hash: str) -> str:
+    """Cache key of an answer."""
+    material = json.dumps([page_path, normalize_question(question), response_format, page_hash])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def coalesce_chunks(events: List[Dict], chunk_chars: int = REPLAY_CHUNK_CHARS) -> List[Dict]:
+    """Merge runs of small ``chunk`` events into chunks of about ``chunk_chars``."""
+    merged = []
+    for event in events:
+        if (event.get('type') == 'chunk' and merged and merged[-1].get('type') == 'chunk'
+                and len(merged[-1]['content']) < chunk_chars):
+            merged[-1] = {'type': 'chunk', 'content': merged[-1]['content'] + event.get('content', '')}
+        else:
+            merged.append(event)
+    return merged
+
+
+class AnswerCache:
+    """
+    LRU + TTL map of answer key -> answer events, with an optional disk tier.
+
+    Disk entries live at ``<directory>/<key[:2]>/<key[2:]>`` as zlib-compressed
+    JSON, written to a temporary file and renamed into place.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        directory: Optional[str] = ANSWER_CACHE_DIR
+    ):
+        """
+        Args:
+            max_entries: Answers kept in memory
+            ttl_seconds: Age after which an answer is no longer served
+            directory: Directory of the persistent tier (None = memory only)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = Path(directory) if directory else None
+        # key -> (created epoch seconds, events), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key[2:]
+
+    def _remember(self, key: str, created: float, events: List[Dict]):
+        with self._lock:
+            self._entries[key] = (created, events)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, List[Dict]]]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, ValueError) as e:
+            print(f"Error reading cached answer {key}: {e}")
+            return None
+
+        if time.time() - entry['created'] >= self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        return entry['created'], entry['events']
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Look up an answer.
+
+        Returns:
+            The stored answer events, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        if self.directory is None or not _KEY_PATTERN.match(key):
+            return None
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+        self._remember(key, *entry)
+        return entry[1]
+
+    def put(self, key: str, events: List[Dict]):
+        """Store an answer's events (chunks are coalesced)."""
+        events = coalesce_chunks([event for event in events if event.get('type') in ANSWER_EVENT_TYPES])
+        created = time.time()
+        self._remember(key, created, events)
+
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(json.dumps({'created': created, 'events': events}).encode('utf-8')))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving cached answer {key}: {e}")
+            return
+
+        self._puts_since_prune += 1
+        if self._puts_since_prune >= PRUNE_EVERY_PUTS:
+            self._puts_since_prune = 0
+            self.prune()
+
+    def prune(self):
+        """Delete expired disk entries (answers for edited pages age out here)."""
+        if self.directory is None or not self.directory.exists():
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for path in self.directory.glob('*/*'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
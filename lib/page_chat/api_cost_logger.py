@@ -2,16 +2,19 @@
 API Cost Logger for tracking Claude API usage and costs.
 
 Provides centralized logging of API requests with cost calculations
-and session-based tracking.
+and session-based tracking. Calls are stored by a cost ledger backend (see
+cost_ledger.py); question and response text lives in a content-addressed
+transcript store, referenced by hash.
 """
 
-import json
-import os
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import threading
 
+from .cost_ledger import create_cost_ledger
+from .cost_rollups import CostRollups
+from .transcript_store import externalize_transcripts
+
 
 class APICostLogger:
     """Singleton logger for tracking API costs across sessions."""
@@ -19,23 +22,32 @@ class APICostLogger:
     _instance = None
     _lock = threading.Lock()
 
-    # Pricing per million tokens (as of January 2025)
+    # Pricing per million tokens (as of January 2025); prompt cache writes cost
+    # 1.25x the input price and cache reads 0.1x
     PRICING = {
         'claude-sonnet-4-20250514': {
             'input': 3.00,   # $ per 1M tokens
-            'output': 15.00  # $ per 1M tokens
+            'output': 15.00,  # $ per 1M tokens
+            'cache_write': 3.75,
+            'cache_read': 0.30
         },
         'claude-3-5-sonnet-20241022': {
             'input': 3.00,
-            'output': 15.00
+            'output': 15.00,
+            'cache_write': 3.75,
+            'cache_read': 0.30
         },
         'claude-haiku-4-5-20251001': {
             'input': 0.40,
-            'output': 2.00
+            'output': 2.00,
+            'cache_write': 0.50,
+            'cache_read': 0.04
         },
         'claude-3-haiku-20240307': {
             'input': 0.25,
-            'output': 1.25
+            'output': 1.25,
+            'cache_write': 0.30,
+            'cache_read': 0.03
         }
     }
 
@@ -53,48 +65,27 @@ class APICostLogger:
         if self._initialized:
             return
 
-        self.log_file = Path('api-cost-breakdown.json')
-        self.sessions = {}
-        self._load_existing_logs()
+        # JSONL ledger, or SQLite shared by all workers when API_COST_DB is set
+        self.ledger = create_cost_ledger()
         self._initialized = True
 
-    def _load_existing_logs(self):
-        """Load existing logs from file."""
-        if self.log_file.exists():
-            try:
-                with open(self.log_file, 'r') as f:
-                    data = json.load(f)
-                    self.sessions = data.get('sessions', {})
-            except Exception as e:
-                print(f"Error loading cost logs: {e}")
-                self.sessions = {}
-
-    def _save_logs(self):
-        """Save logs to file (thread-safe)."""
-        with self._lock:
-            try:
-                data = {
-                    'last_updated': datetime.now().isoformat(),
-                    'sessions': self.sessions
-                }
-                with open(self.log_file, 'w') as f:
-                    json.dump(data, f, indent=2)
-            except Exception as e:
-                print(f"Error saving cost logs: {e}")
-
     def calculate_cost(
         self,
         model: str,
         input_tokens: int,
-        output_tokens: int
+        output_tokens: int,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0
     ) -> Dict[str, float]:
         """
         Calculate cost for an API call.
 
         Args:
             model: Model name (e.g., 'claude-sonnet-4-20250514')
-            input_tokens: Number of input tokens
+            input_tokens: Number of uncached input tokens
             output_tokens: Number of output tokens
+            cache_write_tokens: Input tokens written to the prompt cache
+            cache_read_tokens: Input tokens read from the prompt cache
 
         Returns:
             Dictionary with cost breakdown
@@ -103,15 +94,21 @@ class APICostLogger:
 
         input_cost = (input_tokens / 1_000_000) * pricing['input']
         output_cost = (output_tokens / 1_000_000) * pricing['output']
-        total_cost = input_cost + output_cost
+        cache_write_cost = (cache_write_tokens / 1_000_000) * pricing['cache_write']
+        cache_read_cost = (cache_read_tokens / 1_000_000) * pricing['cache_read']
+        total_cost = input_cost + output_cost + cache_write_cost + cache_read_cost
 
         return {
             'input_cost': round(input_cost, 6),
             'output_cost': round(output_cost, 6),
+            'cache_write_cost': round(cache_write_cost, 6),
+            'cache_read_cost': round(cache_read_cost, 6),
             'total_cost': round(total_cost, 6),
             'input_tokens': input_tokens,
             'output_tokens': output_tokens,
-            'total_tokens': input_tokens + output_tokens
+            'cache_write_tokens': cache_write_tokens,
+            'cache_read_tokens': cache_read_tokens,
+            'total_tokens': input_tokens + cache_write_tokens + cache_read_tokens + output_tokens
         }
 
     def log_api_request(
@@ -122,7 +119,11 @@ class APICostLogger:
         output_tokens: int,
         call_type: str = 'generate',
         page_path: Optional[str] = None,
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        wall_ms: Optional[float] = None,
+        ttft_ms: Optional[float] = None,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0
     ):
         """
         Log an API request with cost calculation.
@@ -130,22 +131,18 @@ class APICostLogger:
         Args:
             session_id: Unique session identifier
             model: Model name
-            input_tokens: Number of input tokens
+            input_tokens: Number of uncached input tokens
             output_tokens: Number of output tokens
             call_type: Type of call (e.g., 'generate', 'format', 'suggest')
             page_path: Current page path
-            metadata: Additional metadata to log
+            metadata: Additional metadata to log (question/response text goes to the transcript store)
+            wall_ms: Duration of the API call in milliseconds
+            ttft_ms: Milliseconds until the first token arrived (equal to
+                wall_ms for non-streamed calls)
+            cache_write_tokens: Input tokens written to the prompt cache
+            cache_read_tokens: Input tokens read from the prompt cache
         """
-        cost_data = self.calculate_cost(model, input_tokens, output_tokens)
-
-        # Initialize session if it doesn't exist
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {
-                'created_at': datetime.now().isoformat(),
-                'calls': [],
-                'total_cost': 0,
-                'total_tokens': 0
-            }
+        cost_data = self.calculate_cost(model, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
 
         # Create log entry
         entry = {
@@ -156,16 +153,22 @@ class APICostLogger:
             **cost_data
         }
 
-        if metadata:
-            entry['metadata'] = metadata
+        if wall_ms is not None:
+            entry['wall_ms'] = round(wall_ms, 1)
+            if ttft_ms is not None:
+                entry['ttft_ms'] = round(ttft_ms, 1)
+            # Generation speed: after the first token when streamed, whole call otherwise
+            generation_ms = wall_ms - ttft_ms if ttft_ms is not None and wall_ms > ttft_ms else wall_ms
+            if output_tokens > 0 and generation_ms > 0:
+                entry['tokens_per_second'] = round(output_tokens / (generation_ms / 1000), 1)
 
-        # Add to session
-        self.sessions[session_id]['calls'].append(entry)
-        self.sessions[session_id]['total_cost'] += cost_data['total_cost']
-        self.sessions[session_id]['total_tokens'] += cost_data['total_tokens']
+        if metadata:
+            entry['metadata'] = externalize_transcripts(metadata)
 
-        # Save to file
-        self._save_logs()
+        try:
+            self.ledger.record({'session_id': session_id, **entry})
+        except Exception as e:
+            print(f"Error saving cost logs: {e}")
 
         return entry
 
@@ -177,9 +180,9 @@ class APICostLogger:
             session_id: Session identifier
 
         Returns:
-            Dictionary with session cost summary or None
+            Dictionary with created_at, total_cost, total_tokens and num_calls, or None
         """
-        return self.sessions.get(session_id)
+        return self.ledger.session(session_id)
 
     def get_total_costs(self) -> Dict[str, float]:
         """
@@ -188,21 +191,47 @@ class APICostLogger:
         Returns:
             Dictionary with total cost and token counts
         """
-        total_cost = sum(
-            session.get('total_cost', 0)
-            for session in self.sessions.values()
-        )
-        total_tokens = sum(
-            session.get('total_tokens', 0)
-            for session in self.sessions.values()
-        )
-
+        totals = self.ledger.totals()
         return {
-            'total_cost': round(total_cost, 6),
-            'total_tokens': total_tokens,
-            'total_sessions': len(self.sessions)
+            'total_cost': round(totals['total_cost'], 6),
+            'total_tokens': totals['total_tokens'],
+            'total_sessions': totals['total_sessions']
         }
 
+    def get_daily_cost(self, day: str) -> float:
+        """
+        Get the total cost logged on one day.
+
+        Args:
+            day: Date as "YYYY-MM-DD" (local time, like the record timestamps)
+
+        Returns:
+            Total cost in USD
+        """
+        return self.ledger.day_cost(day)
+
+    def get_rollups(self) -> Tuple[CostRollups, int]:
+        """
+        Get running cost aggregates (totals, per day/model/page/call type, unique questions).
+
+        Returns:
+            Tuple of (CostRollups, number of sessions)
+        """
+        return self.ledger.rollups()
+
+    def read_calls(self, cursor=None):
+        """
+        Read call records logged since a cursor (for incremental consumers).
+
+        Args:
+            cursor: Cursor returned by the previous read (None = from the start)
+
+        Returns:
+            Tuple of (records, new cursor, reset); on reset the records start
+            over from the beginning and earlier reads should be discarded
+        """
+        return self.ledger.read_calls(cursor)
+
 
 # Singleton instance
 _logger_instance = None
@@ -218,4 +247,15 @@ def get_logger() -> APICostLogger:
     global _logger_instance
     if _logger_instance is None:
         _logger_instance = APICostLogger()
-    return _logger_instance
\ No newline at end of file
+    return _logger_instance
+
+
+def load_cost_ledger() -> Optional[Dict]:
+    """
+    Load every logged call, grouped by session.
+
+    Returns:
+        {'sessions': {session_id: {created_at, calls, total_cost, total_tokens}}},
+        or None if nothing has been logged yet
+    """
+    return get_logger().ledger.load()
@@ -9,10 +9,13 @@ Handles generation of code examples using a three-call architecture:
 
 import os
 import json
+import time
 import re
 from typing import Dict, Optional, Generator, List
 from anthropic import Anthropic
 from .api_cost_logger import get_logger
+from .prompt_cache import cache_usage, cached_system
+from .stub_client import USE_STUB_CLIENT, StubAnthropic
 
 
 class CodeResponder:
@@ -33,6 +36,9 @@ class CodeResponder:
     def _ensure_client(self):
         """Ensure the Anthropic client is initialized."""
         if self.client is None:
+            if USE_STUB_CLIENT:
+                self.client = StubAnthropic()
+                return
             if not self.api_key:
                 raise ValueError("ANTHROPIC_API_KEY environment variable not set")
             self.client = Anthropic(api_key=self.api_key)
@@ -112,13 +118,11 @@ Ensure the JSON is valid and properly escaped."""
         Returns:
             Generated code
         """
-        user_prompt = f"""Based on the following documentation context, generate a complete, working code example that answers this question:
+        # Page context goes in the cached system prefix; only the question varies
+        user_prompt = f"""Based on the documentation context above, generate a complete, working code example that answers this question:
 
 {question}
 
-Documentation Context:
-{context}
-
 Generate a complete Python file with:
 - All necessary imports
 - Complete working example
@@ -130,13 +134,15 @@ Generate a complete Python file with:
         self._ensure_client()
 
         try:
+            started = time.perf_counter()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=0.7,
-                system=self.build_system_prompt_generate(),
+                system=cached_system(self.build_system_prompt_generate(), context),
                 messages=[{"role": "user", "content": user_prompt}]
             )
+            wall_ms = (time.perf_counter() - started) * 1000
 
             # Extract text from response
             response_text = response.content[0].text
@@ -152,7 +158,10 @@ Generate a complete Python file with:
                 metadata={
                     'question': question,
                     'response': response_text
-                }
+                },
+                wall_ms=wall_ms,
+                ttft_ms=wall_ms,
+                **cache_usage(response.usage)
             )
 
             return response_text
@@ -187,6 +196,7 @@ Generate a complete Python file with:
 Return a JSON object with file structure, descriptions, and highlights."""
 
         try:
+            started = time.perf_counter()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
@@ -194,6 +204,7 @@ Return a JSON object with file structure, descriptions, and highlights."""
                 system=self.build_system_prompt_format_instructions(),
                 messages=[{"role": "user", "content": user_prompt}]
             )
+            wall_ms = (time.perf_counter() - started) * 1000
 
             # Log the API call
             self.logger.log_api_request(
@@ -202,7 +213,9 @@ Return a JSON object with file structure, descriptions, and highlights."""
                 input_tokens=response.usage.input_tokens,
                 output_tokens=response.usage.output_tokens,
                 call_type='generate_format_instructions',
-                page_path=page_path
+                page_path=page_path,
+                wall_ms=wall_ms,
+                ttft_ms=wall_ms
             )
 
             return response.content[0].text
@@ -242,6 +255,7 @@ INSTRUCTIONS:
 Return a properly formatted JSON object."""
 
         try:
+            started = time.perf_counter()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
@@ -249,6 +263,7 @@ Return a properly formatted JSON object."""
                 system=self.build_system_prompt_format(),
                 messages=[{"role": "user", "content": user_prompt}]
             )
+            wall_ms = (time.perf_counter() - started) * 1000
 
             # Log the API call
             self.logger.log_api_request(
@@ -257,7 +272,9 @@ Return a properly formatted JSON object."""
                 input_tokens=response.usage.input_tokens,
                 output_tokens=response.usage.output_tokens,
                 call_type='format_code',
-                page_path=page_path
+                page_path=page_path,
+                wall_ms=wall_ms,
+                ttft_ms=wall_ms
             )
 
             # Extract and parse JSON
@@ -11,10 +11,17 @@ Collects and aggregates context about the current page including:
 import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 from urllib.parse import urlparse
+import threading
 import dash
 
+from .answer_cache import content_hash
+
+# Architecture file read by get_architecture (its mtime is part of the docs fingerprint)
+ARCHITECTURE_FILE = Path('templates') / 'architecture.txt'
+
 
 class ContextGatherer:
     """Gathers contextual information for AI chat on documentation pages."""
@@ -90,7 +97,7 @@ class ContextGatherer:
         """
         try:
             # Try to read from the application's route
-            arch_path = Path('templates') / 'architecture.txt'
+            arch_path = ARCHITECTURE_FILE
             if arch_path.exists():
                 return arch_path.read_text()
 
@@ -287,4 +294,96 @@ class ContextGatherer:
             prompt_parts.append(context['architecture'])
             prompt_parts.append("\n\n")
 
-        return "".join(prompt_parts)
\ No newline at end of file
+        return "".join(prompt_parts)
+
+def _freeze(value):
+    """Read-only copy of nested dicts and lists (mapping proxies and tuples)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ContextIndex:
+    """
+    Per-page context bundles, built once for every registered page.
+
+    A bundle is the ``gather_full_context`` result (content, TOC,
+    architecture, related pages) frozen, plus the formatted ``prompt`` and
+    the ``content_hash`` of the page markdown. The index is rebuilt when the
+    docs fingerprint (registered pages, loaded markdown files, architecture
+    file mtime) changes, so requests never rescan the registry or reparse
+    markdown.
+    """
+
+    def __init__(self, gatherer: ContextGatherer, name_content_map: Dict[str, str]):
+        """
+        Args:
+            gatherer: ContextGatherer used to build the bundles
+            name_content_map: Dictionary mapping page names to markdown content
+        """
+        self.gatherer = gatherer
+        self.name_content_map = name_content_map
+        self._bundles: Dict[str, Mapping] = {}
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def _docs_fingerprint(self) -> Tuple:
+        try:
+            architecture_mtime = ARCHITECTURE_FILE.stat().st_mtime_ns
+        except OSError:
+            architecture_mtime = None
+        return len(dash.page_registry), len(self.name_content_map), architecture_mtime
+
+    def _build(self) -> Dict[str, Mapping]:
+        pages = list(dash.page_registry.values())
+        architecture = self.gatherer.get_architecture()
+
+        # Related pages share the first path segment (same rule as get_related_pages)
+        sections: Dict[str, List[Dict]] = {}
+        for page in pages:
+            route = page.get('path', '')
+            sections.setdefault(route.strip('/').split('/')[0], []).append({
+                'path': route,
+                'name': page.get('name', 'Unnamed'),
+                'description': page.get('description', '')
+            })
+
+        bundles = {}
+        for page in pages:
+            route = page.get('path', '')
+            if route in bundles:
+                continue
+            content = self.name_content_map.get(page.get('name'))
+            context = {
+                'page_path': route,
+                'content': content,
+                'toc': self.gatherer.get_toc_structure(content) if content else [],
+                'architecture': architecture,
+                'related_pages': [
+                    related for related in sections[route.strip('/').split('/')[0]]
+                    if related['path'] != route
+                ],
+                'sitemap': None,
+                'robots': None
+            }
+            context['prompt'] = self.gatherer.format_context_for_prompt(context)
+            context['content_hash'] = content_hash(content)
+            bundles[route] = _freeze(context)
+        return bundles
+
+    def get(self, page_path: str) -> Optional[Mapping]:
+        """
+        Context bundle of a page.
+
+        Returns:
+            Read-only bundle, or None if no page is registered at the path
+        """
+        fingerprint = self._docs_fingerprint()
+        if fingerprint != self._fingerprint:
+            with self._lock:
+                if fingerprint != self._fingerprint:
+                    self._bundles = self._build()
+                    self._fingerprint = fingerprint
+        return self._bundles.get(page_path)
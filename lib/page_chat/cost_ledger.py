@@ -0,0 +1,696 @@
+"""
+Cost Ledger backends for API call records.
+
+Append-only JSONL file by default, or a SQLite (WAL) database shared by all
+workers when API_COST_DB is set. Both expose the same small interface used by
+APICostLogger: record, session, totals, day_cost, rollups, load, read_calls
+and flush.
+"""
+
+import atexit
+import base64
+import fcntl
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+
+from lib.bloom_filter import BloomFilter
+from lib.hyperloglog import HyperLogLog
+
+from .cost_rollups import COST, TOTAL_TOKENS, CostRollups
+from .session_table import SessionTable
+from .transcript_store import externalize_transcripts
+
+
+# Append-only ledger: one JSON line per API call
+LEDGER_FILE = Path('api-cost-ledger.jsonl')
+
+# Session totals plus the ledger offset they cover, rewritten periodically
+SNAPSHOT_FILE = Path('api-cost-totals.json')
+
+# Old whole-file log, converted into the ledger on first start
+LEGACY_LOG_FILE = Path('api-cost-breakdown.json')
+
+# Calls logged by a process between totals snapshots
+SNAPSHOT_EVERY_CALLS = 50
+
+# Per-session totals kept in memory by the JSONL ledger (older sessions are re-read on demand)
+MAX_CACHED_SESSIONS = int(os.getenv('API_COST_MAX_SESSIONS', '1000'))
+SESSION_IDLE_SECONDS = float(os.getenv('API_COST_SESSION_IDLE_SECONDS', '1800'))
+
+# Sessions the seen-session filter is sized for (1% false positives at capacity)
+SESSION_FILTER_CAPACITY = 200000
+SESSION_COUNT_PRECISION = 12
+
+# Optional SQLite database shared by all workers (unset = JSONL ledger)
+COST_DB = os.getenv('API_COST_DB')
+
+# Buffered calls are written to SQLite once this many are pending ...
+COST_DB_BATCH_SIZE = 20
+# ... or this long after the first one was buffered (seconds)
+COST_DB_FLUSH_SECONDS = 1.0
+
+
+def iter_ledger(path: Path = LEDGER_FILE, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """
+    Stream ledger records from a byte offset.
+
+    A trailing partial line (a write in progress) is left for the next read.
+
+    Yields:
+        Tuples of (record, offset just past its line)
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    yield json.loads(line), offset
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        return
+
+
+def migrate_legacy_log(legacy_file: Path = LEGACY_LOG_FILE, ledger_file: Path = LEDGER_FILE):
+    """Convert api-cost-breakdown.json into the ledger once (renamed to .json.migrated)."""
+    if not legacy_file.exists() or ledger_file.exists():
+        return
+
+    with open(ledger_file.with_suffix('.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another worker may have migrated while we waited
+        if not legacy_file.exists() or ledger_file.exists():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                sessions = json.load(f).get('sessions', {})
+
+            records = []
+            for session_id, session in sessions.items():
+                for call in session.get('calls', []):
+                    record = {'session_id': session_id, **call}
+                    if 'metadata' in record:
+                        record['metadata'] = externalize_transcripts(record['metadata'])
+                    records.append(record)
+            records.sort(key=lambda r: r.get('timestamp') or '')
+
+            tmp_path = ledger_file.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            os.replace(tmp_path, ledger_file)
+            legacy_file.rename(legacy_file.with_suffix('.json.migrated'))
+            print(f"Migrated {len(records)} API calls to {ledger_file}")
+        except Exception as e:
+            print(f"Error migrating cost logs: {e}")
+
+
+def _new_session_totals(record: Dict) -> Dict:
+    return {
+        'created_at': record.get('timestamp'),
+        'total_cost': 0,
+        'total_tokens': 0,
+        'num_calls': 0
+    }
+
+
+def _fold_totals(session: Dict, record: Dict):
+    """Add one ledger record to a session's totals."""
+    session['total_cost'] += record.get('total_cost', 0)
+    session['total_tokens'] += record.get('total_tokens', 0)
+    session['num_calls'] += 1
+
+
+def _normalize_call(record: Dict) -> Dict:
+    """Records written before transcripts were split out carry the text inline."""
+    if 'metadata' in record:
+        record['metadata'] = externalize_transcripts(record['metadata'])
+    return record
+
+
+def _add_call(sessions: Dict, record: Dict):
+    """Add one call record to the per-session layout returned by ``load``."""
+    record = _normalize_call(dict(record))
+    session_id = record.pop('session_id', None)
+    session = sessions.get(session_id)
+    if session is None:
+        session = sessions[session_id] = {
+            'created_at': record.get('timestamp'),
+            'calls': [],
+            'total_cost': 0,
+            'total_tokens': 0
+        }
+    session['calls'].append(record)
+    session['total_cost'] += record.get('total_cost', 0)
+    session['total_tokens'] += record.get('total_tokens', 0)
+
+
+class JSONLCostLedger:
+    """
+    Calls appended to a JSONL file, totals folded from it.
+
+    Every worker appends with a single ``O_APPEND`` write and folds lines
+    written by the others before answering, so all workers converge on the
+    same totals. A snapshot of the totals (with the offset it covers) is
+    rewritten every SNAPSHOT_EVERY_CALLS calls so startup only streams the tail.
+
+    Memory stays bounded: only recently active sessions are kept (a
+    SessionTable), a Bloom filter remembers which session ids exist at all,
+    and a HyperLogLog counts them. A session that is not cached but may exist
+    is rebuilt by scanning the ledger; a session the filter has never seen is
+    new and needs no scan.
+    """
+
+    def __init__(self, path: Path = LEDGER_FILE, snapshot_path: Path = SNAPSHOT_FILE):
+        self.path = Path(path)
+        self.snapshot_path = Path(snapshot_path)
+        # Recently active session_id -> {created_at, total_cost, total_tokens, num_calls}
+        self.sessions = SessionTable(MAX_CACHED_SESSIONS, SESSION_IDLE_SECONDS)
+        self._seen_sessions = BloomFilter.for_capacity(SESSION_FILTER_CAPACITY)
+        self._session_count = HyperLogLog(SESSION_COUNT_PRECISION)
+        self._rollups = CostRollups()
+        self._offset = 0
+        self._fd = None
+        self._calls_since_snapshot = 0
+        self._lock = threading.Lock()
+
+        migrate_legacy_log(ledger_file=self.path)
+        self._load_snapshot()
+        self._catch_up()
+
+    def _load_snapshot(self):
+        """Start from the last totals snapshot, if it still matches the ledger."""
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+            offset = data.get('ledger_offset', 0)
+            if offset > self.path.stat().st_size or 'seen_sessions' not in data:
+                return  # Ledger was replaced since the snapshot, or the snapshot is an older format
+            seen = data['seen_sessions']
+            self._seen_sessions = BloomFilter(
+                seen['num_bits'], seen['num_hashes'], bytearray(base64.b64decode(seen['bits']))
+            )
+            self._session_count = HyperLogLog(
+                SESSION_COUNT_PRECISION, bytearray(base64.b64decode(data['session_count']))
+            )
+            for session_id, totals in data.get('sessions', {}).items():
+                self.sessions.put(session_id, totals)
+            self._rollups = CostRollups.from_dict(data['rollups'])
+            self._offset = offset
+        except (OSError, ValueError):
+            pass
+        except Exception as e:
+            print(f"Error loading cost snapshot: {e}")
+
+    def _catch_up(self):
+        """Fold ledger lines written since the last read (by any worker) into the totals."""
+        for record, offset in iter_ledger(self.path, self._offset):
+            session_id = record.get('session_id')
+            session = self.sessions.get(session_id)
+            if session is None and session_id not in self._seen_sessions:
+                # First call of a new session
+                session = _new_session_totals(record)
+                self.sessions.put(session_id, session)
+            if session is not None:
+                _fold_totals(session, record)
+            # Calls of evicted sessions are picked up when the session is re-read
+
+            self._seen_sessions.add(session_id)
+            self._session_count.add(session_id)
+            self._rollups.add(record)
+            self._offset = offset
+
+    def _scan_session(self, session_id: str) -> Optional[Dict]:
+        """Rebuild one session's totals from the ledger (up to the folded offset)."""
+        needle = json.dumps(session_id).encode()
+        session = None
+        position = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    position += len(line)
+                    if position > self._offset:
+                        break
+                    # Cheap substring test before parsing
+                    if needle not in line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get('session_id') == session_id:
+                        if session is None:
+                            session = _new_session_totals(record)
+                        _fold_totals(session, record)
+        except OSError:
+            return None
+        return session
+
+    def _save_snapshot(self):
+        """Write the session totals and the ledger offset they cover."""
+        try:
+            data = {
+                'last_updated': datetime.now().isoformat(),
+                'ledger_offset': self._offset,
+                'sessions': dict(self.sessions.items()),
+                'seen_sessions': {
+                    'num_bits': self._seen_sessions.num_bits,
+                    'num_hashes': self._seen_sessions.num_hashes,
+                    'bits': base64.b64encode(bytes(self._seen_sessions.bits)).decode()
+                },
+                'session_count': base64.b64encode(bytes(self._session_count.registers)).decode(),
+                'rollups': self._rollups.to_dict()
+            }
+            tmp_path = self.snapshot_path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Error saving cost snapshot: {e}")
+
+    def record(self, record: Dict):
+        """Append one call record (must include session_id)."""
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._fd, (json.dumps(record) + '\n').encode())
+            self._catch_up()
+            self._calls_since_snapshot += 1
+            if self._calls_since_snapshot >= SNAPSHOT_EVERY_CALLS:
+                self._calls_since_snapshot = 0
+                self._save_snapshot()
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._catch_up()
+            session = self.sessions.get(session_id)
+            if session is None and session_id in self._seen_sessions:
+                session = self._scan_session(session_id)
+                if session is not None:
+                    self.sessions.put(session_id, session)
+            return dict(session) if session else None
+
+    def totals(self) -> Dict:
+        with self._lock:
+            self._catch_up()
+            return {
+                'total_cost': self._rollups.totals[COST],
+                'total_tokens': self._rollups.totals[TOTAL_TOKENS],
+                'total_sessions': self._session_count.count()
+            }
+
+    def day_cost(self, day: str) -> float:
+        """Total cost logged on a day ("YYYY-MM-DD")."""
+        with self._lock:
+            self._catch_up()
+            cell = self._rollups.breakdowns['day'].get(day)
+            return cell[COST] if cell else 0
+
+    def rollups(self) -> Tuple[CostRollups, int]:
+        """
+        Copy of the running rollups.
+
+        Returns:
+            Tuple of (rollups, number of sessions)
+        """
+        with self._lock:
+            self._catch_up()
+            return CostRollups.from_dict(self._rollups.to_dict()), self._session_count.count()
+
+    def load(self) -> Optional[Dict]:
+        """
+        Stream the ledger into the per-session layout of the old cost log.
+
+        Returns:
+            {'sessions': {session_id: {created_at, calls, total_cost, total_tokens}}},
+            or None if nothing has been logged yet
+        """
+        if not self.path.exists():
+            return None
+        sessions = {}
+        for record, _ in iter_ledger(self.path):
+            _add_call(sessions, record)
+        return {'sessions': sessions}
+
+    def read_calls(self, cursor=None) -> Tuple[List[Dict], Tuple[int, int], bool]:
+        """
+        Read call records appended since a cursor.
+
+        Args:
+            cursor: Cursor returned by the previous read (None = from the start)
+
+        Returns:
+            Tuple of (records, new cursor, reset); reset is True when the
+            ledger was replaced and the records start over from the beginning
+        """
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return [], None, cursor is not None
+
+        reset = cursor is None or cursor[0] != stat.st_ino or cursor[1] > stat.st_size
+        offset = 0 if reset else cursor[1]
+        records = []
+        for record, offset in iter_ledger(self.path, offset):
+            records.append(_normalize_call(record))
+        return records, (stat.st_ino, offset), reset
+
+    def flush(self):
+        """Records are written immediately; nothing to flush."""
+
+
+class SQLiteCostLedger:
+    """
+    Calls and per-session totals in a SQLite database shared by every worker.
+
+    ``calls`` holds one row per API call (the full record as JSON, plus the
+    columns queries filter on); ``sessions`` and ``rollups`` hold running
+    totals per session and per day/model/page/call type, ``questions``
+    the distinct question hashes and ``latency`` the latency histogram
+    buckets, all updated in the same transaction as the
+    inserts, so summaries are key lookups. Calls are buffered and written in batches of up to
+    COST_DB_BATCH_SIZE, at most COST_DB_FLUSH_SECONDS after they were logged.
+    Session, day and total reads add this process's unflushed calls to the
+    committed rows instead of flushing; call listings only see committed rows.
+    """
+
+    def __init__(self, db_path, import_ledger: Optional[Path] = LEDGER_FILE):
+        """
+        Args:
+            db_path: SQLite database file
+            import_ledger: JSONL ledger imported when the database is empty
+        """
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: List[Dict] = []
+        # Calls swapped out of _pending by a flush that has not committed yet
+        self._inflight: List[Dict] = []
+        self._timer = None
+        # Serializes flushes; only the COMMIT itself runs under _lock
+        self._write_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS calls (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                model TEXT,
+                call_type TEXT,
+                page_path TEXT,
+                total_cost REAL NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS calls_session ON calls (session_id);
+            CREATE INDEX IF NOT EXISTS calls_timestamp ON calls (timestamp);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                total_cost REAL NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                num_calls INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                total_cost REAL NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                calls INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, key)
+            );
+            CREATE TABLE IF NOT EXISTS questions (hash TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS latency (
+                metric TEXT NOT NULL,
+                key TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, key, bucket)
+            );
+        """)
+        if import_ledger is not None:
+            self._import_ledger(Path(import_ledger))
+        self._backfill_rollups()
+        atexit.register(self.flush)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection, reopened after fork (connections must not cross processes)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, conn: sqlite3.Connection, records: List[Dict]):
+        """Insert call rows and bump session totals (caller holds the transaction)."""
+        conn.executemany(
+            "INSERT INTO calls (session_id, timestamp, model, call_type, page_path, total_cost, total_tokens, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    r.get('session_id'), r.get('timestamp') or '', r.get('model'), r.get('call_type'),
+                    r.get('page_path'), r.get('total_cost', 0), r.get('total_tokens', 0), json.dumps(r)
+                )
+                for r in records
+            ]
+        )
+
+        totals = defaultdict(lambda: [None, 0, 0, 0])
+        for r in records:
+            session = totals[r.get('session_id')]
+            if session[0] is None:
+                session[0] = r.get('timestamp') or ''
+            session[1] += r.get('total_cost', 0)
+            session[2] += r.get('total_tokens', 0)
+            session[3] += 1
+        conn.executemany(
+            "INSERT INTO sessions (session_id, created_at, total_cost, total_tokens, num_calls) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET "
+            "total_cost = total_cost + excluded.total_cost, "
+            "total_tokens = total_tokens + excluded.total_tokens, "
+            "num_calls = num_calls + excluded.num_calls",
+            [(session_id, *values) for session_id, values in totals.items()]
+        )
+        self._write_rollups(conn, records)
+
+    @staticmethod
+    def _write_rollups(conn: sqlite3.Connection, records: List[Dict]):
+        """Add a batch of calls to the rollup rows (caller holds the transaction)."""
+        batch = CostRollups()
+        for r in records:
+            batch.add(r)
+        conn.executemany(
+            "INSERT INTO rollups (dimension, key, total_cost, input_tokens, output_tokens, total_tokens, calls) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(dimension, key) DO UPDATE SET "
+            "total_cost = total_cost + excluded.total_cost, "
+            "input_tokens = input_tokens + excluded.input_tokens, "
+            "output_tokens = output_tokens + excluded.output_tokens, "
+            "total_tokens = total_tokens + excluded.total_tokens, "
+            "calls = calls + excluded.calls",
+            batch.cells()
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO questions (hash) VALUES (?)",
+            [(question_hash,) for question_hash in batch.questions]
+        )
+        conn.executemany(
+            "INSERT INTO latency (metric, key, bucket, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(metric, key, bucket) DO UPDATE SET count = count + excluded.count",
+            batch.latency_cells()
+        )
+
+    def _backfill_rollups(self):
+        """Build the rollup rows from existing calls (databases created before rollups)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if (conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None
+                    and conn.execute("SELECT 1 FROM calls LIMIT 1").fetchone() is not None):
+                records = [json.loads(record) for (record,) in conn.execute("SELECT record FROM calls")]
+                self._write_rollups(conn, records)
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            print(f"Error building cost rollups: {e}")
+
+    def _import_ledger(self, ledger_file: Path):
+        """Copy an existing JSONL ledger (or legacy log) into an empty database, once."""
+        migrate_legacy_log(ledger_file=ledger_file)
+        if not ledger_file.exists():
+            return
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM calls LIMIT 1").fetchone() is None:
+                records = []
+                for record, _ in iter_ledger(ledger_file):
+                    if 'metadata' in record:
+                        record['metadata'] = externalize_transcripts(record['metadata'])
+                    records.append(record)
+                self._write(conn, records)
+                print(f"Imported {len(records)} API calls from {ledger_file}")
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            print(f"Error importing cost ledger: {e}")
+
+    def record(self, record: Dict):
+        """Buffer one call record (must include session_id)."""
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) < COST_DB_BATCH_SIZE:
+                if self._timer is None:
+                    self._timer = threading.Timer(COST_DB_FLUSH_SECONDS, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """
+        Write buffered calls in one transaction.
+
+        The inserts run outside ``_lock``, so record() never waits on disk I/O;
+        the COMMIT and the release of the in-flight calls happen together
+        under it, so reads count every call exactly once.
+        """
+        with self._write_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+                self._inflight = records
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not records:
+                return
+
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                self._write(conn, records)
+                with self._lock:
+                    conn.execute("COMMIT")
+                    self._inflight = []
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with self._lock:
+                    # Keep the calls for the next flush rather than dropping them
+                    self._pending[:0] = records
+                    self._inflight = []
+                print(f"Error saving cost logs: {e}")
+
+    def _unflushed(self) -> List[Dict]:
+        """This process's calls not committed yet (caller holds _lock)."""
+        return self._inflight + self._pending
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT created_at, total_cost, total_tokens, num_calls FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            unflushed = [r for r in self._unflushed() if r.get('session_id') == session_id]
+        if row is None:
+            if not unflushed:
+                return None
+            session = _new_session_totals(unflushed[0])
+        else:
+            session = dict(zip(('created_at', 'total_cost', 'total_tokens', 'num_calls'), row))
+        for record in unflushed:
+            _fold_totals(session, record)
+        return session
+
+    def totals(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT total_cost, total_tokens FROM rollups WHERE dimension = '' AND key = ''").fetchone()
+            total_sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            unflushed = self._unflushed()
+            new_sessions = {r.get('session_id') for r in unflushed}
+            new_sessions = {
+                session_id for session_id in new_sessions
+                if conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is None
+            }
+        return {
+            'total_cost': (row[0] if row else 0) + sum(r.get('total_cost', 0) for r in unflushed),
+            'total_tokens': (row[1] if row else 0) + sum(r.get('total_tokens', 0) for r in unflushed),
+            'total_sessions': total_sessions + len(new_sessions)
+        }
+
+    def day_cost(self, day: str) -> float:
+        """Same contract as JSONLCostLedger.day_cost."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT total_cost FROM rollups WHERE dimension = 'day' AND key = ?", (day,)
+            ).fetchone()
+            unflushed = [r for r in self._unflushed() if (r.get('timestamp') or '')[:10] == day]
+        return (row[0] if row else 0) + sum(r.get('total_cost', 0) for r in unflushed)
+
+    def rollups(self) -> Tuple[CostRollups, int]:
+        """Same contract as JSONLCostLedger.rollups (the session count covers committed calls)."""
+        with self._lock:
+            conn = self._connection()
+            rollups = CostRollups.from_cells(
+                conn.execute(
+                    "SELECT dimension, key, total_cost, input_tokens, output_tokens, total_tokens, calls FROM rollups"
+                ),
+                (question_hash for (question_hash,) in conn.execute("SELECT hash FROM questions")),
+                conn.execute("SELECT metric, key, bucket, count FROM latency")
+            )
+            total_sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            unflushed = self._unflushed()
+        for record in unflushed:
+            rollups.add(record)
+        return rollups, total_sessions
+
+    def load(self) -> Optional[Dict]:
+        """Same contract as JSONLCostLedger.load (committed calls only)."""
+        sessions = {}
+        for (record,) in self._connection().execute("SELECT record FROM calls ORDER BY timestamp, id"):
+            _add_call(sessions, json.loads(record))
+        return {'sessions': sessions} if sessions else None
+
+    def read_calls(self, cursor: Optional[int] = None) -> Tuple[List[Dict], Optional[int], bool]:
+        """
+        Same contract as JSONLCostLedger.read_calls (the cursor is the last row id).
+
+        Only committed calls are listed, at most COST_DB_FLUSH_SECONDS behind.
+        """
+        conn = self._connection()
+        max_id = conn.execute("SELECT MAX(id) FROM calls").fetchone()[0] or 0
+        reset = cursor is None or max_id < cursor
+        last_id = 0 if reset else cursor
+        records = []
+        for row_id, record in conn.execute("SELECT id, record FROM calls WHERE id > ? ORDER BY id", (last_id,)):
+            records.append(_normalize_call(json.loads(record)))
+            last_id = row_id
+        return records, last_id, reset
+
+
+def create_cost_ledger(db_path: Optional[str] = COST_DB):
+    """Shared SQLite ledger when API_COST_DB is set, JSONL ledger otherwise."""
+    if db_path:
+        try:
+            return SQLiteCostLedger(db_path)
+        except sqlite3.Error as e:
+            print(f"Error opening cost database, using JSONL ledger: {e}")
+    return JSONLCostLedger()
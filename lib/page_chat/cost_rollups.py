@@ -0,0 +1,242 @@
+"""
+Cost Rollups for API call records.
+
+Running totals per day, model, page and call type, the set of distinct
+questions, and latency histograms per call type and model, updated as each
+call is logged.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Breakdowns kept besides the overall totals (record field -> rollup key)
+ROLLUP_DIMENSIONS = ('day', 'model', 'page_path', 'call_type')
+
+# Counter slots of each rollup cell
+COST, INPUT_TOKENS, OUTPUT_TOKENS, TOTAL_TOKENS, CALLS = range(5)
+_FIELDS = ('total_cost', 'input_tokens', 'output_tokens', 'total_tokens', 'calls')
+
+# Latency fields histogrammed per "call_type|model" (see log_api_request)
+LATENCY_METRICS = ('wall_ms', 'ttft_ms', 'tokens_per_second')
+
+# Log-spaced histogram buckets: upper bound of bucket i is first * growth ** i
+# (about 10 ms to 16 min for times, 0.5 to 48k tokens/s); the last bucket is
+# open-ended. Percentiles are accurate to within one bucket (20%).
+HISTOGRAM_BUCKETS = 64
+HISTOGRAM_GROWTH = 1.2
+_HISTOGRAM_FIRST = {'wall_ms': 10.0, 'ttft_ms': 10.0, 'tokens_per_second': 0.5}
+
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _dimension_key(record: Dict, dimension: str) -> str:
+    if dimension == 'day':
+        return (record.get('timestamp') or '')[:10]
+    value = record.get(dimension)
+    return value if value is not None else 'unknown'
+
+
+def _bucket_bound(metric: str, index: int) -> float:
+    return _HISTOGRAM_FIRST[metric] * HISTOGRAM_GROWTH ** index
+
+
+def bucket_index(metric: str, value: float) -> int:
+    """Histogram bucket holding a value (values on a bound belong to the lower bucket)."""
+    if value <= _HISTOGRAM_FIRST[metric]:
+        return 0
+    index = math.ceil(math.log(value / _HISTOGRAM_FIRST[metric]) / math.log(HISTOGRAM_GROWTH) - 1e-9)
+    return min(index, HISTOGRAM_BUCKETS - 1)
+
+
+def histogram_quantile(metric: str, counts: Dict[int, int], quantile: float) -> Optional[float]:
+    """
+    Estimate a quantile from bucket counts, interpolating inside the bucket.
+
+    Returns:
+        The estimate, or None for an empty histogram
+    """
+    total = sum(counts.values())
+    if not total:
+        return None
+    target = quantile * total
+    seen = 0
+    for index in sorted(counts):
+        count = counts[index]
+        if seen + count >= target:
+            lower = _bucket_bound(metric, index - 1) if index > 0 else 0.0
+            upper = _bucket_bound(metric, index)
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return _bucket_bound(metric, max(counts))
+
+
+class CostRollups:
+    """
+    Mergeable cost counters.
+
+    Each cell is [cost, input_tokens, output_tokens, total_tokens, calls], so
+    summary cards and breakdown charts cost O(distinct keys) regardless of how
+    many calls were logged. Distinct questions are counted exactly by their
+    transcript hash; latencies are kept as fixed-size histograms, so
+    percentiles do not need the raw calls either.
+    """
+
+    def __init__(self):
+        self.totals: List[float] = [0, 0, 0, 0, 0]
+        self.breakdowns: Dict[str, Dict[str, List[float]]] = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+        self.questions = set()
+        # metric -> "call_type|model" -> {bucket index: count}
+        self.latency: Dict[str, Dict[str, Dict[int, int]]] = {metric: {} for metric in LATENCY_METRICS}
+
+    @staticmethod
+    def _bump(cell: List[float], record: Dict):
+        cell[COST] += record.get('total_cost', 0)
+        cell[INPUT_TOKENS] += record.get('input_tokens', 0)
+        cell[OUTPUT_TOKENS] += record.get('output_tokens', 0)
+        cell[TOTAL_TOKENS] += record.get('total_tokens', 0)
+        cell[CALLS] += 1
+
+    def add(self, record: Dict):
+        """Count one call record."""
+        self._bump(self.totals, record)
+        for dimension, cells in self.breakdowns.items():
+            key = _dimension_key(record, dimension)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0, 0, 0, 0]
+            self._bump(cell, record)
+
+        question_hash = (record.get('metadata') or {}).get('question_hash')
+        if question_hash:
+            self.questions.add(question_hash)
+
+        latency_key = f"{record.get('call_type') or 'unknown'}|{record.get('model') or 'unknown'}"
+        for metric, histograms in self.latency.items():
+            value = record.get(metric)
+            if value is not None:
+                counts = histograms.setdefault(latency_key, {})
+                index = bucket_index(metric, value)
+                counts[index] = counts.get(index, 0) + 1
+
+    def summary(self, total_sessions: int = 0) -> Dict:
+        """
+        Overall totals in the shape of the analytics summary cards.
+
+        Args:
+            total_sessions: Number of sessions (tracked by the ledger)
+        """
+        total_cost = self.totals[COST]
+        total_calls = self.totals[CALLS]
+        unique_questions = len(self.questions)
+        return {
+            'total_cost': total_cost,
+            'total_tokens': self.totals[TOTAL_TOKENS],
+            'total_sessions': total_sessions,
+            'total_calls': total_calls,
+            'unique_questions': unique_questions,
+            'avg_cost_per_question': total_cost / unique_questions if unique_questions > 0 else 0,
+            'avg_cost_per_session': total_cost / total_sessions if total_sessions > 0 else 0,
+            'avg_tokens_per_call': self.totals[TOTAL_TOKENS] / total_calls if total_calls > 0 else 0
+        }
+
+    def breakdown(self, dimension: str) -> List[Dict]:
+        """
+        Per-key totals of one dimension, sorted by key.
+
+        Returns:
+            List of {key, total_cost, input_tokens, output_tokens, total_tokens, calls}
+        """
+        return [
+            {'key': key, **dict(zip(_FIELDS, cell))}
+            for key, cell in sorted(self.breakdowns[dimension].items())
+        ]
+
+    def latency_percentiles(self, quantiles: Sequence[float] = LATENCY_QUANTILES) -> List[Dict]:
+        """
+        Latency quantiles per call type and model, sorted by call type.
+
+        Returns:
+            List of {call_type, model, calls, <metric>_p<q>...} (None where a
+            metric was not recorded); calls counts the timed calls
+        """
+        keys = sorted(set().union(*(histograms.keys() for histograms in self.latency.values())))
+        rows = []
+        for key in keys:
+            call_type, _, model = key.partition('|')
+            row = {
+                'call_type': call_type,
+                'model': model,
+                'calls': sum(self.latency['wall_ms'].get(key, {}).values())
+            }
+            for metric, histograms in self.latency.items():
+                counts = histograms.get(key, {})
+                for quantile in quantiles:
+                    row[f'{metric}_p{round(quantile * 100)}'] = histogram_quantile(metric, counts, quantile)
+            rows.append(row)
+        return rows
+
+    def to_dict(self) -> Dict:
+        return {
+            'totals': self.totals,
+            'breakdowns': self.breakdowns,
+            'questions': sorted(self.questions),
+            'latency': self.latency
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "CostRollups":
+        rollups = cls()
+        if not data:
+            return rollups
+        rollups.totals = list(data.get('totals', rollups.totals))
+        for dimension, cells in data.get('breakdowns', {}).items():
+            if dimension in rollups.breakdowns:
+                rollups.breakdowns[dimension] = {key: list(cell) for key, cell in cells.items()}
+        rollups.questions = set(data.get('questions', ()))
+        for metric, histograms in data.get('latency', {}).items():
+            if metric in rollups.latency:
+                # JSON object keys are strings
+                rollups.latency[metric] = {
+                    key: {int(index): count for index, count in counts.items()}
+                    for key, counts in histograms.items()
+                }
+        return rollups
+
+    @classmethod
+    def from_cells(cls, cells: Iterable, questions: Iterable[str], latency: Iterable = ()) -> "CostRollups":
+        """
+        Build rollups from stored rows.
+
+        Args:
+            cells: (dimension, key, cost, input_tokens, output_tokens, total_tokens, calls)
+                rows; dimension '' holds the overall totals
+            questions: Distinct question hashes
+            latency: (metric, key, bucket, count) histogram rows
+        """
+        rollups = cls()
+        for dimension, key, *cell in cells:
+            if not dimension:
+                rollups.totals = list(cell)
+            elif dimension in rollups.breakdowns:
+                rollups.breakdowns[dimension][key] = list(cell)
+        rollups.questions = set(questions)
+        for metric, key, index, count in latency:
+            if metric in rollups.latency:
+                rollups.latency[metric].setdefault(key, {})[index] = count
+        return rollups
+
+    def cells(self) -> List[tuple]:
+        """Inverse of ``from_cells`` (without the questions and latency)."""
+        rows = [('', '', *self.totals)]
+        for dimension, cells in self.breakdowns.items():
+            rows.extend((dimension, key, *cell) for key, cell in cells.items())
+        return rows
+
+    def latency_cells(self) -> List[tuple]:
+        """Histogram rows for ``from_cells``."""
+        return [
+            (metric, key, index, count)
+            for metric, histograms in self.latency.items()
+            for key, counts in histograms.items()
+            for index, count in counts.items()
+        ]
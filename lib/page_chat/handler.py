@@ -6,13 +6,17 @@ AI chat experience for documentation pages.
 """
 
 import json
+import time
 import uuid
-from typing import Dict, Optional, Generator
-from .context_gatherer import ContextGatherer
+from typing import Dict, List, Mapping, Optional, Generator
+from .context_gatherer import ContextGatherer, ContextIndex
 from .markdown_responder import MarkdownResponder
 from .code_responder import CodeResponder
 from .section_suggester import SectionSuggester
 from .api_cost_logger import get_logger
+from .admission import AdmissionController
+from .answer_cache import REPLAY_CHUNK_CHARS, REPLAY_CHUNK_DELAY, AnswerCache, answer_key
+from .similar_questions import SimilarQuestionIndex
 
 
 class PageChatHandler:
@@ -37,10 +41,16 @@ class PageChatHandler:
 
         # Initialize components
         self.context_gatherer = ContextGatherer(base_url=base_url)
+        self.context_index = ContextIndex(self.context_gatherer, name_content_map)
         self.markdown_responder = MarkdownResponder(api_key=api_key)
         self.code_responder = CodeResponder(api_key=api_key)
         self.section_suggester = SectionSuggester(api_key=api_key)
         self.logger = get_logger()
+        self.admission = AdmissionController(daily_cost=self.logger.get_daily_cost)
+        self.answer_cache = AnswerCache()
+        self.similar_questions = SimilarQuestionIndex()
+        # Index already answered questions before the first one comes in
+        self.similar_questions.refresh_in_background()
 
     def create_session(self) -> str:
         """
@@ -56,7 +66,9 @@ class PageChatHandler:
         page_path: str,
         question: str,
         response_format: str = "markdown",
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        client_ip: Optional[str] = None,
+        client_id: Optional[str] = None
     ) -> Generator[str, None, None]:
         """
         Stream a response with SSE format.
@@ -68,6 +80,9 @@ class PageChatHandler:
             question: User's question
             response_format: Format of response ("markdown" or "code")
             session_id: Session ID for cost tracking (creates new if None)
+            client_ip: Client IP address for rate limiting
+            client_id: Server-issued client ID for per-session rate limiting
+                (client-chosen session IDs are only used for cost tracking)
 
         Yields:
             JSON-encoded SSE chunks
@@ -76,6 +91,35 @@ class PageChatHandler:
         if not session_id:
             session_id = self.create_session()
 
+        # Precomputed page context (content, TOC, related pages, formatted prompt)
+        context = self.context_index.get(page_path)
+        page_content = context['content'] if context else None
+        page_hash = context['content_hash'] if context else ''
+
+        # Step 0: Replay a cached answer to the same question on the same page version
+        cache_key = answer_key(page_path, question, response_format, page_hash)
+        cached_events = self.answer_cache.get(cache_key) if page_content else None
+        if cached_events is not None:
+            yield from self._replay_answer(cached_events, session_id)
+            return
+
+        # Or the answer to a near-duplicate question on this page (markdown answers only)
+        if page_content and response_format != "code":
+            match = self.similar_questions.find(page_path, question, page_hash)
+            if match:
+                yield from self._replay_answer(self._similar_answer_events(match), session_id)
+                return
+
+        # Admission (rate limits and daily budget) before any work
+        rejection = self.admission.admit(client_ip, client_id)
+        if rejection:
+            yield from self._local_only_response(context, question, rejection)
+            return
+
+        # Answer events for the cache, and whether every API call succeeded
+        answer_events = []
+        answer_ok = True
+
         try:
             # Step 1: Gather context
             yield json.dumps({
@@ -84,22 +128,15 @@ class PageChatHandler:
                 'message': 'Gathering page context...'
             }) + '\n'
 
-            context = self.context_gatherer.gather_full_context(
-                page_path=page_path,
-                name_content_map=self.name_content_map,
-                include_architecture=True,
-                include_related=True
-            )
-
-            if not context['content']:
+            if not page_content:
                 yield json.dumps({
                     'type': 'error',
                     'message': f'Could not find content for page: {page_path}'
                 }) + '\n'
                 return
 
-            # Format context for prompt
-            context_str = self.context_gatherer.format_context_for_prompt(context)
+            # Prompt context formatted when the index was built
+            context_str = context['prompt']
 
             # Step 2: Generate response based on format
             yield json.dumps({
@@ -109,6 +146,7 @@ class PageChatHandler:
             }) + '\n'
 
             accumulated_response = ""
+            calls_before = self._session_calls(session_id)
 
             if response_format == "code":
                 # Use CodeResponder with three-call architecture
@@ -123,10 +161,12 @@ class PageChatHandler:
                     # Try to extract response for section suggestions
                     try:
                         chunk_data = json.loads(chunk_str.strip())
+                        answer_events.append(chunk_data)
                         if chunk_data.get('type') == 'complete':
                             # For code responses, use the description
                             formatted = chunk_data.get('formatted', {})
                             accumulated_response = formatted.get('description', '')
+                            answer_ok = answer_ok and not formatted.get('error')
                     except:
                         pass
 
@@ -137,13 +177,15 @@ class PageChatHandler:
                     question=question,
                     context=context_str,
                     session_id=session_id,
-                    page_path=page_path
+                    page_path=page_path,
+                    page_hash=page_hash
                 ):
                     yield chunk_str
 
                     # Accumulate response for section suggestions
                     try:
                         chunk_data = json.loads(chunk_str.strip())
+                        answer_events.append(chunk_data)
                         if chunk_data.get('type') == 'chunk':
                             response_chunks.append(chunk_data.get('content', ''))
                         elif chunk_data.get('type') == 'complete':
@@ -155,6 +197,15 @@ class PageChatHandler:
                 if not accumulated_response and response_chunks:
                     accumulated_response = ''.join(response_chunks)
 
+            # Responders report API failures as text; count the calls that were logged
+            expected_calls = 3 if response_format == "code" else 1
+            answer_ok = (
+                answer_ok
+                and self._session_calls(session_id) - calls_before >= expected_calls
+                and not any(event.get('type') == 'error' for event in answer_events)
+                and any(event.get('type') == 'complete' for event in answer_events)
+            )
+
             # Step 3: Suggest relevant sections
             if context['toc'] and accumulated_response:
                 yield json.dumps({
@@ -174,24 +225,21 @@ class PageChatHandler:
                     )
 
                     if suggestions:
-                        yield json.dumps({
+                        sections_event = {
                             'type': 'sections',
                             'suggestions': suggestions
-                        }) + '\n'
+                        }
+                        answer_events.append(sections_event)
+                        yield json.dumps(sections_event) + '\n'
                 except Exception as e:
                     print(f"Error suggesting sections: {e}")
                     # Continue without section suggestions
 
+            if answer_ok:
+                self.answer_cache.put(cache_key, answer_events)
+
             # Step 4: Send session cost summary
-            session_costs = self.logger.get_session_costs(session_id)
-            if session_costs:
-                yield json.dumps({
-                    'type': 'cost_summary',
-                    'session_id': session_id,
-                    'total_cost': session_costs.get('total_cost', 0),
-                    'total_tokens': session_costs.get('total_tokens', 0),
-                    'num_calls': len(session_costs.get('calls', []))
-                }) + '\n'
+            yield from self._cost_summary(session_id)
 
             # Final done signal (if not already sent by responder)
             yield json.dumps({'type': 'done'}) + '\n'
@@ -202,6 +250,87 @@ class PageChatHandler:
                 'message': f'Error processing request: {str(e)}'
             }) + '\n'
 
+    def _session_calls(self, session_id: str) -> int:
+        session_costs = self.logger.get_session_costs(session_id)
+        return session_costs.get('num_calls', 0) if session_costs else 0
+
+    def _cost_summary(self, session_id: str) -> Generator[str, None, None]:
+        """Session cost summary event (nothing if the session has no calls)."""
+        session_costs = self.logger.get_session_costs(session_id)
+        if session_costs:
+            yield json.dumps({
+                'type': 'cost_summary',
+                'session_id': session_id,
+                'total_cost': session_costs.get('total_cost', 0),
+                'total_tokens': session_costs.get('total_tokens', 0),
+                'num_calls': session_costs.get('num_calls', 0)
+            }) + '\n'
+
+    def _replay_answer(self, events, session_id: str) -> Generator[str, None, None]:
+        """
+        Stream a cached answer with the same event types as a live one.
+
+        Chunks were coalesced when stored and are paced by REPLAY_CHUNK_DELAY.
+        """
+        yield json.dumps({
+            'type': 'progress',
+            'step': 'cached_answer',
+            'message': 'Found a saved answer to this question...'
+        }) + '\n'
+
+        for event in events:
+            if event.get('type') == 'chunk' and REPLAY_CHUNK_DELAY:
+                time.sleep(REPLAY_CHUNK_DELAY)
+            yield json.dumps(event) + '\n'
+
+        yield from self._cost_summary(session_id)
+        yield json.dumps({'type': 'done'}) + '\n'
+
+    def _similar_answer_events(self, match: Dict) -> List[Dict]:
+        """Markdown answer events for the answer to a similar earlier question."""
+        text = f"_Answer to a similar question: \"{match['question']}\"_\n\n{match['response']}"
+        events = [
+            {'type': 'chunk', 'content': text[i:i + REPLAY_CHUNK_CHARS]}
+            for i in range(0, len(text), REPLAY_CHUNK_CHARS)
+        ]
+        events.append({
+            'type': 'complete',
+            'formatted': self.markdown_responder.format_for_display(text),
+            'raw': text
+        })
+        events.append({'type': 'done'})
+        return events
+
+    def _local_only_response(
+        self,
+        context: Optional[Mapping],
+        question: str,
+        rejection: Dict
+    ) -> Generator[str, None, None]:
+        """
+        Answer a rejected request without calling the API.
+
+        Sends keyword-matched sections of the page (if any) followed by the
+        rejection as an error.
+        """
+        try:
+            if context and context['toc']:
+                suggestions = self.section_suggester.simple_keyword_suggest(question, context['toc'])
+                if suggestions:
+                    yield json.dumps({
+                        'type': 'sections',
+                        'suggestions': suggestions
+                    }) + '\n'
+        except Exception as e:
+            print(f"Error suggesting sections: {e}")
+
+        yield json.dumps({
+            'type': 'error',
+            'code': rejection['code'],
+            'message': rejection['message'],
+            'retry_after': round(rejection['retry_after'], 1)
+        }) + '\n'
+
     def get_session_summary(self, session_id: str) -> Optional[Dict]:
         """
         Get cost summary for a session.
@@ -7,9 +7,12 @@ and cost tracking.
 
 import os
 import json
+import time
 from typing import Dict, Optional, Generator
 from anthropic import Anthropic
 from .api_cost_logger import get_logger
+from .prompt_cache import cache_usage, cached_system
+from .stub_client import USE_STUB_CLIENT, StubAnthropic
 
 
 class MarkdownResponder:
@@ -30,6 +33,9 @@ class MarkdownResponder:
     def _ensure_client(self):
         """Ensure the Anthropic client is initialized."""
         if self.client is None:
+            if USE_STUB_CLIENT:
+                self.client = StubAnthropic()
+                return
             if not self.api_key:
                 raise ValueError("ANTHROPIC_API_KEY environment variable not set")
             self.client = Anthropic(api_key=self.api_key)
@@ -64,7 +70,8 @@ Guidelines:
         context: str,
         session_id: str,
         page_path: str,
-        max_tokens: int = 4000
+        max_tokens: int = 4000,
+        page_hash: Optional[str] = None
     ) -> Generator[str, None, None]:
         """
         Generate a markdown response with streaming.
@@ -75,18 +82,17 @@ Guidelines:
             session_id: Session ID for cost tracking
             page_path: Current page path
             max_tokens: Maximum tokens to generate
+            page_hash: Content hash of the page markdown (logged with the answer)
 
         Yields:
             Response chunks as they're generated
         """
         # Build the prompt
-        user_prompt = f"""Based on the following documentation context, please answer this question:
+        # Page context goes in the cached system prefix; only the question varies
+        user_prompt = f"""Based on the documentation context above, please answer this question:
 
 {question}
 
-Documentation Context:
-{context}
-
 Please provide a well-formatted markdown response that directly answers the question.
 When referencing sections, use the hash format like #section-name so users can jump to them.
 """
@@ -97,7 +103,10 @@ When referencing sections, use the hash format like #section-name so users can j
         # Track tokens for this call
         input_tokens = 0
         output_tokens = 0
+        cache_tokens = {}
         accumulated_response = ""
+        started = time.perf_counter()
+        ttft_ms = None
 
         try:
             # Stream the response
@@ -105,13 +114,15 @@ When referencing sections, use the hash format like #section-name so users can j
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=0.7,
-                system=self.build_system_prompt(),
+                system=cached_system(self.build_system_prompt(), context),
                 messages=[
                     {"role": "user", "content": user_prompt}
                 ]
             ) as stream:
                 # Yield chunks as they arrive
                 for text in stream.text_stream:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
                     accumulated_response += text
                     yield text
 
@@ -119,6 +130,7 @@ When referencing sections, use the hash format like #section-name so users can j
                 final_message = stream.get_final_message()
                 input_tokens = final_message.usage.input_tokens
                 output_tokens = final_message.usage.output_tokens
+                cache_tokens = cache_usage(final_message.usage)
 
         except Exception as e:
             error_msg = f"\n\n**Error generating response:** {str(e)}"
@@ -126,8 +138,10 @@ When referencing sections, use the hash format like #section-name so users can j
             yield error_msg
 
         finally:
+            wall_ms = (time.perf_counter() - started) * 1000
+
             # Log the API call cost with full question and response
-            if input_tokens > 0 or output_tokens > 0:
+            if input_tokens > 0 or output_tokens > 0 or cache_tokens:
                 self.logger.log_api_request(
                     session_id=session_id,
                     model=self.model,
@@ -137,8 +151,12 @@ When referencing sections, use the hash format like #section-name so users can j
                     page_path=page_path,
                     metadata={
                         'question': question,
-                        'response': accumulated_response
-                    }
+                        'response': accumulated_response,
+                        'page_hash': page_hash
+                    },
+                    wall_ms=wall_ms,
+                    ttft_ms=ttft_ms,
+                    **cache_tokens
                 )
 
     def format_for_display(self, markdown_text: str) -> Dict[str, any]:
@@ -163,7 +181,8 @@ When referencing sections, use the hash format like #section-name so users can j
         context: str,
         session_id: str,
         page_path: str,
-        max_tokens: int = 4000
+        max_tokens: int = 4000,
+        page_hash: Optional[str] = None
     ) -> Generator[str, None, None]:
         """
         Stream markdown response with cost logging.
@@ -176,6 +195,7 @@ When referencing sections, use the hash format like #section-name so users can j
             session_id: Session ID for cost tracking
             page_path: Current page path
             max_tokens: Maximum tokens to generate
+            page_hash: Content hash of the page markdown (logged with the answer)
 
         Yields:
             JSON-encoded chunks for SSE
@@ -189,7 +209,8 @@ When referencing sections, use the hash format like #section-name so users can j
                 context=context,
                 session_id=session_id,
                 page_path=page_path,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                page_hash=page_hash
             ):
                 accumulated_text += chunk
 
@@ -0,0 +1,45 @@
+"""
+Prompt Cache helpers for page chat responders.
+
+Requests put the instructions and page context (large and nearly constant
+per page) in the system prompt, marked for Anthropic prompt caching, and
+only the question in the user message, so repeat questions on a page read
+the prefix from the cache.
+"""
+
+from typing import Dict, List
+
+
+def cached_system(system_prompt: str, context: str) -> List[Dict]:
+    """
+    System blocks with the page context as a cacheable prefix.
+
+    Args:
+        system_prompt: Responder instructions
+        context: Formatted page context
+
+    Returns:
+        System content blocks; the cache breakpoint covers both blocks
+    """
+    return [
+        {'type': 'text', 'text': system_prompt},
+        {
+            'type': 'text',
+            'text': f"Documentation Context:\n{context}",
+            'cache_control': {'type': 'ephemeral'}
+        }
+    ]
+
+
+def cache_usage(usage) -> Dict[str, int]:
+    """
+    Prompt cache token counts of a response's usage.
+
+    Returns:
+        Dictionary with cache_write_tokens and cache_read_tokens (0 when
+        caching did not apply, e.g. a prefix below the model's minimum)
+    """
+    return {
+        'cache_write_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+        'cache_read_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0
+    }
@@ -7,10 +7,12 @@ that users can jump to using URL hash navigation.
 
 import os
 import json
+import time
 import re
 from typing import Dict, List, Optional
 from anthropic import Anthropic
 from .api_cost_logger import get_logger
+from .stub_client import USE_STUB_CLIENT, StubAnthropic
 
 
 class SectionSuggester:
@@ -31,6 +33,9 @@ class SectionSuggester:
     def _ensure_client(self):
         """Ensure the Anthropic client is initialized."""
         if self.client is None:
+            if USE_STUB_CLIENT:
+                self.client = StubAnthropic()
+                return
             if not self.api_key:
                 raise ValueError("ANTHROPIC_API_KEY environment variable not set")
             self.client = Anthropic(api_key=self.api_key)
@@ -102,6 +107,7 @@ Return a JSON array of up to {max_suggestions} section suggestions."""
         self._ensure_client()
 
         try:
+            started = time.perf_counter()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=1500,
@@ -109,6 +115,7 @@ Return a JSON array of up to {max_suggestions} section suggestions."""
                 system=self.build_system_prompt(),
                 messages=[{"role": "user", "content": user_prompt}]
             )
+            wall_ms = (time.perf_counter() - started) * 1000
 
             # Log the API call
             self.logger.log_api_request(
@@ -118,7 +125,9 @@ Return a JSON array of up to {max_suggestions} section suggestions."""
                 output_tokens=response.usage.output_tokens,
                 call_type='suggest_sections',
                 page_path=page_path,
-                metadata={'question': question[:100]}
+                metadata={'question': question[:100]},
+                wall_ms=wall_ms,
+                ttft_ms=wall_ms
             )
 
             # Extract and parse JSON
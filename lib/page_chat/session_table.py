@@ -0,0 +1,61 @@
+"""
+Session Table for per-session cost totals.
+
+Bounded in-memory map of recently active sessions, evicted by least recent
+use and idle time.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class SessionTable:
+    """
+    LRU map of session_id -> totals with an idle TTL.
+
+    Holds at most ``max_sessions`` entries; entries not read or updated for
+    ``idle_seconds`` are dropped on the next access. Callers reload evicted
+    sessions from persistent storage.
+    """
+
+    def __init__(self, max_sessions: int, idle_seconds: float):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        # session_id -> (totals, last active monotonic time), least recently used first
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            _, (_, last_active) = next(iter(entries.items()))
+            if len(entries) <= self.max_sessions and now - last_active < self.idle_seconds:
+                break
+            entries.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Totals of a cached session (marks it active), or None."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        self._entries[session_id] = (entry[0], now)
+        self._entries.move_to_end(session_id)
+        self._evict(now)
+        return entry[0]
+
+    def put(self, session_id: str, totals: Dict):
+        now = time.monotonic()
+        self._entries[session_id] = (totals, now)
+        self._entries.move_to_end(session_id)
+        self._evict(now)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        for session_id, (totals, _) in self._entries.items():
+            yield session_id, totals
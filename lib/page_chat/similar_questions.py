@@ -0,0 +1,254 @@
+"""
+Similar Question Index for page chat.
+
+Per-page MinHash LSH index of questions that already have a markdown answer,
+built from the cost ledger (question and response live in the transcript
+store) and extended incrementally, on a background thread, as new calls are
+logged.
+"""
+
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import threading
+
+from lib.minhash import MinHashLSH, trigrams
+
+from .answer_cache import normalize_question
+from .api_cost_logger import get_logger
+from .transcript_store import transcript_store
+
+
+# Exact trigram Jaccard similarity needed to reuse an answer. Questions that
+# ask different things can still share most trigrams ("python 3.8" vs
+# "python 3.12", "install" vs "uninstall"), so conflicting_questions() also
+# requires that they differ only in stop words.
+SIMILARITY_THRESHOLD = float(os.getenv('PAGE_CHAT_SIMILAR_THRESHOLD', '0.9'))
+
+# How far below the threshold a MinHash estimate may fall and still be
+# rechecked exactly (the estimate's std is about 0.04 near 0.9 with 64 permutations)
+CANDIDATE_MARGIN = 0.1
+
+# Shorter questions ("help", "example?") are too generic to match
+MIN_QUESTION_CHARS = 12
+
+# Questions indexed per page; the oldest are dropped beyond this
+MAX_QUESTIONS_PER_PAGE = 2000
+
+# Call type whose records carry a full markdown answer
+ANSWER_CALL_TYPE = 'generate_markdown'
+
+# Minimum seconds between background refreshes from the ledger
+REFRESH_SECONDS = 5.0
+
+# Words that flip a question's meaning when only one of two questions has them
+NEGATION_WORDS = {'not', 'no', 'never', 'without', 'cannot', 'nor', 'none', 'neither'}
+
+# Words two questions may differ in and still ask the same thing
+STOP_WORDS = {
+    'a', 'an', 'the', 'this', 'that', 'these', 'those', 'it', 'its', 'there',
+    'i', 'me', 'my', 'we', 'our', 'us', 'you', 'your',
+    'is', 'are', 'was', 'were', 'be', 'been', 'am', 'do', 'does', 'did',
+    'can', 'could', 'would', 'should', 'will', 'shall', 'may', 'might', 'must',
+    'how', 'what', 'which', 'why', 'where', 'when', 'who',
+    'to', 'of', 'in', 'on', 'at', 'by', 'for', 'with', 'from', 'into', 'about',
+    'and', 'or', 'so', 'if', 'then', 'just', 'also', 'here',
+    'please', 'pls', 'thanks', 'hi', 'hello', 'hey',
+    'way', 'ways', 'possible', 'need', 'want', 'like', 'some', 'any',
+}
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _stem(word: str) -> str:
+    """Crude stem so inflections compare equal ("enabled", "enabling" -> "enabl")."""
+    for suffix in ('ing', 'ed', 'es', 'e', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+_STOP_STEMS = {_stem(word) for word in STOP_WORDS}
+
+
+def _words(question: str) -> Set[str]:
+    return {_stem(word) for word in _WORD.findall(question)}
+
+
+def _negates(word: str) -> bool:
+    return word in NEGATION_WORDS or word.endswith("n't")
+
+
+def conflicting_questions(first: str, second: str) -> bool:
+    """
+    True if two similar-looking questions may ask different things.
+
+    Looks only at the words that differ: a negation, anything containing a
+    digit (versions, thresholds, identifiers) or any word that is not a stop
+    word conflicts, so only rephrasings like "how do I" / "how can I" match.
+    """
+    first_words, second_words = _words(first), _words(second)
+    for word in first_words ^ second_words:
+        if _negates(word) or any(char.isdigit() for char in word):
+            return True
+        if word not in _STOP_STEMS:
+            return True
+    return False
+
+
+def trigram_similarity(first: str, second: str) -> float:
+    """Exact Jaccard similarity of two texts' character trigrams."""
+    first_grams, second_grams = trigrams(first), trigrams(second)
+    union = first_grams | second_grams
+    if not union:
+        return 0.0
+    return len(first_grams & second_grams) / len(union)
+
+
+class SimilarQuestionIndex:
+    """
+    Near-duplicate lookup of previously answered questions, per page.
+
+    Entries remember the page content hash they were answered against, so
+    answers for another version of a page (or of unknown version) are not
+    reused. Lookups never touch the ledger: they kick off a background
+    refresh and answer from what is indexed so far.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._indexes: Dict[str, MinHashLSH] = {}
+        # page_path -> question_hash -> {question, response_hash, page_hash}, oldest first
+        self._entries: Dict[str, "OrderedDict[str, Dict]"] = {}
+        self._cursor = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._last_refresh = None
+
+    @staticmethod
+    def _entry(record: Dict) -> Optional[Dict]:
+        """Index entry of a ledger record (reads the question from the transcript store)."""
+        metadata = record.get('metadata') or {}
+        if not record.get('page_path') or not metadata.get('page_hash'):
+            return None
+        if not metadata.get('question_hash') or not metadata.get('response_hash'):
+            return None
+
+        question = normalize_question(transcript_store.get(metadata['question_hash']) or '')
+        if len(question) < MIN_QUESTION_CHARS:
+            return None
+        return {
+            'page_path': record['page_path'],
+            'question_hash': metadata['question_hash'],
+            'question': question,
+            'response_hash': metadata['response_hash'],
+            'page_hash': metadata['page_hash']
+        }
+
+    def _add(self, entry: Dict):
+        """Add an entry (caller holds the lock)."""
+        page_path = entry['page_path']
+        question_hash = entry['question_hash']
+        index = self._indexes.get(page_path)
+        if index is None:
+            index = self._indexes[page_path] = MinHashLSH()
+            self._entries[page_path] = OrderedDict()
+        entries = self._entries[page_path]
+
+        # A question asked again keeps its latest answer
+        entries.pop(question_hash, None)
+        entries[question_hash] = {
+            'question': entry['question'],
+            'response_hash': entry['response_hash'],
+            'page_hash': entry['page_hash']
+        }
+        index.add(question_hash, entry['question'])
+
+        while len(entries) > MAX_QUESTIONS_PER_PAGE:
+            oldest, _ = entries.popitem(last=False)
+            index.remove(oldest)
+
+    def refresh(self):
+        """Index answers logged since the last refresh (rebuild if the ledger was replaced)."""
+        records, cursor, reset = get_logger().read_calls(self._cursor)
+        # Transcripts are read before taking the lock, so lookups are not held up
+        new_entries: List[Dict] = []
+        for record in records:
+            if record.get('call_type') == ANSWER_CALL_TYPE:
+                entry = self._entry(record)
+                if entry is not None:
+                    new_entries.append(entry)
+
+        with self._lock:
+            if reset:
+                self._indexes = {}
+                self._entries = {}
+            for entry in new_entries:
+                self._add(entry)
+        self._cursor = cursor
+
+    def _run_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error indexing answered questions: {e}")
+
+    def refresh_in_background(self):
+        """Start a refresh on a daemon thread unless one is running or ran recently."""
+        now = time.monotonic()
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            if self._last_refresh is not None and now - self._last_refresh < REFRESH_SECONDS:
+                return
+            self._last_refresh = now
+            self._refresh_thread = threading.Thread(target=self._run_refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def find(self, page_path: str, question: str, page_hash: Optional[str] = None) -> Optional[Dict]:
+        """
+        Best previously answered question on a page similar to this one.
+
+        Args:
+            page_path: Current page path
+            question: User's question
+            page_hash: Content hash of the page as it is now
+
+        Returns:
+            {question, response, similarity} or None if nothing is similar
+            enough (or the index is still being built)
+        """
+        self.refresh_in_background()
+
+        question = normalize_question(question)
+        if not page_hash or len(question) < MIN_QUESTION_CHARS:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(page_path)
+            if index is None:
+                return None
+            entries = self._entries[page_path]
+            candidates = [
+                entries[question_hash]
+                for question_hash, _ in index.query(question, self.threshold - CANDIDATE_MARGIN)
+                if entries[question_hash]['page_hash'] == page_hash
+            ]
+
+        # MinHash only finds candidates; the exact similarity decides
+        matches = []
+        for entry in candidates:
+            if conflicting_questions(question, entry['question']):
+                continue
+            similarity = trigram_similarity(question, entry['question'])
+            if similarity >= self.threshold:
+                matches.append((entry, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+
+        for entry, similarity in matches:
+            response = transcript_store.get(entry['response_hash'])
+            if response:
+                return {'question': entry['question'], 'response': response, 'similarity': similarity}
+        return None
@@ -0,0 +1,132 @@
+"""
+Stub Anthropic client for local testing of page chat.
+
+Enabled with PAGE_CHAT_STUB_CLIENT=1: responders get canned answers without
+an API key or network access, with token usage estimated from the prompt
+and prompt caching simulated, so cost logging, the cost ledger and
+analytics can be exercised end to end.
+"""
+
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import threading
+
+
+USE_STUB_CLIENT = os.getenv('PAGE_CHAT_STUB_CLIENT') == '1'
+
+# Prompt cache lifetime (Anthropic's default ephemeral cache)
+STUB_CACHE_TTL_SECONDS = 300
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _block_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+
+class _StubMessages:
+    def __init__(self):
+        # prefix hash -> expiry (epoch seconds)
+        self._cache: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _usage(self, system, messages: List[Dict], output_text: str) -> SimpleNamespace:
+        """Usage with the prefix up to the last cache breakpoint counted as cache write or read."""
+        blocks = [{'type': 'text', 'text': system}] if isinstance(system, str) else list(system or [])
+        breakpoint_index = max(
+            (i for i, block in enumerate(blocks) if block.get('cache_control')),
+            default=-1
+        )
+        prefix = _block_text(blocks[:breakpoint_index + 1])
+        rest = _block_text(blocks[breakpoint_index + 1:]) + ''.join(
+            _block_text(message['content']) for message in messages
+        )
+
+        cache_write = cache_read = 0
+        if prefix:
+            digest = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+            now = time.time()
+            with self._lock:
+                if self._cache.get(digest, 0) > now:
+                    cache_read = _estimate_tokens(prefix)
+                else:
+                    cache_write = _estimate_tokens(prefix)
+                self._cache[digest] = now + STUB_CACHE_TTL_SECONDS
+
+        return SimpleNamespace(
+            input_tokens=_estimate_tokens(rest),
+            output_tokens=_estimate_tokens(output_text),
+            cache_creation_input_tokens=cache_write,
+            cache_read_input_tokens=cache_read
+        )
+
+    @staticmethod
+    def _reply(system, messages: List[Dict]) -> str:
+        """Canned reply in the shape the calling responder parses."""
+        prompt = _block_text(messages[-1]['content'])
+        # Instructions only (page context blocks may mention JSON too)
+        instructions = system if isinstance(system, str) else (system[0].get('text', '') if system else '')
+        if 'JSON array' in prompt:
+            return '[]'
+        if 'JSON' in instructions:
+            return json.dumps({
+                'files': [{
+                    'filename': 'app.py',
+                    'language': 'python',
+                    'code': '# Stub code example\n',
+                    'description': 'Stub file',
+                    'highlights': []
+                }],
+                'description': 'Stub response',
+                'concepts': []
+            })
+        return f"**Stub answer.** You asked:\n\n> {prompt.strip()[:200]}"
+
+    def create(self, model: str, max_tokens: int, system=None, messages: Optional[List[Dict]] = None, **kwargs):
+        messages = messages or []
+        text = self._reply(system, messages)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=self._usage(system, messages, text),
+            model=model
+        )
+
+    def stream(self, model: str, max_tokens: int, system=None, messages: Optional[List[Dict]] = None, **kwargs):
+        return _StubStream(self.create(model, max_tokens, system=system, messages=messages))
+
+
+class _StubStream:
+    """Context manager mimicking ``client.messages.stream``."""
+
+    def __init__(self, message):
+        self._message = message
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for word in self._message.content[0].text.split(' '):
+            yield word + ' '
+
+    def get_final_message(self):
+        return self._message
+
+
+class StubAnthropic:
+    """Drop-in for ``anthropic.Anthropic`` covering ``messages.create`` and ``messages.stream``."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.messages = _StubMessages()
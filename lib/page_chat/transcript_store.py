@@ -0,0 +1,138 @@
+"""
+Transcript Store for chat questions and responses.
+
+Content-addressed, zlib-compressed blobs keyed by SHA-256, so identical
+texts are stored once and cost records only need to carry the hash.
+"""
+
+import hashlib
+import os
+import re
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+import threading
+
+
+# Decompressed texts kept in memory for repeat lookups
+TRANSCRIPT_CACHE_SIZE = 256
+
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class TranscriptStore:
+    """
+    Blob store laid out as ``<directory>/<hash[:2]>/<hash[2:]>``.
+
+    Writes go to a temporary file that is renamed into place, so concurrent
+    workers storing the same text never leave a partial blob behind.
+    """
+
+    def __init__(self, directory, cache_size: int = TRANSCRIPT_CACHE_SIZE):
+        """
+        Args:
+            directory: Directory holding the blobs
+            cache_size: Number of decompressed texts kept in memory
+        """
+        self.directory = Path(directory)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest[2:]
+
+    def _remember(self, digest: str, text: str):
+        with self._lock:
+            self._cache[digest] = text
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, text: str) -> Dict:
+        """
+        Store a text (no-op if it is already stored).
+
+        Returns:
+            Dictionary with the text's hash and size (UTF-8 bytes)
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp_path, path)
+        return {'hash': digest, 'size': len(data)}
+
+    def get(self, digest: Optional[str]) -> Optional[str]:
+        """
+        Load a text by hash.
+
+        Returns:
+            The text, or None if the hash is malformed or unknown
+        """
+        if not digest or not _HASH_PATTERN.match(digest):
+            return None
+
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                return text
+
+        try:
+            with open(self._path(digest), 'rb') as f:
+                text = zlib.decompress(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, UnicodeDecodeError) as e:
+            print(f"Error reading transcript {digest}: {e}")
+            return None
+
+        self._remember(digest, text)
+        return text
+
+
+# Question/response bodies, stored once per distinct text
+TRANSCRIPTS_DIR = Path('api-transcripts')
+
+# Metadata fields moved into the transcript store (records keep <field>_hash and <field>_size)
+TRANSCRIPT_FIELDS = ('question', 'response')
+
+# Characters of a question kept inline in cost records, so question tables need no blob reads
+QUESTION_PREVIEW_CHARS = 160
+
+transcript_store = TranscriptStore(TRANSCRIPTS_DIR)
+
+
+def question_preview(text: str, limit: int = QUESTION_PREVIEW_CHARS) -> str:
+    """Single-line start of a question, cut at ``limit`` characters."""
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def externalize_transcripts(metadata: Optional[Dict]) -> Optional[Dict]:
+    """
+    Replace inline question/response text with transcript store references.
+
+    Returns:
+        Metadata with ``<field>_hash`` and ``<field>_size`` in place of each text field,
+        plus a short ``question_preview``
+    """
+    if not metadata or not any(field in metadata for field in TRANSCRIPT_FIELDS):
+        return metadata
+
+    metadata = dict(metadata)
+    for field in TRANSCRIPT_FIELDS:
+        text = metadata.pop(field, None)
+        if isinstance(text, str):
+            blob = transcript_store.put(text)
+            metadata[f'{field}_hash'] = blob['hash']
+            metadata[f'{field}_size'] = blob['size']
+            if field == 'question':
+                metadata['question_preview'] = question_preview(text)
+    return metadata
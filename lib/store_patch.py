@@ -0,0 +1,133 @@
+"""
+Store Snapshot Patching
+Turns a refreshed dcc.Store payload into a dash.Patch against the client's last snapshot
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dash import Patch
+
+
+# Snapshots remembered per process; clients with an older version get a full payload
+MAX_SNAPSHOTS = 64
+
+# Beyond this fraction of changed rows a list is replaced instead of patched row by row
+MAX_PATCHED_ROW_FRACTION = 0.5
+
+
+def snapshot_version(data: Any) -> str:
+    """Content hash of a JSON-serializable store payload."""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class SnapshotHistory:
+    """Bounded, thread-safe map of snapshot version -> store payload (oldest evicted first)."""
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, Any]" = OrderedDict()
+
+    def remember(self, data: Any) -> str:
+        """Store a payload and return its version."""
+        version = snapshot_version(data)
+        with self._lock:
+            self._snapshots[version] = data
+            self._snapshots.move_to_end(version)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return version
+
+    def get(self, version: Optional[str]) -> Optional[Any]:
+        if not version:
+            return None
+        with self._lock:
+            return self._snapshots.get(version)
+
+
+def _diff_keyed_list(patch, old: list, new: list, key: str) -> bool:
+    """
+    Patch a list of rows identified by ``key``.
+
+    Handles the shapes a refresh produces: rows updated in place, rows appended
+    at the end, and a time window sliding forward (rows dropped from the front).
+
+    Returns:
+        False if the lists do not line up and the caller should replace the list
+    """
+    old_keys = [row.get(key) for row in old]
+    new_keys = [row.get(key) for row in new]
+
+    if not new_keys:
+        return False
+
+    # Number of rows dropped from the front of the old list
+    try:
+        offset = old_keys.index(new_keys[0]) if old_keys else 0
+    except ValueError:
+        return False
+
+    overlap = len(old_keys) - offset
+    if old_keys[offset:] != new_keys[:overlap]:
+        return False
+
+    changed = [i for i in range(overlap) if old[offset + i] != new[i]]
+    if len(changed) + (len(new) - overlap) > len(new) * MAX_PATCHED_ROW_FRACTION:
+        return False
+
+    for _ in range(offset):
+        del patch[0]
+    for i in changed:
+        patch[i] = new[i]
+    if len(new) > overlap:
+        patch.extend(new[overlap:])
+    return True
+
+
+def _diff_into(patch, old: Any, new: Any, list_keys: Dict[str, str], path: str) -> bool:
+    """
+    Record operations turning ``old`` into ``new`` on ``patch``.
+
+    Returns:
+        False if the value cannot be patched in place and must be replaced
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for name in old.keys() - new.keys():
+            del patch[name]
+        for name, value in new.items():
+            if name in old and old[name] == value:
+                continue
+            child_path = f"{path}.{name}" if path else name
+            # Containers are patched recursively, scalars (counters) are assigned
+            if name not in old or not _diff_into(patch[name], old[name], value, list_keys, child_path):
+                patch[name] = value
+        return True
+
+    if isinstance(old, list) and isinstance(new, list) and path in list_keys:
+        return _diff_keyed_list(patch, old, new, list_keys[path])
+
+    return False
+
+
+def diff_patch(old: Dict, new: Dict, list_keys: Optional[Dict[str, str]] = None):
+    """
+    Build a dash.Patch that turns the ``old`` store payload into ``new``.
+
+    Args:
+        old: Payload the client currently holds
+        new: Fresh payload
+        list_keys: Dotted path of a list (e.g. "ads.campaigns") -> field identifying its rows
+
+    Returns:
+        A Patch, or None when nothing changed
+    """
+    if old == new:
+        return None
+
+    patch = Patch()
+    _diff_into(patch, old, new, list_keys or {}, "")
+    return patch
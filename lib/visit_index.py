@@ -0,0 +1,191 @@
+"""
+Visitor Time Index
+Keeps visitor records sorted by timestamp so time-range queries are a binary search
+"""
+import bisect
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# Internal Dash paths and static assets that should never be counted as visits
+SKIP_PATHS = [
+    '.css', '.js', '.png', '.jpg', '.ico', '_dash', '_reload-hash',
+    '/_dash-update-component', '/_dash-layout', '/assets/', '[]'
+]
+
+
+def _to_epoch(value) -> Optional[float]:
+    """Convert a datetime or ISO timestamp string to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class VisitIndex:
+    """
+    Time-sorted, incrementally maintained view of the visitor analytics file.
+
+    The tracker only ever appends visits, so on refresh only the records past
+    the last consumed position are cleaned and parsed. Range lookups bisect the
+    parallel ``times`` list instead of scanning and parsing every visit.
+    """
+
+    def __init__(self, data_file, geo_index=None):
+        """
+        Args:
+            data_file: Path to the visitor analytics JSON file
+            geo_index: Optional GeoIndex kept in sync with the visits indexed here
+        """
+        self.data_file = Path(data_file)
+        self.geo_index = geo_index
+        self._lock = threading.Lock()
+        self._signature = None  # (mtime_ns, size) of the last load
+        self._consumed = 0      # Raw visits consumed from the file
+        self._times: List[float] = []
+        self._visits: List[Dict] = []
+        # Bot-only sub-index, used to page through bot visits
+        self._bot_times: List[float] = []
+        self._bot_visits: List[Dict] = []
+        # Bumped whenever the index is rebuilt from scratch
+        self._generation = 0
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.data_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reset(self):
+        self._generation += 1
+        self._consumed = 0
+        self._times = []
+        self._visits = []
+        self._bot_times = []
+        self._bot_visits = []
+        if self.geo_index is not None:
+            self.geo_index.reset()
+
+    @staticmethod
+    def _insert_sorted(times: List[float], records: List[Dict], epoch: float, record: Dict):
+        """Insert into parallel sorted lists (append in the common case)."""
+        if not times or epoch >= times[-1]:
+            times.append(epoch)
+            records.append(record)
+        else:
+            position = bisect.bisect_right(times, epoch)
+            times.insert(position, epoch)
+            records.insert(position, record)
+
+    def _insert(self, visit: Dict):
+        """Insert a visit keeping the index sorted."""
+        if any(skip in visit.get("path", "") for skip in SKIP_PATHS):
+            return
+
+        epoch = _to_epoch(visit.get("timestamp"))
+        if epoch is None:
+            return
+
+        self._insert_sorted(self._times, self._visits, epoch, visit)
+        if visit.get("device_type") == "bot":
+            self._insert_sorted(self._bot_times, self._bot_visits, epoch, visit)
+        if self.geo_index is not None:
+            self.geo_index.add(visit, epoch)
+
+    def refresh(self) -> bool:
+        """
+        Reload the data file if it changed since the last refresh.
+
+        Returns:
+            True if new visits were indexed
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if signature is None:
+                self._signature = None
+                self._reset()
+                return False
+            if signature == self._signature:
+                return False
+
+            try:
+                with open(self.data_file, "r") as f:
+                    data = json.load(f)
+            except json.JSONDecodeError as e:
+                # File is being rewritten by the tracker; keep the current index
+                print(f"JSON decode error (likely concurrent write): {e}")
+                return False
+            except Exception as e:
+                print(f"Error loading analytics file: {e}")
+                return False
+
+            raw_visits = data.get("visits", [])
+
+            # The file was truncated or replaced, start over
+            if len(raw_visits) < self._consumed:
+                self._reset()
+
+            for visit in raw_visits[self._consumed:]:
+                self._insert(visit)
+
+            self._consumed = len(raw_visits)
+            self._signature = signature
+            return True
+
+    @staticmethod
+    def _bounds(times: List[float], start=None, end=None) -> Tuple[int, int]:
+        start_epoch = _to_epoch(start)
+        end_epoch = _to_epoch(end)
+        lo = bisect.bisect_left(times, start_epoch) if start_epoch is not None else 0
+        hi = bisect.bisect_right(times, end_epoch) if end_epoch is not None else len(times)
+        return lo, max(lo, hi)
+
+    def query(self, start=None, end=None) -> List[Dict]:
+        """
+        Get visits with start <= timestamp <= end.
+
+        Args:
+            start: datetime or ISO string (None = from the first visit)
+            end: datetime or ISO string (None = up to the last visit)
+
+        Returns:
+            List of visits sorted by timestamp
+        """
+        with self._lock:
+            lo, hi = self._bounds(self._times, start, end)
+            return self._visits[lo:hi]
+
+    def query_with_times(self, start=None, end=None) -> Tuple[List[float], List[Dict]]:
+        """Same as query() but also returns the parallel epoch-seconds list."""
+        with self._lock:
+            lo, hi = self._bounds(self._times, start, end)
+            return self._times[lo:hi], self._visits[lo:hi]
+
+    def query_bots(self, start=None, end=None) -> List[Dict]:
+        """Get bot visits with start <= timestamp <= end, oldest first."""
+        with self._lock:
+            lo, hi = self._bounds(self._bot_times, start, end)
+            return self._bot_visits[lo:hi]
+
+    def bot_version(self) -> str:
+        """Token that changes whenever bot visits are added or the index is rebuilt."""
+        with self._lock:
+            return f"{self._generation}-{len(self._bot_times)}"
+
+    def first_timestamp(self) -> Optional[datetime]:
+        """Timestamp of the oldest indexed visit."""
+        with self._lock:
+            if not self._times:
+                return None
+            return datetime.fromtimestamp(self._times[0])
+
+    def __len__(self):
+        return len(self._times)
@@ -5,16 +5,19 @@ This page demonstrates visitor tracking with device and bot detection.
 Updates in real-time without requiring page refresh.
 """
 import dash_mantine_components as dmc
-from dash import Input, Output, callback, html, register_page, dcc
+from dash import ClientsideFunction, Input, Output, State, callback, clientside_callback, ctx, html, register_page, dcc, no_update
 from datetime import datetime, timedelta
-import json
+import math
 from pathlib import Path
 from collections import Counter
 import dash_ag_grid as dag
-import plotly.graph_objects as go
 
 # Import advertising analytics
-from lib.ad_analytics import get_campaign_performance, get_total_stats, get_clicks_by_page
+from lib.ad_analytics import get_campaign_performance, get_total_stats, get_clicks_by_page, get_ctr_by_day, refresh_index
+from lib.downsample import downsample_rows, target_points
+from lib.geo_index import GeoIndex, precision_for_zoom
+from lib.store_patch import SnapshotHistory, diff_patch
+from lib.visit_index import VisitIndex
 
 # Register page
 register_page(
@@ -29,101 +32,142 @@ register_page(
 ANALYTICS_FILE = Path(__file__).parent.parent / "visitor_analytics.json"
 
 
-def load_analytics():
-    """Load analytics data from JSON file with error handling for concurrent access."""
-    if ANALYTICS_FILE.exists():
-        try:
-            with open(ANALYTICS_FILE, "r") as f:
-                data = json.load(f)
-        except json.JSONDecodeError as e:
-            # Handle race condition where file is being written while being read
-            print(f"JSON decode error (likely concurrent write): {e}")
-            # Return empty analytics data structure
-            return {
-                "visits": [],
-                "stats": {
-                    "desktop": 0,
-                    "mobile": 0,
-                    "tablet": 0,
-                    "bot": 0,
-                    "total": 0
-                }
-            }
-        except Exception as e:
-            print(f"Error loading analytics file: {e}")
-            return {
-                "visits": [],
-                "stats": {
-                    "desktop": 0,
-                    "mobile": 0,
-                    "tablet": 0,
-                    "bot": 0,
-                    "total": 0
-                }
-            }
+# Time-sorted index over the visitor analytics file, with geohash map aggregates
+geo_index = GeoIndex()
+visit_index = VisitIndex(ANALYTICS_FILE, geo_index=geo_index)
+
+# Selectable time ranges for the dashboard
+RANGE_OPTIONS = [
+    {"value": "1h", "label": "1h"},
+    {"value": "24h", "label": "24h"},
+    {"value": "7d", "label": "7d"},
+    {"value": "30d", "label": "30d"},
+    {"value": "all", "label": "All time"},
+    {"value": "custom", "label": "Custom"},
+]
+RANGE_DELTAS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+DEFAULT_RANGE = "24h"
+
+# Recent aggregate store payloads, so refreshes can be sent as a Patch against the client's copy
+summary_snapshots = SnapshotHistory()
+
+# Row identity for the store's lists (dotted path -> key field), used when diffing snapshots
+SUMMARY_LIST_KEYS = {
+    "bot_types": "type",
+    "hourly": "hour",
+    "top_pages": "page",
+    "locations": "geohash",
+    "ads.campaigns": "campaign",
+    "ads.clicks_by_page": "page",
+    "ads.ctr_by_day": "date",
+}
+
+
+def resolve_time_range(range_key, custom_dates=None):
+    """
+    Resolve a range selection to (start, end) datetimes.
+
+    Args:
+        range_key: One of the RANGE_OPTIONS values
+        custom_dates: [start_date, end_date] from the date picker (used for "custom")
+
+    Returns:
+        Tuple of (start, end); start is None for "all time"
+    """
+    now = datetime.now()
 
-        # Clean up any _reload-hash or internal Dash paths from existing data
-        clean_visits = []
-        for visit in data.get("visits", []):
-            path = visit.get("path", "")
-            # Filter out internal Dash paths
-            skip_paths = [
-                '.css', '.js', '.png', '.jpg', '.ico', '_dash', '_reload-hash',
-                '/_dash-update-component', '/_dash-layout', '/assets/', '[]'
-            ]
-            if not any(ext in path for ext in skip_paths):
-                clean_visits.append(visit)
+    if range_key in RANGE_DELTAS:
+        return now - RANGE_DELTAS[range_key], now
 
-        # Recalculate stats from clean visits based on unique sessions
-        stats = {
-            "desktop": 0,
-            "mobile": 0,
-            "tablet": 0,
-            "bot": 0,
-            "total": 0
-        }
+    if range_key == "custom" and custom_dates and all(custom_dates):
+        start = datetime.fromisoformat(str(custom_dates[0])[:10])
+        # End date is inclusive, so extend to the end of that day
+        end = datetime.fromisoformat(str(custom_dates[1])[:10]) + timedelta(days=1) - timedelta(microseconds=1)
+        return start, min(end, now)
 
-        # Track unique sessions to count visitors, not page views
-        seen_sessions = set()
+    return None, now
 
-        for visit in clean_visits:
-            session_id = visit.get("session_id")
-            device_type = visit.get("device_type", "desktop")
 
-            # Only count each session once
-            if session_id and session_id not in seen_sessions:
-                seen_sessions.add(session_id)
-                stats[device_type] = stats.get(device_type, 0) + 1
-                stats["total"] += 1
-            elif not session_id:
-                # Handle old visits without session_id (count them all for backwards compatibility)
-                stats[device_type] = stats.get(device_type, 0) + 1
-                stats["total"] += 1
+def load_analytics(start=None, end=None):
+    """
+    Load analytics for a time range.
 
-        return {
-            "visits": clean_visits,
-            "stats": stats
-        }
+    Visits come from the time index, so only the slice inside the range is
+    aggregated. Stats count unique sessions (visitors, not page views).
+    """
+    visit_index.refresh()
+    times, visits = visit_index.query_with_times(start, end)
+
+    stats = {
+        "desktop": 0,
+        "mobile": 0,
+        "tablet": 0,
+        "bot": 0,
+        "total": 0
+    }
+
+    # Track unique sessions to count visitors, not page views
+    seen_sessions = set()
+
+    for visit in visits:
+        session_id = visit.get("session_id")
+        device_type = visit.get("device_type", "desktop")
+
+        # Only count each session once
+        if session_id and session_id not in seen_sessions:
+            seen_sessions.add(session_id)
+            stats[device_type] = stats.get(device_type, 0) + 1
+            stats["total"] += 1
+        elif not session_id:
+            # Handle old visits without session_id (count them all for backwards compatibility)
+            stats[device_type] = stats.get(device_type, 0) + 1
+            stats["total"] += 1
 
     return {
-        "visits": [],
-        "stats": {
-            "desktop": 0,
-            "mobile": 0,
-            "tablet": 0,
-            "bot": 0,
-            "total": 0
+        "visits": visits,
+        "times": times,
+        "stats": stats,
+        "range": {
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
         }
     }
 
 
-def load_ad_analytics():
-    """Load advertising analytics data on page load."""
+def load_ad_analytics(start=None, end=None):
+    """
+    Load advertising analytics for a time range, reduced to what the page renders.
+
+    Returns:
+        Dictionary with total stats, campaign grid rows and top 10 pages by clicks
+    """
     try:
+        # One journal refresh for every view below
+        index = refresh_index()
+        campaign_rows = [
+            {
+                'campaign': campaign['name'],
+                'impressions': campaign['impressions'],
+                'clicks': campaign['clicks'],
+                'ctr': f"{campaign['ctr']}%",
+                'status': 'Active' if campaign['active'] else 'Inactive',
+                'url': campaign['url']
+            }
+            for campaign in get_campaign_performance(start, end, index)
+        ]
         return {
-            'total_stats': get_total_stats(),
-            'campaign_performance': get_campaign_performance(),
-            'clicks_by_page': get_clicks_by_page()
+            'total_stats': get_total_stats(start, end, index),
+            'campaigns': campaign_rows,
+            'clicks_by_page': [
+                {"page": item['page'], "clicks": item['clicks']}
+                for item in get_clicks_by_page(start, end, index)[:10]  # Top 10 pages
+            ],
+            'ctr_by_day': get_ctr_by_day(start, end, index=index)
         }
     except Exception as e:
         print(f"Error loading advertising analytics: {e}")
@@ -134,8 +178,9 @@ def load_ad_analytics():
                 'overall_ctr': 0,
                 'active_campaigns': 0
             },
-            'campaign_performance': [],
-            'clicks_by_page': []
+            'campaigns': [],
+            'clicks_by_page': [],
+            'ctr_by_day': []
         }
 
 
@@ -146,36 +191,55 @@ def get_bot_visits_by_type(visits):
     return bot_types
 
 
-def get_visits_by_hour(visits):
-    """Get visits grouped by hour for the last 24 hours."""
-    now = datetime.now()
-    twenty_four_hours_ago = now - timedelta(hours=24)
+def get_bucket_seconds(start, end):
+    """Pick a bucket width for a time range: 5 minutes for short ranges, hourly otherwise."""
+    if (end - start) <= timedelta(hours=2):
+        return 5 * 60
+    return 60 * 60
+
+
+def format_bucket_label(bucket_time, bucket_seconds, span):
+    """Format a bucket start time as a chart axis label."""
+    if bucket_seconds < 3600:
+        return bucket_time.strftime("%H:%M")
+    if span <= timedelta(hours=24):
+        return bucket_time.strftime("%H:00")
+    return bucket_time.strftime("%m-%d %H:00")
+
+
+def get_visits_by_hour(visits, times, start=None, end=None):
+    """
+    Get visits grouped into time buckets between start and end.
+
+    Defaults to hourly buckets for the last 24 hours. Visits are expected to
+    be pre-filtered to the range by the time index; ``times`` is the index's
+    parallel list of epoch seconds, so timestamps are not parsed again here.
+    """
+    end = end or datetime.now()
+    start = start or end - timedelta(hours=24)
+    span = end - start
+
+    bucket_seconds = get_bucket_seconds(start, end)
+    num_buckets = max(1, math.ceil(span.total_seconds() / bucket_seconds))
+    last_bucket = math.floor(end.timestamp() / bucket_seconds) * bucket_seconds
+    first_bucket = last_bucket - (num_buckets - 1) * bucket_seconds
+
+    buckets = [
+        {"desktop": 0, "mobile": 0, "tablet": 0, "bot": 0}
+        for _ in range(num_buckets)
+    ]
+
+    for visit_epoch, visit in zip(times, visits):
+        position = int((visit_epoch - first_bucket) // bucket_seconds)
+        if 0 <= position < num_buckets:
+            device = visit.get("device_type")
+            if device in buckets[position]:
+                buckets[position][device] += 1
 
-    # Filter visits from last 24 hours
-    recent_visits = []
-    for visit in visits:
-        try:
-            visit_time = datetime.fromisoformat(visit["timestamp"])
-            if visit_time >= twenty_four_hours_ago:
-                recent_visits.append(visit)
-        except:
-            continue
-
-    # Group by hour
     hourly_counts = {}
-    for i in range(24):
-        hour = (now - timedelta(hours=23-i)).strftime("%H:00")
-        hourly_counts[hour] = {"desktop": 0, "mobile": 0, "tablet": 0, "bot": 0}
-
-    for visit in recent_visits:
-        try:
-            visit_time = datetime.fromisoformat(visit["timestamp"])
-            hour_key = visit_time.strftime("%H:00")
-            device_type = visit["device_type"]
-            if hour_key in hourly_counts:
-                hourly_counts[hour_key][device_type] += 1
-        except:
-            continue
+    for i, counts in enumerate(buckets):
+        bucket_time = datetime.fromtimestamp(first_bucket + i * bucket_seconds)
+        hourly_counts[format_bucket_label(bucket_time, bucket_seconds, span)] = counts
 
     return hourly_counts
 
@@ -210,7 +274,94 @@ def get_top_pages(visits, limit=10):
     return page_device_breakdown
 
 
+# Chart series for the per-device breakdowns
+DEVICE_SERIES = [
+    {"name": "Desktop", "color": "violet.6"},
+    {"name": "Mobile", "color": "blue.6"},
+    {"name": "Tablet", "color": "green.6"},
+    {"name": "Bots", "color": "yellow.6"},
+]
+
+BOT_TYPE_COLORS = {
+    'training': 'red.6',
+    'search': 'blue.6',
+    'traditional': 'green.6',
+    'unknown': 'gray.6'
+}
+
+
+def get_location_data(start=None, end=None, precision=2):
+    """
+    Get clustered visitor locations for the bubble map.
+
+    Cells come from the geohash index at the requested precision, with unique
+    sessions estimated per cell, so marker count and payload stay bounded no
+    matter how many distinct coordinates have been seen.
+    """
+    visit_index.refresh()
+    return geo_index.query(precision, start, end, visits_in_range=visit_index.query)
+
+
+def build_analytics_summary(start=None, end=None, zoom_scale=None, chart_width=None):
+    """
+    Build the compact aggregate store rendered clientside by assets/analytics_clientside.js.
+
+    Everything the page draws is aggregated here in one pass per refresh, so the
+    browser receives only chart-ready rows instead of the raw visit list. Long
+    ranges are downsampled (LTTB) to the number of points the chart can show.
+    """
+    data = load_analytics(start, end)
+    visits = data['visits']
+    times = data['times']
+
+    # "All time" charts start at the oldest visit in the range
+    chart_start = start
+    if chart_start is None and times:
+        chart_start = datetime.fromtimestamp(times[0])
+
+    bot_types = [
+        {"type": key.capitalize(), "visits": value, "color": BOT_TYPE_COLORS.get(key, 'gray.6')}
+        for key, value in get_bot_visits_by_type(visits).items()
+    ]
+
+    hourly = [
+        {
+            "hour": hour,
+            "Desktop": counts["desktop"],
+            "Mobile": counts["mobile"],
+            "Tablet": counts["tablet"],
+            "Bots": counts["bot"]
+        }
+        for hour, counts in get_visits_by_hour(visits, times, chart_start, end).items()
+    ]
+    hourly = downsample_rows(hourly, [s["name"] for s in DEVICE_SERIES], target_points(chart_width))
+
+    top_pages = [
+        {
+            "page": page,
+            "Desktop": devices["desktop"],
+            "Mobile": devices["mobile"],
+            "Tablet": devices["tablet"],
+            "Bots": devices["bot"]
+        }
+        for page, devices in get_top_pages(visits).items()
+    ]
+
+    return {
+        "stats": data['stats'],
+        "bot_types": bot_types,
+        "hourly": hourly,
+        "top_pages": top_pages,
+        "locations": get_location_data(start, end, precision_for_zoom(zoom_scale)),
+        "ads": load_ad_analytics(start, end),
+        "range": data['range'],
+    }
+
+
 def layout():
+    start, end = resolve_time_range(DEFAULT_RANGE)
+    summary = build_analytics_summary(start, end)
+
     return dmc.Container([
         # Interval for auto-refresh every 5 seconds
         dcc.Interval(
@@ -219,11 +370,17 @@ def layout():
             n_intervals=0
         ),
 
-        # Store for analytics data (load initial data)
-        dcc.Store(id='analytics-data-store', data=load_analytics()),
+        # Compact aggregate store, rendered clientside (load initial data)
+        dcc.Store(id='analytics-data-store', data=summary),
 
-        # Store for advertising analytics data (load initial data)
-        dcc.Store(id='ad-analytics-data-store', data=load_ad_analytics()),
+        # Measured width of the time series chart, used to size its point budget
+        dcc.Store(id='analytics-chart-width'),
+
+        # Version of the snapshot held by analytics-data-store
+        dcc.Store(id='analytics-data-version', data=summary_snapshots.remember(summary)),
+
+        # Query window the bot visits grid pages through (pinned until bots are added or the range changes)
+        dcc.Store(id='bot-grid-window', data=bot_grid_window(start, end)),
 
         # Header Section
         dmc.Group([
@@ -260,7 +417,27 @@ def layout():
                 variant="light",
                 radius="md",
             ),
-        ], gap="xl", mb="xl"),
+        ], gap="xl", mb="md"),
+
+        # Time range picker (applies to every chart on the page)
+        dmc.Group([
+            dmc.Text("Time range", size="sm", fw=500, c="dimmed"),
+            dmc.SegmentedControl(
+                id='analytics-range',
+                data=RANGE_OPTIONS,
+                value=DEFAULT_RANGE,
+                radius="md",
+            ),
+            dmc.DatePickerInput(
+                id='analytics-custom-range',
+                type="range",
+                placeholder="Pick dates",
+                maxDate=datetime.now().date().isoformat(),
+                clearable=True,
+                w=260,
+                style={"display": "none"},
+            ),
+        ], gap="md", mb="xl"),
 
         # Stats Cards Section
         # dmc.SimpleGrid(
@@ -315,7 +492,20 @@ def layout():
                                 dmc.Title("Device Distribution", order=3),
                                 dmc.Text("Breakdown by device type", size="sm", c="dimmed"),
                             ], gap=4),
-                            html.Div(id="device-chart-container"),
+                            create_chart_slot(
+                                dmc.PieChart(
+                                    id='device-chart',
+                                    data=[],
+                                    size=200,
+                                    withLabelsLine=True,
+                                    labelsPosition="outside",
+                                    labelsType="percent",
+                                    withLabels=True,
+                                    tooltipDataSource="segment",
+                                    h=350,
+                                ),
+                                container_id="device-chart-container",
+                            ),
                         ], gap="md"),
                     ], p="lg", radius="md", withBorder=True, shadow="sm"),
                     dmc.Paper([
@@ -324,7 +514,19 @@ def layout():
                                 dmc.Title("Bot Types", order=3),
                                 dmc.Text("AI Training, Search, and Traditional bots", size="sm", c="dimmed"),
                             ], gap=4),
-                            html.Div(id="bot-types-chart-container"),
+                            create_chart_slot(
+                                dmc.BarChart(
+                                    id='bot-types-chart',
+                                    data=[],
+                                    dataKey="type",
+                                    series=[{"name": "visits", "color": "blue.6"}],
+                                    h=350,
+                                    withLegend=False,
+                                    yAxisLabel="Visits",
+                                    xAxisLabel="Bot Type",
+                                ),
+                                container_id="bot-types-chart-container",
+                            ),
                         ], gap="md"),
                     ], p="lg", radius="md", withBorder=True, shadow="sm"),
                 ]
@@ -335,9 +537,24 @@ def layout():
                 dmc.Stack([
                     dmc.Stack([
                         dmc.Title("Visits by Hour", order=3),
-                        dmc.Text("Activity over the last 24 hours", size="sm", c="dimmed"),
+                        dmc.Text("Activity over the selected time range", size="sm", c="dimmed"),
                     ], gap=4),
-                    html.Div(id="hourly-chart-container"),
+                    create_chart_slot(
+                        dmc.AreaChart(
+                            id='hourly-chart',
+                            data=[],
+                            dataKey="hour",
+                            series=DEVICE_SERIES,
+                            h=350,
+                            curveType="natural",
+                            withLegend=True,
+                            legendProps={"verticalAlign": "top", "height": 50},
+                            yAxisLabel="Visits",
+                            xAxisLabel="Hour",
+                            type="stacked",
+                        ),
+                        container_id="hourly-chart-container",
+                    ),
                 ], gap="md"),
             ], p="lg", radius="md", withBorder=True, shadow="sm"),
 
@@ -348,14 +565,30 @@ def layout():
                         dmc.Title("Most Visited Pages", order=3),
                         dmc.Text("Top 10 pages by visit count", size="sm", c="dimmed"),
                     ], gap=4),
-                    html.Div(id="top-pages-chart-container"),
+                    create_chart_slot(
+                        dmc.BarChart(
+                            id='top-pages-chart',
+                            data=[],
+                            dataKey="page",
+                            series=DEVICE_SERIES,
+                            h=400,
+                            orientation="horizontal",
+                            withLegend=True,
+                            withBarValueLabel=True,
+                            legendProps={"verticalAlign": "top", "height": 50},
+                            yAxisLabel="Page",
+                            xAxisLabel="Visits by Device Type",
+                            barProps={"isAnimationActive": True},
+                        ),
+                        container_id="top-pages-chart-container",
+                    ),
                 ], gap="md"),
             ], p="lg", radius="md", withBorder=True, shadow="sm"),
 
             # Bot visits table
             dmc.Paper([
                 dmc.Title("Recent Bot Visits", order=3, mb="md"),
-                html.Div(id="bot-visits-table-container"),
+                html.Div(create_bot_visits_table(), id="bot-visits-table-container"),
             ], p="lg", radius="md", withBorder=True),
 
             # Visitor Location Map
@@ -365,7 +598,29 @@ def layout():
                         dmc.Title("Visitor Locations", order=3),
                         dmc.Text("Geographic distribution of visitors", size="sm", c="dimmed"),
                     ], gap=4),
-                    html.Div(id="location-map-container"),
+                    dcc.Store(id='location-map-zoom', data=1),
+                    html.Div(
+                        dcc.Graph(
+                            id='location-map',
+                            config={'displayModeBar': False, 'scrollZoom': True},
+                        ),
+                        id="location-map-container",
+                        style={"display": "none"},
+                    ),
+                    dmc.Center(
+                        dmc.Stack([
+                            dmc.Text("🌍", size="60px", ta="center"),
+                            dmc.Text("No location data yet", size="lg", fw=500, ta="center"),
+                            dmc.Text(
+                                "Visitor locations will appear here as they visit your site",
+                                c="dimmed",
+                                size="sm",
+                                ta="center"
+                            )
+                        ], align="center", gap="xs"),
+                        id="location-map-empty",
+                        h=400
+                    ),
                 ], gap="md"),
             ], p="lg", radius="md", withBorder=True, shadow="sm"),
         ], gap="lg"),
@@ -422,7 +677,36 @@ def layout():
         dmc.Paper([
             dmc.Stack([
                 dmc.Title("Campaign Performance", order=3),
-                html.Div(id="ad-campaigns-table-container"),
+                create_chart_slot(
+                    create_ad_campaigns_table(),
+                    container_id="ad-campaigns-table-container",
+                    height=None,
+                ),
+            ], gap="md"),
+        ], p="lg", radius="md", withBorder=True, shadow="sm", mb="lg"),
+
+        # CTR over time
+        dmc.Paper([
+            dmc.Stack([
+                dmc.Stack([
+                    dmc.Title("CTR Over Time", order=3),
+                    dmc.Text("Daily click-through rate across all campaigns", size="sm", c="dimmed"),
+                ], gap=4),
+                create_chart_slot(
+                    dmc.LineChart(
+                        id='ad-ctr-chart',
+                        data=[],
+                        dataKey="date",
+                        series=[{"name": "ctr", "label": "CTR %", "color": "violet.6"}],
+                        h=300,
+                        curveType="linear",
+                        withLegend=False,
+                        yAxisLabel="CTR %",
+                        xAxisLabel="Date",
+                    ),
+                    container_id="ad-ctr-container",
+                    height=300,
+                ),
             ], gap="md"),
         ], p="lg", radius="md", withBorder=True, shadow="sm", mb="lg"),
 
@@ -433,7 +717,23 @@ def layout():
                     dmc.Title("Ad Clicks by Page", order=3),
                     dmc.Text("Which pages generate the most ad clicks", size="sm", c="dimmed"),
                 ], gap=4),
-                html.Div(id="ad-clicks-by-page-container"),
+                create_chart_slot(
+                    dmc.BarChart(
+                        id='ad-clicks-by-page-chart',
+                        data=[],
+                        dataKey="page",
+                        series=[{"name": "clicks", "color": "green.6"}],
+                        h=300,
+                        orientation="horizontal",
+                        withLegend=False,
+                        withBarValueLabel=True,
+                        yAxisLabel="Page",
+                        xAxisLabel="Ad Clicks",
+                        barProps={"isAnimationActive": True},
+                    ),
+                    container_id="ad-clicks-by-page-container",
+                    height=300,
+                ),
             ], gap="md"),
         ], p="lg", radius="md", withBorder=True, shadow="sm"),
 
@@ -458,35 +758,214 @@ def create_stat_card(label, icon, color="violet", card_id=None):
     ], p="lg", radius="md", withBorder=True, shadow="sm", id=card_id)
 
 
-def create_bot_visits_table(bot_visits):
-    """Create a table showing recent bot visits using AG Grid."""
-    if not bot_visits:
-        return dmc.Text("No bot visits yet. Bots will be tracked automatically.", c="dimmed", fs="italic")
+def create_chart_slot(chart, container_id, height=350):
+    """
+    Wrap a chart in a container plus an empty-state placeholder.
+
+    The chart is rendered once in the layout; the clientside callbacks only
+    swap its data and toggle which of the two is visible.
+    """
+    empty_id = f"{chart.id}-empty"
+    return html.Div([
+        html.Div(chart, id=container_id, style={"display": "none"}),
+        dmc.Center(
+            dmc.Text("Loading...", id=f"{empty_id}-text", c="dimmed", fs="italic"),
+            id=empty_id,
+            h=height,
+        ),
+    ])
 
-    # Prepare data for AG Grid
-    row_data = []
-    for visit in bot_visits:
-        timestamp = visit.get('timestamp', 'Unknown')
-        try:
-            dt = datetime.fromisoformat(timestamp)
-            time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-        except:
-            time_str = timestamp
 
-        bot_type = visit.get('bot_type', 'unknown')
+def create_ad_campaigns_table():
+    """Create the campaign performance AG Grid (rows are filled clientside)."""
+    column_defs = [
+        {
+            'field': 'campaign',
+            'headerName': 'Campaign',
+            'width': 200,
+            'sortable': True,
+            'filter': True,
+        },
+        {
+            'field': 'impressions',
+            'headerName': 'Impressions',
+            'width': 130,
+            'sortable': True,
+            'filter': 'agNumberColumnFilter',
+            'type': 'numericColumn',
+        },
+        {
+            'field': 'clicks',
+            'headerName': 'Clicks',
+            'width': 100,
+            'sortable': True,
+            'filter': 'agNumberColumnFilter',
+            'type': 'numericColumn',
+        },
+        {
+            'field': 'ctr',
+            'headerName': 'CTR',
+            'width': 100,
+            'sortable': True,
+        },
+        {
+            'field': 'status',
+            'headerName': 'Status',
+            'width': 100,
+            'sortable': True,
+            'filter': True,
+        },
+        {
+            'field': 'url',
+            'headerName': 'URL',
+            'flex': 1,
+            'sortable': True,
+            'filter': True,
+        }
+    ]
+
+    return dag.AgGrid(
+        id='ad-campaigns-grid',
+        rowData=[],
+        columnDefs=column_defs,
+        defaultColDef={
+            'resizable': True,
+            'sortable': True,
+            'filter': True,
+        },
+        dashGridOptions={
+            'pagination': True,
+            'paginationPageSize': 10,
+            'domLayout': 'autoHeight',
+            'animateRows': True,
+        },
+        style={'height': 'auto'},
+        className='ag-theme-alpine'
+    )
 
-        # Capitalize bot type for display
-        bot_type_display = bot_type.capitalize()
 
-        user_agent = visit.get('user_agent', 'Unknown')
+# Rows fetched per infinite-scroll request for the bot visits grid
+BOT_GRID_BLOCK_SIZE = 100
 
-        row_data.append({
-            'timestamp': time_str,
-            'bot_type': bot_type_display,
-            'bot_type_raw': bot_type,  # Keep raw for styling
-            'page': visit.get('path', '/'),
-            'user_agent': user_agent
-        })
+# AG Grid text filter types mapped to predicates (value, filter text)
+TEXT_FILTER_MATCHERS = {
+    'contains': lambda value, text: text in value,
+    'notContains': lambda value, text: text not in value,
+    'equals': lambda value, text: value == text,
+    'notEqual': lambda value, text: value != text,
+    'startsWith': lambda value, text: value.startswith(text),
+    'endsWith': lambda value, text: value.endswith(text),
+    'blank': lambda value, text: not value,
+    'notBlank': lambda value, text: bool(value),
+}
+
+
+def format_bot_visit_row(visit):
+    """Convert a bot visit record to an AG Grid row."""
+    timestamp = visit.get('timestamp', 'Unknown')
+    try:
+        dt = datetime.fromisoformat(timestamp)
+        time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
+    except:
+        time_str = timestamp
+
+    bot_type = visit.get('bot_type', 'unknown')
+
+    return {
+        'timestamp': time_str,
+        'bot_type': bot_type.capitalize(),  # Capitalize bot type for display
+        'bot_type_raw': bot_type,  # Keep raw for styling
+        'page': visit.get('path', '/'),
+        'user_agent': visit.get('user_agent', 'Unknown')
+    }
+
+
+def _matches_text_filter(value, condition):
+    """Check a single AG Grid text filter condition (case-insensitive)."""
+    matcher = TEXT_FILTER_MATCHERS.get(condition.get('type', 'contains'))
+    if matcher is None:
+        return True
+    return matcher(str(value or '').lower(), str(condition.get('filter') or '').lower())
+
+
+def _matches_filter_model(row, filter_model):
+    """Check a row against an AG Grid filterModel (text filters only)."""
+    for field, column_filter in filter_model.items():
+        value = row.get(field)
+        if 'conditions' in column_filter:
+            results = [_matches_text_filter(value, c) for c in column_filter['conditions']]
+            matched = any(results) if column_filter.get('operator') == 'OR' else all(results)
+        else:
+            matched = _matches_text_filter(value, column_filter)
+        if not matched:
+            return False
+    return True
+
+
+def bot_grid_window(start, end):
+    """
+    Pin the bot visits grid to a fixed query window.
+
+    Every block of the infinite row model is served from the same window, so
+    row offsets stay stable while "now" moves on.
+
+    Returns:
+        Dictionary with start/end ISO timestamps (start None for "all time")
+        and the bot index version the window was taken at
+    """
+    return {
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat(),
+        'version': visit_index.bot_version(),
+    }
+
+
+def get_bot_visit_rows(start, end, start_row, end_row, sort_model=None, filter_model=None):
+    """
+    Serve one block of bot visit rows from the time index.
+
+    The default order (newest first) and timestamp sorts page straight off the
+    sorted index, so only the requested block is formatted. Filters and sorts
+    on other columns fall back to formatting the rows in range.
+
+    Returns:
+        Tuple of (rows, total_row_count)
+    """
+    visit_index.refresh()
+    bot_visits = visit_index.query_bots(start, end)
+    sort_model = sort_model or []
+
+    timestamp_sort_only = all(s.get('colId') == 'timestamp' for s in sort_model)
+    if not filter_model and timestamp_sort_only:
+        total = len(bot_visits)
+        ascending = bool(sort_model) and sort_model[0].get('sort') == 'asc'
+        if ascending:
+            block = bot_visits[start_row:end_row]
+        else:
+            block = bot_visits[max(0, total - end_row):max(0, total - start_row)][::-1]
+        return [format_bot_visit_row(v) for v in block], total
+
+    rows = [format_bot_visit_row(v) for v in reversed(bot_visits)]
+    if filter_model:
+        rows = [row for row in rows if _matches_filter_model(row, filter_model)]
+
+    # Apply sorts from lowest to highest priority (sort is stable)
+    for sort in reversed(sort_model):
+        field = 'bot_type_raw' if sort['colId'] == 'bot_type' else sort['colId']
+        rows.sort(key=lambda row: str(row.get(field, '')).lower(), reverse=sort.get('sort') == 'desc')
+
+    return rows[start_row:end_row], len(rows)
+
+
+def create_bot_visits_table():
+    """Create the bot visits AG Grid, paged from the server with the infinite row model."""
+    text_filter = {
+        'filter': 'agTextColumnFilter',
+        'filterParams': {
+            'filterOptions': list(TEXT_FILTER_MATCHERS.keys()),
+            'maxNumConditions': 2,
+        },
+    }
 
     # Define column definitions with styling
     column_defs = [
@@ -495,637 +974,297 @@ def create_bot_visits_table(bot_visits):
             'headerName': 'Timestamp',
             'width': 200,
             'sortable': True,
-            'filter': True,
-            'cellClass': 'timestamp-cell'
+            'cellClass': 'timestamp-cell',
+            **text_filter,
         },
         {
             'field': 'bot_type',
             'headerName': 'Bot Type',
             'width': 130,
             'sortable': True,
-            'filter': True,
             'cellClass': 'bot-type-cell',
             'cellClassRules': {
-                'bot-training': 'data.bot_type_raw === "training"',
-                'bot-search': 'data.bot_type_raw === "search"',
-                'bot-traditional': 'data.bot_type_raw === "traditional"',
-                'bot-unknown': 'data.bot_type_raw === "unknown"'
-            }
+                'bot-training': 'data && data.bot_type_raw === "training"',
+                'bot-search': 'data && data.bot_type_raw === "search"',
+                'bot-traditional': 'data && data.bot_type_raw === "traditional"',
+                'bot-unknown': 'data && data.bot_type_raw === "unknown"'
+            },
+            **text_filter,
         },
         {
             'field': 'page',
             'headerName': 'Page',
             'width': 250,
             'sortable': True,
-            'filter': True,
-            'cellClass': 'page-cell'
+            'cellClass': 'page-cell',
+            **text_filter,
         },
         {
             'field': 'user_agent',
             'headerName': 'User Agent',
             'flex': 1,
             'sortable': True,
-            'filter': True,
             'cellClass': 'user-agent-cell',
-            'wrapText': True,
-            'autoHeight': True
+            **text_filter,
         }
     ]
 
-    # Create AG Grid
+    # Create AG Grid; rows are requested in blocks via getRowsRequest
     return dag.AgGrid(
         id='bot-visits-grid',
-        rowData=row_data,
+        rowModelType='infinite',
         columnDefs=column_defs,
         defaultColDef={
             'resizable': True,
             'sortable': True,
-            'filter': True,
         },
         dashGridOptions={
+            'rowBuffer': 0,
+            'cacheBlockSize': BOT_GRID_BLOCK_SIZE,
+            'infiniteInitialRowCount': 1,
+            'maxBlocksInCache': 10,
             'pagination': True,
             'paginationPageSize': 20,
-            'domLayout': 'autoHeight',
             'animateRows': True,
+            'overlayNoRowsTemplate': 'No bot visits yet. Bots will be tracked automatically.',
         },
-        style={'height': 'auto'},
+        style={'height': '600px'},
         className='ag-theme-alpine'
     )
 
 
-# Callback to load analytics data periodically
+# Callback to show the date picker only for custom ranges
 @callback(
-    Output('analytics-data-store', 'data'),
-    Input('analytics-interval', 'n_intervals'),
+    Output('analytics-custom-range', 'style'),
+    Input('analytics-range', 'value'),
     hidden=True
 )
-def update_analytics_data(n):
-    """Load fresh analytics data."""
-    return load_analytics()
+def toggle_custom_range(range_key):
+    return {} if range_key == "custom" else {"display": "none"}
 
 
-# Callbacks to update stat cards
+# Callback to rebuild the aggregate store periodically, or when the range or map zoom changes.
+# This is the only server round trip per refresh; the widgets below render clientside.
 @callback(
-    Output('total-stat-value', 'children'),
-    Input('analytics-data-store', 'data'),
+    Output('analytics-data-store', 'data'),
+    Output('analytics-data-version', 'data'),
+    Output('bot-grid-window', 'data'),
+    Input('analytics-interval', 'n_intervals'),
+    Input('analytics-range', 'value'),
+    Input('analytics-custom-range', 'value'),
+    Input('location-map-zoom', 'data'),
+    Input('analytics-chart-width', 'data'),
+    State('analytics-data-version', 'data'),
+    State('bot-grid-window', 'data'),
     hidden=True
 )
-def update_total_stat(data):
-    if not data:
-        return "0"
-    return f"{data['stats']['total']:,}"
+def update_analytics_data(n, range_key, custom_dates, zoom_scale, chart_width, client_version, grid_window):
+    """
+    Build fresh aggregates for the selected range.
+
+    When the client's snapshot is still known, only the difference is sent as a
+    Patch (changed counters, updated or appended rows); otherwise the full payload.
+    The bot grid window is re-pinned only when the range changes or bot visits
+    were indexed, which purges the grid's cached blocks.
+    """
+    start, end = resolve_time_range(range_key, custom_dates)
+    summary = build_analytics_summary(start, end, zoom_scale, chart_width)
+    version = summary_snapshots.remember(summary)
+
+    window = bot_grid_window(start, end)
+    range_changed = ctx.triggered_id in ('analytics-range', 'analytics-custom-range')
+    if not range_changed and grid_window and grid_window.get('version') == window['version']:
+        window = no_update
+
+    if version == client_version:
+        return no_update, no_update, window
+
+    previous = summary_snapshots.get(client_version)
+    if previous is None:
+        return summary, version, window
 
+    return diff_patch(previous, summary, SUMMARY_LIST_KEYS), version, window
 
+
+# Callback to serve bot visit blocks to the infinite row model
 @callback(
-    Output('desktop-stat-value', 'children'),
-    Input('analytics-data-store', 'data'),
+    Output('bot-visits-grid', 'getRowsResponse'),
+    Input('bot-visits-grid', 'getRowsRequest'),
+    State('bot-grid-window', 'data'),
     hidden=True
 )
-def update_desktop_stat(data):
-    if not data:
-        return "0"
-    return f"{data['stats']['desktop']:,}"
+def serve_bot_visit_rows(request, grid_window):
+    if not request or not grid_window:
+        return no_update
+
+    rows, total = get_bot_visit_rows(
+        grid_window['start'],
+        grid_window['end'],
+        request.get('startRow', 0),
+        request.get('endRow', BOT_GRID_BLOCK_SIZE),
+        sort_model=request.get('sortModel'),
+        filter_model=request.get('filterModel'),
+    )
+    return {'rowData': rows, 'rowCount': total}
 
 
-@callback(
-    Output('mobile-stat-value', 'children'),
-    Input('analytics-data-store', 'data'),
+# Drop cached bot visit blocks when the grid's window is re-pinned so the grid re-requests rows
+clientside_callback(
+    """
+    function(gridWindow) {
+        dash_ag_grid.getApiAsync('bot-visits-grid')
+            .then(api => api.purgeInfiniteCache())
+            .catch(error => console.error('[Analytics] Error refreshing bot visits:', error));
+        return window.dash_clientside.no_update;
+    }
+    """,
+    Output('bot-visits-grid', 'getRowsResponse', allow_duplicate=True),
+    Input('bot-grid-window', 'data'),
+    prevent_initial_call=True,
     hidden=True
 )
-def update_mobile_stat(data):
-    if not data:
-        return "0"
-    return f"{data['stats']['mobile']:,}"
 
 
-@callback(
-    Output('tablet-stat-value', 'children'),
-    Input('analytics-data-store', 'data'),
+# Measure the time series chart so the server can size its point budget (only on real resizes)
+clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='measureWidth'),
+    Output('analytics-chart-width', 'data'),
+    Input('analytics-interval', 'n_intervals'),
+    State('hourly-chart-container', 'id'),
+    State('analytics-chart-width', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_tablet_stat(data):
-    if not data:
-        return "0"
-    return f"{data['stats']['tablet']:,}"
 
 
+# Callback to remember the map zoom level (projection scale)
 @callback(
-    Output('bot-stat-value', 'children'),
-    Input('analytics-data-store', 'data'),
+    Output('location-map-zoom', 'data'),
+    Input('location-map', 'relayoutData'),
     hidden=True
 )
-def update_bot_stat(data):
-    if not data:
-        return "0"
-    return f"{data['stats']['bot']:,}"
+def update_location_map_zoom(relayout_data):
+    if not relayout_data or 'geo.projection.scale' not in relayout_data:
+        return no_update
+    return relayout_data['geo.projection.scale']
 
 
-# Callback to update device chart
-@callback(
-    Output('device-chart-container', 'children'),
+# ============================================================================
+# Clientside rendering (assets/analytics_clientside.js)
+# ============================================================================
+
+# Visitor stat card
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='visitorStats'),
+    Output('total-stat-value', 'children'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_device_chart(data):
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=350)
-
-    stats = data['stats']
-    device_data = [
-        {"name": "Desktop", "value": stats['desktop'], "color": "violet.6"},
-        {"name": "Mobile", "value": stats['mobile'], "color": "blue.6"},
-        {"name": "Tablet", "value": stats['tablet'], "color": "green.6"},
-        {"name": "Bots", "value": stats['bot'], "color": "yellow.6"},
-    ]
-    # Filter out zero values
-    device_data = [d for d in device_data if d["value"] > 0]
-
-    if not device_data:
-        return dmc.Center(dmc.Text("No visit data yet", c="dimmed", fs="italic"), h=350)
-
-    return dmc.PieChart(
-        data=device_data,
-        size=200,
-        withLabelsLine=True,
-        labelsPosition="outside",
-        labelsType="percent",
-        withLabels=True,
-        tooltipDataSource="segment",
-        h=350,
-    )
-
 
-# Callback to update bot types chart
-@callback(
-    Output('bot-types-chart-container', 'children'),
+# Device distribution chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='deviceChart'),
+    Output('device-chart', 'data'),
+    Output('device-chart-container', 'style'),
+    Output('device-chart-empty', 'style'),
+    Output('device-chart-empty-text', 'children'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_bot_types_chart(data):
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=350)
-
-    bot_types = get_bot_visits_by_type(data['visits'])
-    bot_color_map = {
-        'training': 'red.6',
-        'search': 'blue.6',
-        'traditional': 'green.6',
-        'unknown': 'gray.6'
-    }
-    bot_data = [
-        {"type": key.capitalize(), "visits": value, "color": bot_color_map.get(key, 'gray.6')}
-        for key, value in bot_types.items()
-    ]
 
-    if not bot_data:
-        return dmc.Center(dmc.Text("No bot visits yet", c="dimmed", fs="italic"), h=350)
-
-    return dmc.BarChart(
-        data=bot_data,
-        dataKey="type",
-        series=[{"name": "visits", "color": "blue.6"}],
-        h=350,
-        withLegend=False,
-        yAxisLabel="Visits",
-        xAxisLabel="Bot Type",
-    )
-
-
-# Callback to update hourly chart
-@callback(
-    Output('hourly-chart-container', 'children'),
+# Bot types chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='botTypesChart'),
+    Output('bot-types-chart', 'data'),
+    Output('bot-types-chart-container', 'style'),
+    Output('bot-types-chart-empty', 'style'),
+    Output('bot-types-chart-empty-text', 'children'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_hourly_chart(data):
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=350)
 
-    hourly_counts = get_visits_by_hour(data['visits'])
-    hourly_data = [
-        {
-            "hour": hour,
-            "Desktop": counts["desktop"],
-            "Mobile": counts["mobile"],
-            "Tablet": counts["tablet"],
-            "Bots": counts["bot"]
-        }
-        for hour, counts in hourly_counts.items()
-    ]
-
-    if not hourly_data or not any(sum(h.values()) for h in hourly_counts.values()):
-        return dmc.Center(dmc.Text("No visit data available", c="dimmed", fs="italic"), h=350)
-
-    return dmc.AreaChart(
-        data=hourly_data,
-        dataKey="hour",
-        series=[
-            {"name": "Desktop", "color": "violet.6"},
-            {"name": "Mobile", "color": "blue.6"},
-            {"name": "Tablet", "color": "green.6"},
-            {"name": "Bots", "color": "yellow.6"},
-        ],
-        h=350,
-        curveType="natural",
-        withLegend=True,
-        legendProps={"verticalAlign": "top", "height": 50},
-        yAxisLabel="Visits",
-        xAxisLabel="Hour",
-        type="stacked",
-    )
-
-
-# Callback to update top pages chart
-@callback(
-    Output('top-pages-chart-container', 'children'),
+# Visits over time chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='hourlyChart'),
+    Output('hourly-chart', 'data'),
+    Output('hourly-chart-container', 'style'),
+    Output('hourly-chart-empty', 'style'),
+    Output('hourly-chart-empty-text', 'children'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_top_pages_chart(data):
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=350)
 
-    page_device_breakdown = get_top_pages(data['visits'])
-
-    # Transform data for stacked bar chart
-    top_pages_data = []
-    for page, devices in page_device_breakdown.items():
-        top_pages_data.append({
-            "page": page,
-            "Desktop": devices["desktop"],
-            "Mobile": devices["mobile"],
-            "Tablet": devices["tablet"],
-            "Bots": devices["bot"]
-        })
-
-    if not top_pages_data:
-        return dmc.Center(dmc.Text("No page visits yet", c="dimmed", fs="italic"), h=350)
-
-    return dmc.BarChart(
-        data=top_pages_data,
-        dataKey="page",
-        series=[
-            {"name": "Desktop", "color": "violet.6"},
-            {"name": "Mobile", "color": "blue.6"},
-            {"name": "Tablet", "color": "green.6"},
-            {"name": "Bots", "color": "yellow.6"},
-        ],
-        h=400,
-        orientation="horizontal",
-        withLegend=True,
-        withBarValueLabel=True,
-        legendProps={"verticalAlign": "top", "height": 50},
-        yAxisLabel="Page",
-        xAxisLabel="Visits by Device Type",
-        # type="stacked",
-        barProps={"isAnimationActive": True},
-    )
-
-
-# Callback to update bot visits table
-@callback(
-    Output('bot-visits-table-container', 'children'),
+# Top pages chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='topPagesChart'),
+    Output('top-pages-chart', 'data'),
+    Output('top-pages-chart-container', 'style'),
+    Output('top-pages-chart-empty', 'style'),
+    Output('top-pages-chart-empty-text', 'children'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_bot_visits_table(data):
-    if not data:
-        return dmc.Text("Loading...", c="dimmed", fs="italic")
 
-    visits = data['visits']
-    recent_bot_visits = [v for v in visits if v["device_type"] == "bot"][-20:]
-    recent_bot_visits.reverse()
-
-    return create_bot_visits_table(recent_bot_visits)
-
-
-def get_location_data(visits):
-    """Aggregate visitor location data for bubble map, counting unique sessions only."""
-    location_counts = {}
-    seen_sessions = {}  # Track which sessions we've already counted per location
-
-    for visit in visits:
-        # Check if visit has location data (only first visit per session has this)
-        if 'location' not in visit:
-            continue
-
-        location = visit['location']
-        lat = location.get('latitude')
-        lon = location.get('longitude')
-        city = location.get('city', 'Unknown')
-        country = location.get('country', 'Unknown')
-        session_id = visit.get('session_id')
-
-        if lat is None or lon is None:
-            continue
-
-        # Create a unique key for each location
-        location_key = f"{lat},{lon}"
-
-        # Initialize location entry if not exists
-        if location_key not in location_counts:
-            location_counts[location_key] = {
-                'latitude': lat,
-                'longitude': lon,
-                'city': city,
-                'country': country,
-                'count': 0,
-                'device_breakdown': {'desktop': 0, 'mobile': 0, 'tablet': 0, 'bot': 0},
-                'sessions': set()  # Track unique sessions for this location
-            }
-
-        # Only count each session once per location
-        if session_id and session_id not in location_counts[location_key]['sessions']:
-            location_counts[location_key]['sessions'].add(session_id)
-            location_counts[location_key]['count'] += 1
-            device_type = visit.get('device_type', 'desktop')
-            location_counts[location_key]['device_breakdown'][device_type] += 1
-
-    # Remove sessions set before returning (not JSON serializable)
-    result = []
-    for loc in location_counts.values():
-        loc_copy = loc.copy()
-        loc_copy.pop('sessions', None)
-        result.append(loc_copy)
-
-    return result
-
-
-# Callback to update location map
-@callback(
-    Output('location-map-container', 'children'),
+# Visitor location map
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='locationMap'),
+    Output('location-map', 'figure'),
+    Output('location-map-container', 'style'),
+    Output('location-map-empty', 'style'),
     Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_location_map(data):
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=400)
-
-    location_data = get_location_data(data['visits'])
-
-    if not location_data:
-        return dmc.Center(
-            dmc.Stack([
-                dmc.Text("🌍", size="60px", ta="center"),
-                dmc.Text("No location data yet", size="lg", fw=500, ta="center"),
-                dmc.Text(
-                    "Visitor locations will appear here as they visit your site",
-                    c="dimmed",
-                    size="sm",
-                    ta="center"
-                )
-            ], align="center", gap="xs"),
-            h=400
-        )
-
-    # Prepare data for bubble map
-    lats = [loc['latitude'] for loc in location_data]
-    lons = [loc['longitude'] for loc in location_data]
-    counts = [loc['count'] for loc in location_data]
-
-    # Calculate proportional bubble sizes using square root scaling
-    # This makes the area of the bubble proportional to the count
-    import numpy as np
-    max_count = max(counts)
-    min_count = min(counts)
-
-    # Normalize counts and apply square root for better visual proportionality
-    if max_count > min_count:
-        # Scale sizes between 8 and 40 with square root scaling for proportionality
-        normalized_counts = [(c - min_count) / (max_count - min_count) for c in counts]
-        bubble_sizes = [8 + np.sqrt(nc) * 32 for nc in normalized_counts]
-    else:
-        # All counts are the same
-        bubble_sizes = [20 for _ in counts]
-
-    # Create hover text with device breakdown
-    hover_texts = []
-    for loc in location_data:
-        breakdown = loc['device_breakdown']
-        text = (
-            f"<b>{loc['city']}, {loc['country']}</b><br>"
-            f"Total Visits: {loc['count']}<br>"
-            f"🖥️ Desktop: {breakdown['desktop']}<br>"
-            f"📱 Mobile: {breakdown['mobile']}<br>"
-            f"📲 Tablet: {breakdown['tablet']}<br>"
-            f"🤖 Bots: {breakdown['bot']}"
-        )
-        hover_texts.append(text)
-
-    # Create the bubble map
-    fig = go.Figure(data=go.Scattergeo(
-        lon=lons,
-        lat=lats,
-        text=hover_texts,
-        mode='markers',
-        marker=dict(
-            size=bubble_sizes,
-            color=counts,
-            colorscale='Viridis',
-            showscale=True,
-            colorbar=dict(
-                title="Visits",
-                thickness=15,
-                len=0.7
-            ),
-            line=dict(width=1, color='rgba(255, 255, 255, 0.9)'),
-            sizemode='diameter',
-            opacity=0.85
-        ),
-        hovertemplate='%{text}<extra></extra>'
-    ))
-
-    # Update layout
-    fig.update_layout(
-        geo=dict(
-            showframe=False,
-            showcoastlines=True,
-            projection_type='natural earth',
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        height=500,
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-    )
 
-    return dcc.Graph(figure=fig, config={'displayModeBar': False})
-
-
-# ============================================================================
-# Advertising Analytics Callbacks
-# ============================================================================
-
-# Callback to load advertising analytics data periodically
-@callback(
-    Output('ad-analytics-data-store', 'data'),
-    Input('analytics-interval', 'n_intervals'),
+# Advertising stat cards
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='adStats'),
+    Output('ad-impressions-stat-value', 'children'),
+    Output('ad-clicks-stat-value', 'children'),
+    Output('ad-ctr-stat-value', 'children'),
+    Output('ad-campaigns-stat-value', 'children'),
+    Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_ad_analytics_data(n):
-    """Load fresh advertising analytics data."""
-    return {
-        'total_stats': get_total_stats(),
-        'campaign_performance': get_campaign_performance(),
-        'clicks_by_page': get_clicks_by_page()
-    }
-
 
-# Callback to update advertising stats cards
-@callback(
-    [
-        Output('ad-impressions-stat-value', 'children'),
-        Output('ad-clicks-stat-value', 'children'),
-        Output('ad-ctr-stat-value', 'children'),
-        Output('ad-campaigns-stat-value', 'children'),
-    ],
-    Input('ad-analytics-data-store', 'data'),
+# Campaign performance table
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='adCampaignsTable'),
+    Output('ad-campaigns-grid', 'rowData'),
+    Output('ad-campaigns-table-container', 'style'),
+    Output('ad-campaigns-grid-empty', 'style'),
+    Output('ad-campaigns-grid-empty-text', 'children'),
+    Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_ad_stats(data):
-    """Update advertising statistics cards."""
-    if not data:
-        return "0", "0", "0%", "0"
-
-    stats = data.get('total_stats', {})
-    return (
-        f"{stats.get('total_impressions', 0):,}",
-        f"{stats.get('total_clicks', 0):,}",
-        f"{stats.get('overall_ctr', 0)}%",
-        str(stats.get('active_campaigns', 0))
-    )
 
-
-# Callback to update campaign performance table
-@callback(
-    Output('ad-campaigns-table-container', 'children'),
-    Input('ad-analytics-data-store', 'data'),
+# Ad clicks by page chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='adClicksByPage'),
+    Output('ad-clicks-by-page-chart', 'data'),
+    Output('ad-clicks-by-page-container', 'style'),
+    Output('ad-clicks-by-page-chart-empty', 'style'),
+    Output('ad-clicks-by-page-chart-empty-text', 'children'),
+    Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_ad_campaigns_table(data):
-    """Update advertising campaigns performance table."""
-    if not data:
-        return dmc.Text("Loading...", c="dimmed", fs="italic")
-
-    campaigns = data.get('campaign_performance', [])
-
-    if not campaigns:
-        return dmc.Text("No advertising campaigns configured yet.", c="dimmed", fs="italic")
-
-    # Prepare data for AG Grid
-    row_data = []
-    for campaign in campaigns:
-        row_data.append({
-            'campaign': campaign['name'],
-            'impressions': campaign['impressions'],
-            'clicks': campaign['clicks'],
-            'ctr': f"{campaign['ctr']}%",
-            'status': 'Active' if campaign['active'] else 'Inactive',
-            'url': campaign['url']
-        })
-
-    # Define column definitions
-    column_defs = [
-        {
-            'field': 'campaign',
-            'headerName': 'Campaign',
-            'width': 200,
-            'sortable': True,
-            'filter': True,
-        },
-        {
-            'field': 'impressions',
-            'headerName': 'Impressions',
-            'width': 130,
-            'sortable': True,
-            'filter': 'agNumberColumnFilter',
-            'type': 'numericColumn',
-        },
-        {
-            'field': 'clicks',
-            'headerName': 'Clicks',
-            'width': 100,
-            'sortable': True,
-            'filter': 'agNumberColumnFilter',
-            'type': 'numericColumn',
-        },
-        {
-            'field': 'ctr',
-            'headerName': 'CTR',
-            'width': 100,
-            'sortable': True,
-        },
-        {
-            'field': 'status',
-            'headerName': 'Status',
-            'width': 100,
-            'sortable': True,
-            'filter': True,
-        },
-        {
-            'field': 'url',
-            'headerName': 'URL',
-            'flex': 1,
-            'sortable': True,
-            'filter': True,
-        }
-    ]
 
-    return dag.AgGrid(
-        id='ad-campaigns-grid',
-        rowData=row_data,
-        columnDefs=column_defs,
-        defaultColDef={
-            'resizable': True,
-            'sortable': True,
-            'filter': True,
-        },
-        dashGridOptions={
-            'pagination': True,
-            'paginationPageSize': 10,
-            'domLayout': 'autoHeight',
-            'animateRows': True,
-        },
-        style={'height': 'auto'},
-        className='ag-theme-alpine'
-    )
-
-
-# Callback to update clicks by page chart
-@callback(
-    Output('ad-clicks-by-page-container', 'children'),
-    Input('ad-analytics-data-store', 'data'),
+# CTR over time chart
+clientside_callback(
+    ClientsideFunction(namespace='analytics', function_name='adCtrChart'),
+    Output('ad-ctr-chart', 'data'),
+    Output('ad-ctr-container', 'style'),
+    Output('ad-ctr-chart-empty', 'style'),
+    Output('ad-ctr-chart-empty-text', 'children'),
+    Input('analytics-data-store', 'data'),
+    prevent_initial_call=False,
     hidden=True
 )
-def update_ad_clicks_by_page(data):
-    """Update advertising clicks by page chart."""
-    if not data:
-        return dmc.Center(dmc.Text("Loading...", c="dimmed", fs="italic"), h=300)
-
-    clicks_data = data.get('clicks_by_page', [])
-
-    if not clicks_data:
-        return dmc.Center(
-            dmc.Text("No ad clicks yet. Clicks will be tracked as users interact with advertisements.",
-                    c="dimmed", fs="italic"),
-            h=300
-        )
-
-    # Prepare data for bar chart
-    chart_data = [
-        {"page": item['page'], "clicks": item['clicks']}
-        for item in clicks_data[:10]  # Top 10 pages
-    ]
-
-    return dmc.BarChart(
-        data=chart_data,
-        dataKey="page",
-        series=[{"name": "clicks", "color": "green.6"}],
-        h=300,
-        orientation="horizontal",
-        withLegend=False,
-        withBarValueLabel=True,
-        yAxisLabel="Page",
-        xAxisLabel="Ad Clicks",
-        barProps={"isAnimationActive": True},
-    )
@@ -9,15 +9,18 @@ Displays comprehensive analytics for API cost breakdown including:
 """
 
 import dash
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, callback, clientside_callback, ClientsideFunction, Input, Output, State
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
 import dash_ag_grid as dag
 import pandas as pd
-import json
-from pathlib import Path
+import threading
 from datetime import datetime
 
+from lib.downsample import downsample_rows, target_points
+from lib.page_chat.api_cost_logger import get_logger
+from lib.page_chat.transcript_store import question_preview, transcript_store
+
 # Register this page
 dash.register_page(
     __name__,
@@ -29,84 +32,165 @@ dash.register_page(
 )
 
 
-def load_api_data():
-    """Load API cost breakdown data from JSON file."""
-    api_file = Path('api-cost-breakdown.json')
-    if not api_file.exists():
-        return None
-
-    try:
-        with open(api_file, 'r') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"Error loading API data: {e}")
-        return None
-
-
-def calculate_summary_stats(data):
-    """Calculate summary statistics from API data."""
-    if not data or 'sessions' not in data:
-        return {}
-
-    sessions = data['sessions']
-    total_cost = sum(session.get('total_cost', 0) for session in sessions.values())
-    total_tokens = sum(session.get('total_tokens', 0) for session in sessions.values())
-    total_sessions = len(sessions)
-
-    # Count total API calls
-    total_calls = sum(len(session.get('calls', [])) for session in sessions.values())
-
-    # Extract unique questions (deduplicate by question text)
-    unique_questions = set()
-    for session in sessions.values():
-        for call in session.get('calls', []):
-            metadata = call.get('metadata', {})
-            if 'question' in metadata:
-                unique_questions.add(metadata['question'])
-
-    num_unique_questions = len(unique_questions)
-
-    return {
-        'total_cost': total_cost,
-        'total_tokens': total_tokens,
-        'total_sessions': total_sessions,
-        'total_calls': total_calls,
-        'unique_questions': num_unique_questions,
-        'avg_cost_per_question': total_cost / num_unique_questions if num_unique_questions > 0 else 0,
-        'avg_cost_per_session': total_cost / total_sessions if total_sessions > 0 else 0,
-        'avg_tokens_per_call': total_tokens / total_calls if total_calls > 0 else 0
+def calculate_summary_stats():
+    """Summary statistics from the cost logger's running rollups."""
+    rollups, total_sessions = get_logger().get_rollups()
+    return rollups, rollups.summary(total_sessions)
+
+
+# Call columns kept by the analytics cache, with their dtypes
+CATEGORICAL_COLUMNS = ('model', 'call_type', 'page_path')
+NUMERIC_COLUMNS = {
+    'total_cost': 'float64',
+    'input_tokens': 'int64',
+    'output_tokens': 'int64',
+    'total_tokens': 'int64',
+}
+
+
+def create_calls_dataframe(records):
+    """
+    Create a typed DataFrame from cost ledger call records.
+
+    Questions and responses are carried as transcript hashes (plus the short
+    question preview kept in the record); full texts are only loaded for the
+    detail modal.
+    """
+    columns = {
+        'session_id': pd.Series([r.get('session_id') for r in records], dtype='object'),
+        'timestamp': pd.to_datetime(pd.Series([r.get('timestamp') for r in records], dtype='object'), format='ISO8601'),
+        'question_hash': pd.Series([(r.get('metadata') or {}).get('question_hash') for r in records], dtype='object'),
+        'response_hash': pd.Series([(r.get('metadata') or {}).get('response_hash') for r in records], dtype='object'),
+        'question_preview': pd.Series([(r.get('metadata') or {}).get('question_preview') for r in records], dtype='object'),
     }
-
-
-def create_sessions_dataframe(data):
-    """Create a DataFrame from sessions data for visualization."""
-    if not data or 'sessions' not in data:
-        return pd.DataFrame()
-
-    sessions_list = []
-    for session_id, session in data['sessions'].items():
-        for call in session.get('calls', []):
-            sessions_list.append({
-                'session_id': session_id,
-                'timestamp': call.get('timestamp'),
-                'model': call.get('model'),
-                'call_type': call.get('call_type'),
-                'page_path': call.get('page_path'),
-                'total_cost': call.get('total_cost', 0),
-                'input_tokens': call.get('input_tokens', 0),
-                'output_tokens': call.get('output_tokens', 0),
-                'total_tokens': call.get('total_tokens', 0),
-                'question': call.get('metadata', {}).get('question', 'N/A'),
-                'response': call.get('metadata', {}).get('response', 'N/A')
-            })
-
-    df = pd.DataFrame(sessions_list)
-    if not df.empty and 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-
-    return df
+    for col in CATEGORICAL_COLUMNS:
+        columns[col] = pd.Categorical([r.get(col) for r in records])
+    for col, dtype in NUMERIC_COLUMNS.items():
+        columns[col] = pd.Series([r.get(col) or 0 for r in records], dtype=dtype)
+
+    df = pd.DataFrame(columns)
+    return df.sort_values('timestamp', kind='stable', ignore_index=True)
+
+
+class CallFrameCache:
+    """
+    Typed DataFrame of every logged API call, shared by all viewers.
+
+    Each refresh reads only the calls logged since the last one (by ledger
+    cursor) and appends them; a replaced ledger resets the frame. Derived
+    data (chart points, grouped questions) is memoized per frame version, so
+    a refresh with no new calls does no pandas work at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._df = create_calls_dataframe([])
+        self._cursor = None
+        self._version = 0
+        self._memo = {}
+
+    def refresh(self):
+        """
+        Pull new calls from the cost ledger.
+
+        Returns:
+            Tuple of (DataFrame, version)
+        """
+        with self._lock:
+            try:
+                records, cursor, reset = get_logger().read_calls(self._cursor)
+            except Exception as e:
+                print(f"Error loading API data: {e}")
+                return self._df, self._version
+
+            changed = reset and not self._df.empty
+            if reset:
+                self._df = create_calls_dataframe([])
+            self._cursor = cursor
+            if records:
+                self._append(create_calls_dataframe(records))
+                changed = True
+            if changed:
+                self._version += 1
+                self._memo = {}
+            return self._df, self._version
+
+    def _append(self, new):
+        df = self._df
+        for col in CATEGORICAL_COLUMNS:
+            # Extend the existing categories instead of re-encoding the whole column
+            categories = df[col].cat.categories
+            missing = [value for value in new[col].cat.categories if value not in categories]
+            if missing:
+                df[col] = df[col].cat.add_categories(missing)
+            new[col] = new[col].cat.set_categories(df[col].cat.categories)
+
+        out_of_order = not df.empty and new['timestamp'].iloc[0] < df['timestamp'].iloc[-1]
+        df = pd.concat([df, new], ignore_index=True)
+        if out_of_order:
+            df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+        self._df = df
+
+    def memo(self, key, version, build):
+        """Value of ``build(df)`` for a frame version, computed once per version."""
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            df = self._df
+        value = build(df)
+        with self._lock:
+            if version == self._version:
+                self._memo[key] = (version, value)
+        return value
+
+
+call_frame_cache = CallFrameCache()
+
+
+# Calls spanning up to this long are charted per hour, longer histories per day
+HOURLY_COST_SPAN = pd.Timedelta(days=2)
+
+
+def build_cost_points(df):
+    """Spend per hour (short histories) or per day, one chart point per bucket (x as epoch seconds)."""
+    hourly = df['timestamp'].iloc[-1] - df['timestamp'].iloc[0] <= HOURLY_COST_SPAN
+    freq, label_format = ('h', '%m-%d %H:00') if hourly else ('D', '%Y-%m-%d')
+    sums = df.groupby(pd.Grouper(key='timestamp', freq=freq))['total_cost'].sum()
+    epochs = (sums.index - pd.Timestamp(0)).total_seconds().tolist()
+    labels = sums.index.strftime(label_format).tolist()
+    costs = sums.round(4).tolist()
+    return [{'epoch': e, 'time': t, 'Cost': c} for e, t, c in zip(epochs, labels, costs)]
+
+
+def build_recent_questions(df):
+    """Questions grouped by (question, page, minute) with combined costs, newest first."""
+    questions_df = df[df['question_hash'].notna()]
+    keys = ['question_hash', 'page_path', pd.Grouper(key='timestamp', freq='1min')]
+
+    # Group by question, page, and timestamp to aggregate all API calls for each question
+    grouped = questions_df.groupby(keys, observed=True).agg(
+        total_cost=('total_cost', 'sum'),
+        total_tokens=('total_tokens', 'sum'),
+        model=('model', 'first'),  # Get first model used
+        call_type=('call_type', lambda x: ', '.join(sorted(set(x)))),  # List unique call types
+        response_hash=('response_hash', 'first'),  # Get the first response (they should be the same for grouped questions)
+        question_preview=('question_preview', 'first'),
+        num_calls=('total_cost', 'size')  # Number of API calls per question
+    ).reset_index()  # IMPORTANT: reset_index() to make grouped columns regular columns
+
+    # Sort by timestamp descending (newest first)
+    recent_df = grouped.sort_values('timestamp', ascending=False).copy()
+    recent_df['cost_display'] = recent_df['total_cost'].apply(lambda x: f"${x:.4f}")
+    recent_df['timestamp_display'] = recent_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M')
+
+    # Question previews from the records; only rows logged before previews were kept read the blob
+    missing = recent_df['question_preview'].isna()
+    recent_df.loc[missing, 'question_preview'] = recent_df.loc[missing, 'question_hash'].map(
+        lambda digest: question_preview(transcript_store.get(digest) or 'N/A')
+    )
+    recent_df = recent_df.rename(columns={'question_preview': 'question'})
+    return recent_df.to_dict('records')
 
 
 # Layout with improved UI/UX
@@ -177,6 +261,9 @@ layout = dmc.Container(
             n_intervals=0
         ),
 
+        # Measured width of the cost chart, used to size its point budget
+        dcc.Store(id='cost-chart-width'),
+
         # Summary Cards with improved design
         html.Div(id='analytics-summary-cards'),
 
@@ -202,7 +289,7 @@ layout = dmc.Container(
                                                     ],
                                                     gap="sm"
                                                 ),
-                                                dmc.Text("Daily API spending trends", size="sm", c="dimmed"),
+                                                dmc.Text("API spending per hour or day", size="sm", c="dimmed"),
                                                 ],
                                             gap=0
                                         ),
@@ -313,6 +400,35 @@ layout = dmc.Container(
                     ]
                 ),
 
+                # Latency Percentiles Table
+                dmc.Paper(
+                    [
+                        dmc.Group(
+                            [
+                                dmc.Stack(
+                                    [
+                                        dmc.Group(
+                                            [
+                                                DashIconify(icon="tabler:clock-bolt", width=28, color="var(--mantine-color-cyan-6)"),
+                                                dmc.Title("Latency by Call Type", order=3, size="h4"),
+                                            ],
+                                            gap="sm"
+                                        ),
+                                        dmc.Text("Wall time, time to first token and output tokens/sec (p50 / p95 / p99)", size="sm", c="dimmed"),
+                                    ],
+                                    gap=0
+                                ),
+                            ],
+                            mb="lg"
+                        ),
+                        html.Div(id='latency-table')
+                    ],
+                    p="xl",
+                    withBorder=True,
+                    radius="lg",
+                    shadow="sm"
+                ),
+
                 # Recent Questions Table
                 dmc.Paper(
                     [
@@ -376,21 +492,23 @@ layout = dmc.Container(
     Output('tokens-chart', 'children'),
     Output('model-distribution-chart', 'children'),
     Output('page-usage-chart', 'children'),
+    Output('latency-table', 'children'),
     Output('recent-questions-table', 'children'),
     Output('questions-count-badge', 'children'),
     Output('last-updated-badge', 'children'),
     Input('analytics-refresh-interval', 'n_intervals'),
-    Input('color-scheme-storage', 'data')
+    Input('color-scheme-storage', 'data'),
+    Input('cost-chart-width', 'data')
 )
-def update_analytics(n_intervals, theme):
+def update_analytics(n_intervals, theme, cost_chart_width):
     """Update all analytics visualizations with enhanced UI/UX."""
-    # Load data
-    data = load_api_data()
+    # New calls since the last refresh (shared by all viewers)
+    df, version = call_frame_cache.refresh()
 
     # Format last updated time
     last_updated = datetime.now().strftime("%I:%M:%S %p")
 
-    if not data:
+    if df.empty:
         # Enhanced empty state
         empty_msg = dmc.Center(
             dmc.Stack(
@@ -438,15 +556,14 @@ def update_analytics(n_intervals, theme):
                 variant="light",
                 radius="md"
             ),
-            empty_msg, empty_msg, empty_msg, empty_msg,
+            empty_msg, empty_msg, empty_msg, empty_msg, empty_msg,
             dmc.Text("No questions logged yet", c="dimmed", ta="center", py="md"),
             dmc.Badge("Total: 0", size="lg", variant="light", color="gray", radius="md"),
             f"Updated {last_updated}"
         )
 
     # Calculate stats
-    stats = calculate_summary_stats(data)
-    df = create_sessions_dataframe(data)
+    rollups, stats = calculate_summary_stats()
 
     # Summary Cards
     summary_cards = dmc.SimpleGrid(
@@ -543,45 +660,36 @@ def update_analytics(n_intervals, theme):
 
     # Cost Over Time Chart
     if not df.empty:
-        # Group by date and prepare data for DMC LineChart
-        df_time = df.groupby(df['timestamp'].dt.date)['total_cost'].sum().reset_index()
-        df_time['date_str'] = df_time['timestamp'].astype(str)
-
-        chart_data = df_time.to_dict('records')
-        for record in chart_data:
-            record['date'] = record.pop('date_str')
-            record['Cost'] = round(record.pop('total_cost'), 4)
-            del record['timestamp']
+        # Hourly or daily sums; only a series longer than the chart can show is reduced,
+        # keeping each bucket's lowest and highest spend
+        cost_points = call_frame_cache.memo('cost_points', version, build_cost_points)
+        chart_data = [
+            {'time': point['time'], 'Cost': point['Cost']}
+            for point in downsample_rows(
+                cost_points, ['Cost'], target_points(cost_chart_width), x_key='epoch', method='minmax'
+            )
+        ]
 
         cost_chart = dmc.LineChart(
             h=300,
-            dataKey="date",
+            dataKey="time",
             data=chart_data,
             series=[{"name": "Cost", "color": "blue.6"}],
             curveType="linear",
             withLegend=True,
+            withDots=False,
             yAxisLabel="Cost ($)",
-            xAxisLabel="Date"
+            xAxisLabel="Time"
         )
     else:
         cost_chart = dmc.Text("No data available", c="dimmed", ta="center", py="xl")
 
-    # Tokens Chart
-    if not df.empty:
-        # Aggregate tokens by timestamp and prepare data for stacked bar chart
-        df_tokens = df.groupby(df['timestamp'].dt.date).agg({
-            'input_tokens': 'sum',
-            'output_tokens': 'sum'
-        }).reset_index()
-        df_tokens['date_str'] = df_tokens['timestamp'].astype(str)
-
-        tokens_data = df_tokens.to_dict('records')
-        for record in tokens_data:
-            record['date'] = record.pop('date_str')
-            record['Input'] = record.pop('input_tokens')
-            record['Output'] = record.pop('output_tokens')
-            del record['timestamp']
-
+    # Tokens Chart (daily rollups)
+    tokens_data = [
+        {'date': row['key'], 'Input': row['input_tokens'], 'Output': row['output_tokens']}
+        for row in rollups.breakdown('day')
+    ]
+    if tokens_data:
         tokens_chart = dmc.BarChart(
             h=300,
             dataKey="date",
@@ -598,11 +706,9 @@ def update_analytics(n_intervals, theme):
     else:
         tokens_chart = dmc.Text("No data available", c="dimmed", ta="center", py="xl")
 
-    # Call Type Distribution Chart
-    if not df.empty:
-        call_type_costs = df.groupby('call_type')['total_cost'].sum().reset_index()
-        call_type_costs = call_type_costs.sort_values('total_cost', ascending=False)
-
+    # Call Type Distribution Chart (call type rollups)
+    call_type_rows = sorted(rollups.breakdown('call_type'), key=lambda row: row['total_cost'], reverse=True)
+    if call_type_rows:
         # Prettify call type names
         call_type_map = {
             'generate_markdown': 'Response Generation',
@@ -611,15 +717,10 @@ def update_analytics(n_intervals, theme):
             'generate_format_instructions': 'Format Instructions',
             'format_code': 'Code Formatting'
         }
-        call_type_costs['call_type_pretty'] = call_type_costs['call_type'].map(
-            lambda x: call_type_map.get(x, x)
-        )
-
-        call_type_data = call_type_costs.to_dict('records')
-        for record in call_type_data:
-            record['type'] = record.pop('call_type_pretty')
-            record['Cost'] = round(record.pop('total_cost'), 4)
-            del record['call_type']
+        call_type_data = [
+            {'type': call_type_map.get(row['key'], row['key']), 'Cost': round(row['total_cost'], 4)}
+            for row in call_type_rows
+        ]
 
         model_chart = dmc.BarChart(
             h=400,
@@ -634,19 +735,13 @@ def update_analytics(n_intervals, theme):
     else:
         model_chart = dmc.Text("No data available", c="dimmed", ta="center", py="xl")
 
-    # Page Usage Chart
-    if not df.empty:
-        page_costs = df.groupby('page_path')['total_cost'].sum().reset_index()
-        page_costs = page_costs.sort_values('total_cost', ascending=False).head(10)
-        page_costs['page_short'] = page_costs['page_path'].apply(
-            lambda x: x.split('/')[-1] if '/' in x else x
-        )
-
-        page_data = page_costs.to_dict('records')
-        for record in page_data:
-            record['page'] = record.pop('page_short')
-            record['Cost'] = round(record.pop('total_cost'), 4)
-            del record['page_path']
+    # Page Usage Chart (page rollups, top 10 by cost)
+    page_rows = sorted(rollups.breakdown('page_path'), key=lambda row: row['total_cost'], reverse=True)[:10]
+    if page_rows:
+        page_data = [
+            {'page': row['key'].split('/')[-1] if '/' in row['key'] else row['key'], 'Cost': round(row['total_cost'], 4)}
+            for row in page_rows
+        ]
 
         page_chart = dmc.BarChart(
             h=400,
@@ -661,37 +756,53 @@ def update_analytics(n_intervals, theme):
     else:
         page_chart = dmc.Text("No data available", c="dimmed", ta="center", py="xl")
 
+    # Latency Percentiles Table (histogram rollups per call type and model)
+    latency_rows = [row for row in rollups.latency_percentiles() if row['calls']]
+    if latency_rows:
+        # Determine theme for AG Grid
+        ag_theme = "ag-theme-quartz-dark" if theme == "dark" else "ag-theme-quartz"
+
+        def percentile_columns(metric, header, fmt):
+            return {
+                "headerName": header,
+                "children": [
+                    {
+                        "field": f"{metric}_p{q}",
+                        "headerName": f"p{q}",
+                        "width": 95,
+                        "type": "numericColumn",
+                        "valueFormatter": {"function": f"params.value == null ? '-' : d3.format('{fmt}')(params.value)"}
+                    }
+                    for q in (50, 95, 99)
+                ]
+            }
+
+        latency_table = dag.AgGrid(
+            id="latency-grid",
+            rowData=latency_rows,
+            columnDefs=[
+                {"field": "call_type", "headerName": "Call Type", "width": 200, "pinned": "left", "cellStyle": {"fontWeight": 500}},
+                {"field": "model", "headerName": "Model", "width": 180, "cellStyle": {"fontFamily": "monospace", "fontSize": "0.9em"}},
+                {"field": "calls", "headerName": "Calls", "width": 90, "type": "numericColumn"},
+                percentile_columns("wall_ms", "Wall Time (ms)", ",.0f"),
+                percentile_columns("ttft_ms", "Time to First Token (ms)", ",.0f"),
+                percentile_columns("tokens_per_second", "Output Tokens/sec", ",.1f"),
+            ],
+            columnSize="responsiveSizeToFit",
+            defaultColDef={"resizable": True, "sortable": True},
+            dashGridOptions={"domLayout": "autoHeight", "animateRows": True},
+            className=ag_theme,
+            style={"height": "auto", "width": "100%"}
+        )
+    else:
+        latency_table = dmc.Text("No timed calls logged yet", c="dimmed", ta="center", py="xl")
+
     # Recent Questions Table (grouped by question to show combined costs)
     if not df.empty:
-        questions_df = df[df['question'] != 'N/A'].copy()
-
-        # Group by question, page, and timestamp to aggregate all API calls for each question
-        grouped = questions_df.groupby(['question', 'page_path', pd.Grouper(key='timestamp', freq='1min')]).agg({
-            'total_cost': 'sum',
-            'total_tokens': 'sum',
-            'model': 'first',  # Get first model used
-            'call_type': lambda x: ', '.join(sorted(set(x))),  # List unique call types
-            'response': 'first'  # Get the first response (they should be the same for grouped questions)
-        }).reset_index()  # IMPORTANT: reset_index() to make grouped columns regular columns
-
-        # Sort by timestamp descending (newest first)
-        recent_df = grouped.sort_values('timestamp', ascending=False).copy()
-        recent_df['cost_display'] = recent_df['total_cost'].apply(lambda x: f"${x:.4f}")
-        recent_df['timestamp_display'] = recent_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M')
-
-        # Count number of API calls per question
-        call_counts = questions_df.groupby(['question', 'page_path', pd.Grouper(key='timestamp', freq='1min')]).size().reset_index(name='num_calls')
-
-        # Merge call counts into recent_df
-        recent_df = recent_df.merge(
-            call_counts[['question', 'page_path', 'num_calls']],
-            on=['question', 'page_path'],
-            how='left'
-        )
-        recent_df['num_calls'] = recent_df['num_calls'].fillna(0).astype(int)
+        grid_data = call_frame_cache.memo('recent_questions', version, build_recent_questions)
 
         # Create count badge
-        total_questions = len(recent_df)
+        total_questions = len(grid_data)
         count_badge = dmc.Badge(
             f"Total: {total_questions}",
             size="lg",
@@ -700,9 +811,6 @@ def update_analytics(n_intervals, theme):
             radius="md"
         )
 
-        # Prepare data for AG Grid
-        grid_data = recent_df.to_dict('records')
-
         # Column definitions with enhanced formatting and information
         column_defs = [
             {
@@ -803,7 +911,17 @@ def update_analytics(n_intervals, theme):
         questions_table = dmc.Text("No questions logged yet", c="dimmed")
         count_badge = dmc.Badge("Total: 0", size="lg", variant="light", color="gray", radius="md")
 
-    return summary_cards, cost_chart, tokens_chart, model_chart, page_chart, questions_table, count_badge, f"Updated {last_updated}"
+    return summary_cards, cost_chart, tokens_chart, model_chart, page_chart, latency_table, questions_table, count_badge, f"Updated {last_updated}"
+
+
+# Measure the cost chart so the server can size its point budget (only on real resizes)
+clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='measureWidth'),
+    Output('cost-chart-width', 'data'),
+    Input('analytics-refresh-interval', 'n_intervals'),
+    State('cost-over-time-chart', 'id'),
+    State('cost-chart-width', 'data'),
+)
 
 
 # Callback to handle row selection and modal display
@@ -822,8 +940,9 @@ def display_chat_details(selected_rows):
     # Get the first selected row
     row = selected_rows[0]
 
-    question = row.get('question', 'No question available')
-    response = row.get('response', 'No response available')
+    # Transcripts are loaded by hash only now that the row is opened
+    question = transcript_store.get(row.get('question_hash')) or 'No question available'
+    response = transcript_store.get(row.get('response_hash')) or 'N/A'
     timestamp = row.get('timestamp_display', 'Unknown time')
     page_path = row.get('page_path', 'Unknown page')
     model = row.get('model', 'Unknown model')
@@ -336,7 +336,7 @@ def create_dock_layout(content_components, toc_component, page_name, page_path):
     else:
         toc_content = dmc.Text("No table of contents available", c="dimmed", size="sm")
 
-    # Create advertisement component
+    # Create advertisement slots (the campaign is loaded when the page renders)
     mobile_ad = create_ad_component(page_name, viewport="mobile")
     desktop_ad = create_ad_component(page_name, viewport="desktop")
 
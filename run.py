@@ -1,7 +1,9 @@
 import dash
 from dash import Dash, _dash_renderer
 import json
-from flask import jsonify, request, Response, abort
+import os
+from flask import jsonify, request, Response, abort, session
+from werkzeug.middleware.proxy_fix import ProxyFix
 from components.appshell import create_appshell
 import dash_mantine_components as dmc
 
@@ -19,6 +21,7 @@ from lib.analytics_tracker import tracker
 from lib.constants import NAME_CONTENT_MAP
 
 import re
+import uuid
 from pathlib import Path
 from typing import List
 
@@ -368,6 +371,25 @@ page_chat_handler = PageChatHandler(
     base_url=app._base_url
 )
 
+# Signs the cookie carrying the server-issued chat client ID. Set SECRET_KEY when running
+# several workers, otherwise each worker only accepts the cookies it issued itself.
+app.server.secret_key = os.getenv('SECRET_KEY') or os.urandom(32)
+
+
+def chat_client_id() -> str:
+    """
+    Server-issued chat client ID, kept in the signed session cookie.
+
+    Per-session rate limits are keyed on this rather than the ``session``
+    query parameter, which the client picks (or omits) freely.
+    """
+    client_id = session.get('chat_client_id')
+    if not client_id:
+        client_id = session['chat_client_id'] = str(uuid.uuid4())
+        session.permanent = True
+    return client_id
+
+
 @app.server.route("/api/page-chat-stream")
 def page_chat_stream():
     """
@@ -385,6 +407,8 @@ def page_chat_stream():
     question = request.args.get('question', '')
     response_format = request.args.get('format', 'markdown')
     session_id = request.args.get('session', None)
+    client_ip = request.remote_addr
+    client_id = chat_client_id()
 
     if not page_path or not question:
         return jsonify({
@@ -398,7 +422,9 @@ def page_chat_stream():
                 page_path=page_path,
                 question=question,
                 response_format=response_format,
-                session_id=session_id
+                session_id=session_id,
+                client_ip=client_ip,
+                client_id=client_id
             ):
                 # SSE format: data: <json>\n\n
                 yield f"data: {chunk}\n"
@@ -445,6 +471,14 @@ app.layout = create_appshell(dash.page_registry.values())
 
 server = app.server
 
+# Reverse proxies in front of the app. Set this only when one is deployed: each proxy
+# appends to X-Forwarded-For, so the client address is taken from the trusted hops and
+# request.remote_addr is the real client. Without a proxy (the default, as in the
+# Dockerfile) the header is client-controlled and must be ignored.
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+if TRUSTED_PROXY_COUNT > 0:
+    server.wsgi_app = ProxyFix(server.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
 # ============================================================================
 # Analytics Tracking
 # ============================================================================